@@ -3,18 +3,24 @@ import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
 import threading
+import queue
 import os
-import time
 import cv2
+import numpy as np
 import glob
 import shutil
-import torch
-import timm
-from torchvision import transforms
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="torchvision.transforms.functional_tensor")
-from config import IMAGE_FOLDER, SUMMARY_OUTPUT_PATH, ESRGAN_OUTPUT_PATH, CLUSTER_FOLDER, FONT_PATH, ROW_LABELS, COL_LABELS, CLASS_NAMES, CELL_SIZE, MAX_PER_ROW, MAX_ROWS, NUM_CLASSES, SCALING_FACTOR, ORIGIN_FOLDER
-from image_utils import enhance_single_image, load_vit_model, adjust_single_image, load_yolo_model, yolo_detect_and_draw_and_save_txt, split_image_to_nine
+from config import IMAGE_FOLDER, SUMMARY_OUTPUT_PATH, ESRGAN_OUTPUT_PATH, CLUSTER_FOLDER, CLASS_NAMES, NUM_CLASSES, SCALING_FACTOR, ORIGIN_FOLDER, IN_MEMORY_PIPELINE, CLASSIFY_BATCH_SIZE, CLASSIFIER_TIMM_MAP, CLASSIFIER_NORMALIZATION, RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB, METRICS_OUTPUT_DIR, MODEL_REGISTRY_MAX_MODELS, MODEL_REGISTRY_MAX_MB, YOLO_BACKEND, PIPELINE_WORKERS, TILE_OVERLAP
+from image_utils import load_vit_model, adjust_single_image, use_yolo_model, yolo_detect_and_draw_and_save_txt, split_image_tiles, load_classifier
+from pipeline import run_slice_pipeline, export_slice_result, detect_slices, enhance_slices, classify_slice_crops, classify_cache_key, merge_split_detections, select_detections
+from result_cache import ResultCache, array_digest
+from summary_atlas import SummaryAtlas
+from progress import ProgressBus, stage_percent
+from metrics import metrics, MetricsPanel
+from model_registry import ModelRegistry
+from job_scheduler import JobScheduler, JobCancelled, PRIORITY_CURRENT
+from yolo_backend import load_backend_model
 
 # 主類：定義 GUI 界面和功能
 class CellImageGUI:
@@ -33,7 +39,6 @@ class CellImageGUI:
             print(f"❌ 無可用 YOLO 模型，請檢查 ./weights/YOLO/ 資料夾")
             self.available_yolo_models = ["YOLO_best.pt"]  # 預設模型
         self.current_yolo_model = self.available_yolo_models[0]  # 預設當前模型
-        self.yolo_model = load_yolo_model(os.path.join(yolo_folder, self.current_yolo_model))  # 載入預設 YOLO 模型
 
         # 設置模型選項並載入可用模型
         self.model_options = ["Vision.pth", "best_mobilenet.pth", "swin_6class.pth"]  # 可用模型列表
@@ -44,20 +49,18 @@ class CellImageGUI:
         self.current_model_name = self.available_models[0]  # 預設當前模型
 
         # 定義 timm 模型映射和正規化參數
-        self.timm_model_map = {
-            "Vision.pth": "vit_base_patch16_224",
-            "best_mobilenet.pth": "mobilenetv2_100",
-            "swin_6class.pth": "swin_tiny_patch4_window7_224"
-        }  # 映射 timm 模型名稱
-        self.normalization_params = {
-            "Vision.pth": ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
-            "swin_6class.pth": ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
-            "best_mobilenet.pth": ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        }  # 正規化參數
-
-        # 強制使用 CPU 避免 CUDA 問題
-        self.device = torch.device("cpu")  # 設置設備為 CPU
-        self.vit_model, _ = self.load_model(self.current_model_name)  # 載入預設模型
+        self.timm_model_map = CLASSIFIER_TIMM_MAP  # 映射 timm 模型名稱
+        self.normalization_params = CLASSIFIER_NORMALIZATION  # 正規化參數
+
+        # 分類模型使用的設備 (強制 CPU)，在背景載入模型時才建立，避免啟動時匯入 torch
+        self.device = None
+        self.vit_model = None  # 管線開始時從模型登錄表取得
+        self.classifier_name = None  # 實際載入的分類模型名稱 (載入失敗回退時與 current_model_name 不同)
+
+        # 模型在背景載入，視窗先顯示；最近用過的模型留在記憶體中，切換回來時不必重新載入
+        self.model_registry = ModelRegistry(MODEL_REGISTRY_MAX_MB * 1024 * 1024, MODEL_REGISTRY_MAX_MODELS)
+        self.request_yolo_model()
+        self.request_classifier()
 
         # 載入原始圖片列表並初始化相關變量
         self.origin_files = sorted([f for f in os.listdir(ORIGIN_FOLDER) if f.lower().endswith((".jpg", ".png", ".bmp"))])  # 獲取並排序圖片
@@ -66,6 +69,17 @@ class CellImageGUI:
         self.summary_ready = False  # 總覽圖表是否準備好
         self.view_summary = True  # 預設啟用 view 模式
         self.current_origin_image = None  # 當前選擇的原始圖片
+        self.sr_slices = {}  # 當前原圖所有切片的超解析結果 (切片名稱 -> BGR 陣列)
+        self.slice_result = None  # 記憶體管線中當前切片的處理結果 (供匯出使用)
+        self.slice_detections = {}  # 當前原圖所有切片的偵測結果 (切片名稱 -> boxes/classes/confs)
+        self.slice_digests = {}  # 當前原圖所有切片的像素雜湊 (快取鍵)
+        self.slice_regions = {}  # 當前原圖所有切片在原圖中的區域 (切片名稱 -> (x1, y1, x2, y2))，相鄰切片重疊 TILE_OVERLAP 像素
+        self.slice_keep = {}  # 合併重疊區域後每張切片負責的偵測框索引 (每個細胞只屬於一張切片)
+        self.result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024)  # 各階段結果快取
+        self.summary_atlas = SummaryAtlas()  # 總覽縮圖畫布
+        self.move_queue = queue.Queue()  # 手動改類別時在背景搬移檔案
+        self.scheduler = JobScheduler(PIPELINE_WORKERS)  # 所有管線工作都交給排程器，換切片時舊工作自動作廢
+        threading.Thread(target=self.file_mover_loop, daemon=True).start()
 
         # --- 左邊框 ---
         self.left_frame = tk.Frame(root, width=800, height=800, bg="white")  # 創建左側框架
@@ -84,6 +98,8 @@ class CellImageGUI:
         # 新增切片資訊標籤
         self.slice_info_label = tk.Label(text_frame, text="Current Slice: None", font=("Arial", 16), anchor="w", bg="white")  # 創建切片資訊標籤
         self.slice_info_label.pack(anchor="w", pady=5)  # 放置在左側
+        self.origin_count_label = tk.Label(text_frame, text="Origin Cells: -", font=("Arial", 16), anchor="w", bg="white")  # 整張原圖的細胞數
+        self.origin_count_label.pack(anchor="w")  # 放置在左側
 
         # 嘗試載入並顯示 logo 圖片
         try:
@@ -120,6 +136,16 @@ class CellImageGUI:
                                      bg="white", fg="black", font=("Arial", 16, "bold"), relief="raised", width=16)  # 創建按鈕
         self.next_button.pack(side="left", padx=20)  # 放置在左側
 
+        # 創建 "Export" 按鈕，把記憶體中的切片結果寫出到 ./image/*
+        self.export_button = tk.Button(self.button_frame, text="Export", command=self.export_current_slice,
+                                       bg="white", fg="black", font=("Arial", 16, "bold"), relief="raised", width=10)  # 創建按鈕
+        self.export_button.pack(side="left", padx=(0, 10))  # 放置在左側
+
+        # 創建 "Metrics" 按鈕，開啟各階段計時與記憶體面板
+        self.metrics_button = tk.Button(self.button_frame, text="Metrics", command=self.show_metrics_panel,
+                                        bg="white", fg="black", font=("Arial", 16, "bold"), relief="raised", width=10)  # 創建按鈕
+        self.metrics_button.pack(side="left", padx=(0, 10))  # 放置在左側
+
         self.selector_container = tk.Frame(self.button_row, bg="white")
         self.selector_container.pack(side="top", pady=(0, 0))  # 保持頂部放置
 
@@ -175,38 +201,68 @@ class CellImageGUI:
         self.esrgan_progress = ttk.Progressbar(self.root, orient="horizontal", mode="determinate", maximum=100, length=100)  # 創建進度條
         self.esrgan_progress.place(x=20, y=860)  # 放置在窗口底部
         self.esrgan_progress.lower()  # 預設隱藏進度條
+        self.progress_bus = ProgressBus()  # 背景管線的進度與畫面更新事件
+        self.root.after(50, self.poll_progress_events)  # 由主執行緒定時處理事件
 
         # 如果有圖片，自動載入第一張
         if self.origin_files:
             self.on_image_select(None)  # 觸發圖片選擇事件
 
     def load_model(self, model_name):
-        # 載入指定模型
+        # 載入指定模型 (在模型登錄表的載入執行緒中執行，torch 到這裡才匯入)
+        # 回傳 (模型, 裝置, 實際載入的模型名稱)；載入失敗時回退到 Vision.pth，名稱也跟著換成 Vision.pth
+        import torch
+        device = torch.device("cpu")  # 強制使用 CPU 避免 CUDA 問題
         try:
-            timm_model_name = self.timm_model_map.get(model_name, "vit_base_patch16_224")  # 獲取 timm 模型名稱
-            model = timm.create_model(timm_model_name, pretrained=False, num_classes=NUM_CLASSES)  # 創建模型
-            state_dict = torch.load(os.path.join("./weights", model_name), map_location=self.device)  # 載入權重
-            model.load_state_dict(state_dict)  # 應用權重
-            print(f"✅ 成功載入 {model_name} (timm 模型: {timm_model_name})")
-            model.to(self.device)  # 移動到設備
-            model.eval()  # 設置為評估模式
-            return model, self.device
+            model, _ = load_classifier(model_name, device)  # 創建模型並載入權重
+            return model, device, model_name
         except FileNotFoundError as e:
             print(f"❌ 載入模型 {model_name} 失敗: 檔案不存在 - {e}")
-            return self.load_model("Vision.pth")  # 回退到預設模型
+            fallback_reason = e
         except RuntimeError as e:
             print(f"❌ 載入模型 {model_name} 失敗: 權重不匹配 - {e}")
-            return self.load_model("Vision.pth")  # 回退到預設模型
+            fallback_reason = e
         except Exception as e:
             print(f"❌ 載入模型 {model_name} 失敗: 未知錯誤 - {e}")
-            return self.load_model("Vision.pth")  # 回退到預設模型
+            fallback_reason = e
+        if model_name == "Vision.pth":
+            raise fallback_reason  # 預設模型本身也無法載入，交給登錄表回報失敗
+        return self.load_model("Vision.pth")  # 回退到預設模型
+
+    def request_yolo_model(self):
+        # 背景載入目前選擇的 YOLO 模型 (已在記憶體中則直接沿用)，回傳登錄表的鍵
+        model_path = os.path.join("./weights", "YOLO", self.current_yolo_model)
+        key = ("yolo", model_path, YOLO_BACKEND)
+        self.model_registry.request(key, lambda: self.load_yolo(model_path), path=model_path)
+        return key
+
+    def load_yolo(self, model_path):
+        # 在模型登錄表的載入執行緒中執行，回傳 (模型, 實際使用的後端)
+        model, backend = load_backend_model(model_path, YOLO_BACKEND)
+        print(f"✅ 成功載入 YOLO 模型: {model_path} ({backend})")
+        return model, backend
+
+    def request_classifier(self):
+        # 背景載入目前選擇的分類模型 (已在記憶體中則直接沿用)，回傳登錄表的鍵
+        model_name = self.current_model_name
+        key = ("classifier", model_name)
+        self.model_registry.request(key, lambda: self.load_model(model_name), path=os.path.join("./weights", model_name))
+        return key
+
+    def wait_for_models(self):
+        # 管線執行緒呼叫：取得目前選擇的模型，只有還沒載入好時才等待
+        yolo_key = self.request_yolo_model()
+        yolo_model, backend = self.model_registry.get(yolo_key)
+        use_yolo_model(yolo_model, yolo_key[1], backend)
+        # 分類模型載入失敗時實際用的是 Vision.pth，正規化參數與分類快取鍵都要跟著用實際的模型名稱
+        self.vit_model, self.device, self.classifier_name = self.model_registry.get(self.request_classifier())
 
     def on_model_select(self, event):
         # 處理模型選擇事件
         selected_model = self.model_selector.get()  # 獲取選中模型
         if selected_model != self.current_model_name:  # 檢查是否為新模型
             self.current_model_name = selected_model  # 更新當前模型
-            self.vit_model, self.device = self.load_model(selected_model)  # 載入新模型
+            self.request_classifier()  # 背景載入新模型，管線需要時才等待
             for widget in self.image_frame.winfo_children():
                 widget.destroy()  # 清空總覽框架
             for widget in self.stats_frame.winfo_children():
@@ -226,6 +282,9 @@ class CellImageGUI:
             self.current_origin_image = selected_image  # 更新當前圖片
             self.image_files = []  # 清空分割圖片列表
             self.image_index = 0  # 重置索引
+            self.sr_slices = {}  # 清空前一張原圖的超解析結果
+            self.slice_detections = {}  # 清空前一張原圖的偵測結果
+            self.origin_count_label.configure(text="Origin Cells: -")
             self.view_summary = True  # 啟用總覽模式
             self.on_camera_click(selected_image)  # 觸發圖片分割
             for widget in self.image_frame.winfo_children():
@@ -275,39 +334,136 @@ class CellImageGUI:
         else:
             self.slice_info_label.configure(text="Current Slice: None")  # 預設無切片
 
-    def run_full_pipeline(self, selected_img_name, selected_img_path, esrgan_output_path, light_contrast_output_path, final_with_boxes_path, final_txt_path):
-        # 執行圖片處理管線
+    def run_full_pipeline(self, selected_img_name, selected_img_path, esrgan_output_path, light_contrast_output_path, final_with_boxes_path, final_txt_path, token, prepare=None):
+        # 執行圖片處理管線 (排程器的 worker 執行緒，只透過 progress_bus 通知畫面)
+        # token：換切片時作廢，各階段之間與每次回報進度時檢查，作廢後立即停止
+        # prepare：開始前要做的事 (例如清理暫存檔)；同群組的舊工作停下後才會執行，不會刪到舊工作正在寫的檔案
+        bus = self.progress_bus.job(token)  # 作廢後送出的事件不會被畫面套用
         try:
-            threading.Thread(target=self.progress_to_target, args=(30, 0.045), daemon=True).start()  # 更新進度條到 30%
-            enhance_single_image(selected_img_path, esrgan_output_path)  # 執行圖片增強
-            self.root.after(0, lambda: self.update_left_image(esrgan_output_path))  # 更新左側圖片
-
-            threading.Thread(target=self.progress_to_target, args=(50, 0.01), daemon=True).start()  # 更新進度條到 50%
-            adjust_single_image(esrgan_output_path, light_contrast_output_path, contrast=0, brightness=0)  # 調整亮度
-            self.root.after(0, lambda: self.update_left_image(light_contrast_output_path))  # 更新左側圖片
-
-            threading.Thread(target=self.progress_to_target, args=(70, 0.01), daemon=True).start()  # 更新進度條到 70%
-            yolo_detect_and_draw_and_save_txt(light_contrast_output_path, final_with_boxes_path, final_txt_path)  # 執行 YOLO 檢測
-            self.root.after(0, lambda: self.update_left_image(final_with_boxes_path))  # 更新左側圖片
-
-            threading.Thread(target=self.progress_to_target, args=(100, 0.15), daemon=True).start()  # 更新進度條到 100%
-            self.crop_current_image_objects()  # 裁剪物件
-            self.classify_and_move_cropped_cells()  # 分類並移動細胞
-            self.root.after(0, lambda: self.esrgan_progress.lower())  # 處理完成後隱藏進度條
+            if prepare is not None:
+                prepare()
+            self.wait_for_models()  # 模型還在背景載入時在這裡等待
+            token.check()
+            if selected_img_name not in self.sr_slices:  # 第一次看到這張原圖時，九張切片一次整批超解析
+                slice_names = list(self.image_files)
+                slice_imgs = [cv2.imread(os.path.join(IMAGE_FOLDER, name)) for name in slice_names]
+                digests = [array_digest(img) for img in slice_imgs]  # 切片像素雜湊，作為快取鍵
+                self.slice_digests = dict(zip(slice_names, digests))
+                self.sr_slices = dict(zip(slice_names, enhance_slices(slice_imgs, cache=self.result_cache, digests=digests,
+                                                                      progress=token.progress(bus.reporter("sr")))))
+            token.check()
+            bus.report("sr", 1, 1)
+
+            if IN_MEMORY_PIPELINE:
+                if selected_img_name not in self.slice_detections:  # 九張切片一次整批偵測，整張原圖的數量一起算好
+                    slice_names = list(self.sr_slices)
+                    detections = detect_slices([self.sr_slices[name] for name in slice_names], contrast=0, brightness=0,
+                                               cache=self.result_cache, digests=[self.slice_digests[name] for name in slice_names],
+                                               progress=token.progress(bus.reporter("detect")))
+                    self.slice_detections = dict(zip(slice_names, detections))
+                    # 重疊區域的細胞兩張切片都偵測得到，合併成原圖座標後每個細胞只算一次，
+                    # 並由保留下來的那個框所屬的切片負責裁切與分類
+                    merged = merge_split_detections([self.slice_regions[name] for name in slice_names],
+                                                    [self.sr_slices[name].shape[:2] for name in slice_names], detections)
+                    self.slice_keep = {name: np.sort(merged["indices"][merged["tiles"] == tile])
+                                       for tile, name in enumerate(slice_names)}
+                    bus.post("count", len(merged["boxes"]))
+                token.check()
+                self.run_in_memory_pipeline(selected_img_name, token)
+                return
+
+            os.makedirs(os.path.dirname(esrgan_output_path), exist_ok=True)
+            cv2.imwrite(esrgan_output_path, self.sr_slices[selected_img_name])  # 寫出當前切片的超解析結果
+            bus.post("image", esrgan_output_path)  # 更新左側圖片
+
+            with metrics.stage("adjust", items=1):
+                adjust_single_image(esrgan_output_path, light_contrast_output_path, contrast=0, brightness=0)  # 調整亮度
+            token.check()
+            bus.report("adjust", 1, 1)
+            bus.post("image", light_contrast_output_path)  # 更新左側圖片
+
+            with metrics.stage("detect", items=1):
+                yolo_detect_and_draw_and_save_txt(light_contrast_output_path, final_with_boxes_path, final_txt_path)  # 執行 YOLO 檢測
+            token.check()
+            bus.report("detect", 1, 1)
+            bus.post("image", final_with_boxes_path)  # 更新左側圖片
+
+            with metrics.stage("crop", items=1):
+                self.crop_current_image_objects()  # 裁剪物件
+            token.check()
+            bus.report("crop", 1, 1)
+            self.classify_and_move_cropped_cells(token=token)  # 分類並移動細胞
+        except JobCancelled:
+            print(f"🔍 切片 {selected_img_name} 的工作已被取代，停止處理")
         except Exception as e:
             print(f"❌ 背景子執行緒錯誤: {e}")  # 打印異常訊息
-
-    def progress_to_target(self, target_value, sleep_time):
-        # 更新進度條到指定目標值
-        while self.esrgan_progress['value'] < target_value:  # 檢查是否達到目標值
-            self.esrgan_progress['value'] += 1  # 增加進度值
-            self.root.update_idletasks()  # 更新界面
-            time.sleep(sleep_time)  # 控制更新速度
-
-    def update_left_image(self, image_path):
-        # 更新左側圖片顯示區域
+        finally:
+            if not token.cancelled:  # 被取代時進度條交給新的工作
+                bus.post("done")  # 處理完成後隱藏進度條
+
+    def run_in_memory_pipeline(self, selected_img_name, token):
+        # 記憶體內管線：各階段直接傳遞陣列，不做中間檔案的寫入與讀回
+        bus = self.progress_bus.job(token)
+        sr_img = self.sr_slices[selected_img_name]  # 取出超解析結果
+        token.check()
+        bus.post("image", sr_img)  # 更新左側圖片
+
+        detections = self.slice_detections.get(selected_img_name)  # 整批偵測的結果
+        keep = self.slice_keep.get(selected_img_name)  # 只處理屬於這張切片的細胞，重疊區域的細胞由另一張切片負責
+        if detections is not None and keep is not None:
+            detections = select_detections(detections, keep)
+        else:
+            keep = None
+        result = run_slice_pipeline(None, sr_img=sr_img, contrast=0, brightness=0, detections=detections)  # 亮度調整 + YOLO 檢測 + 裁切
+        token.check()
+        bus.report("crop", 1, 1)
+        self.slice_result = (selected_img_name, result)  # 保留結果供匯出
+        bus.post("image", result["annotated"])  # 更新左側圖片
+
+        base_name = os.path.splitext(selected_img_name)[0]
+        indices = keep if keep is not None else range(len(result["crops"]))  # 小圖名稱沿用原本的偵測框索引
+        crops = [(f"{base_name}_{idx}", crop) for idx, crop in zip(indices, result["crops"])]
+        cache_key = classify_cache_key(self.slice_digests[selected_img_name], os.path.join("./weights", self.classifier_name), keep=keep)
+        self.classify_and_move_cropped_cells(crops, cache_key=cache_key, token=token)  # 分類並移動細胞
+
+    def export_current_slice(self):
+        # 把記憶體管線的當前切片結果寫成檔案
+        if self.slice_result is None:
+            print("⚠️ 目前沒有可匯出的切片結果")
+            return
+        slice_name, result = self.slice_result
+        export_slice_result(result, slice_name)
+
+    def poll_progress_events(self):
+        # 主執行緒：處理背景管線送來的事件，唯一會更新進度條與左側圖片的地方
+        summary_requested = False
+        for event in self.progress_bus.drain():
+            kind = event[0]
+            if kind == "progress":  # ("progress", 階段, 完成量, 總量)
+                _, stage, done, total = event
+                self.esrgan_progress['value'] = max(self.esrgan_progress['value'], stage_percent(stage, done, total))
+            elif kind == "image":  # ("image", 路徑或陣列)
+                self.update_left_image(event[1])
+            elif kind == "count":  # ("count", 整張原圖細胞數)
+                self.origin_count_label.configure(text=f"Origin Cells: {event[1]}")
+            elif kind == "slices":  # ("slices", 原圖檔名, 各切片區域) 原圖切割完成
+                self.show_split_slices(event[1], event[2])
+            elif kind == "summary":  # 同一批事件中的多次總覽更新合併成一次
+                summary_requested = True
+            elif kind == "done":
+                self.esrgan_progress['value'] = 100
+                self.esrgan_progress.lower()  # 處理完成後隱藏進度條
+        if summary_requested:
+            self.generate_summary_image()
+        self.root.after(50, self.poll_progress_events)
+
+    def update_left_image(self, image):
+        # 更新左側圖片顯示區域，image 可以是檔案路徑或 BGR 陣列
         try:
-            img = Image.open(image_path).copy().resize((800, 500))  # 打開並調整圖片大小
+            if isinstance(image, str):
+                img = Image.open(image).copy().resize((800, 500))  # 打開並調整圖片大小
+            else:
+                img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).resize((800, 500))  # 陣列轉為 PIL 並調整大小
             img_tk = ImageTk.PhotoImage(img)  # 轉換為 Tkinter 格式
             self.img_label.configure(image=img_tk, text="")  # 更新圖片標籤
             self.img_label.image = img_tk  # 保留引用防止垃圾回收
@@ -371,52 +527,65 @@ class CellImageGUI:
             cv2.imwrite(output_path, cropped_img)  # 儲存裁剪結果
             print(f"✅ 裁切完成: {output_path}")  # 打印成功訊息
 
-    def classify_and_move_cropped_cells(self):
+    def classify_and_move_cropped_cells(self, crops=None, cache_key=None, token=None):
         # 對裁剪後的細胞進行分類並移動到相應資料夾
+        # crops：記憶體管線傳入的 [(名稱, BGR 陣列)]，None 時從 ./image/cropped 讀檔
+        # cache_key：分類結果的快取鍵，命中時不再推論
+        # token：工作被取代時在分類途中停下，不寫出過期的分類結果
         cropped_folder = "./image/cropped"  # 定義裁剪資料夾
         import shutil  # 導入 shutil 用於檔案操作
 
+        self.move_queue.join()  # 等手動改類別的檔案搬完再清空資料夾
         for class_id in range(1, NUM_CLASSES + 1):  # 遍歷所有類別
             class_folder = os.path.join('./sorted', str(class_id))  # 構建類別資料夾路徑
             if os.path.exists(class_folder):  # 檢查資料夾是否存在
                 shutil.rmtree(class_folder)  # 刪除舊資料夾
             os.makedirs(class_folder, exist_ok=True)  # 創建新資料夾
+        self.summary_atlas.reset()  # 換切片時清空縮圖畫布
 
-        base_name = os.path.splitext(self.image_files[self.image_index])[0]  # 獲取當前圖片名稱
-        cropped_images = sorted(glob.glob(os.path.join(cropped_folder, f"{base_name}_*.jpg")))  # 獲取裁剪圖片
+        if crops is None:
+            base_name = os.path.splitext(self.image_files[self.image_index])[0]  # 獲取當前圖片名稱
+            cropped_images = sorted(glob.glob(os.path.join(cropped_folder, f"{base_name}_*.jpg")))  # 獲取裁剪圖片
+            crops = [(os.path.splitext(os.path.basename(p))[0], p) for p in cropped_images]
 
-        if not cropped_images:  # 檢查是否有裁剪圖片
+        if not crops:  # 檢查是否有裁剪圖片
             print("⚠️ 沒有找到裁切的小圖")
             return
 
-        mean, std = self.normalization_params.get(self.current_model_name, ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]))  # 獲取正規化參數
-        transform = transforms.Compose([  # 定義圖片轉換流程
-            transforms.Resize((224, 224)),  # 調整大小
-            transforms.ToTensor(),  # 轉為張量
-            transforms.Normalize(mean=mean, std=std),  # 正規化
-        ])
-        count = 0  # 計數器
-        for img_path in cropped_images:  # 遍歷裁剪圖片
-            img_pil = Image.open(img_path).convert('RGB')  # 打開圖片
-            input_tensor = transform(img_pil).unsqueeze(0).to(self.device)  # 轉換為張量
+        names = [crop_name for crop_name, _ in crops]
+        images = [cv2.imread(crop) if isinstance(crop, str) else crop for _, crop in crops]  # 檔案路徑先讀成陣列
 
-            with torch.no_grad():  # 關閉梯度計算
-                logits = self.vit_model(input_tensor)  # 預測
-                pred_class = logits.argmax(dim=1).item()  # 獲取預測類別
+        normalization = self.normalization_params.get(self.classifier_name, ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]))  # 獲取正規化參數
+        bus = self.progress_bus if token is None else self.progress_bus.job(token)
+        progress = bus.reporter("classify")
+        if token is not None:
+            progress = token.progress(progress)
+        preds, confs = classify_slice_crops(self.vit_model, images, normalization, self.device, batch_size=CLASSIFY_BATCH_SIZE,
+                                            cache=self.result_cache, key=cache_key, progress=progress)  # 整批分類 (有快取時直接取回)
+        if token is not None:
+            token.check()
+        self.crop_confidences = dict(zip(names, confs.tolist()))  # 保留每個細胞的信心值
 
+        count = 0  # 計數器
+        for crop_name, (_, crop), img, pred_class in zip(names, crops, images, preds.tolist()):  # 遍歷分類結果
             class_folder = os.path.join('./sorted', str(pred_class + 1))  # 構建目標資料夾
             os.makedirs(class_folder, exist_ok=True)  # 創建資料夾
 
-            filename = os.path.basename(img_path)  # 獲取檔案名稱
-            filename_no_ext = os.path.splitext(filename)[0]  # 移除擴展名
-            new_filename = f"{filename_no_ext}_c{pred_class+1}.jpg"  # 新檔案名稱
+            new_filename = f"{crop_name}_c{pred_class+1}.jpg"  # 新檔案名稱
             new_path = os.path.join(class_folder, new_filename)  # 新路徑
+            if token is not None:
+                token.check()  # 換切片後不再寫出過期的分類結果
+            if img is not None and img.size > 0:
+                self.summary_atlas.remember(new_filename, img)  # 縮圖先放進畫布快取，總覽不必再讀檔
 
-            shutil.copy(img_path, new_path)  # 複製檔案
+            if isinstance(crop, str):
+                shutil.copy(crop, new_path)  # 複製檔案
+            else:
+                cv2.imwrite(new_path, crop)  # 直接寫出分類結果
             count += 1  # 增加計數
             if count % 8 == 0:  # 每 8 張更新一次總覽
-                self.root.after(0, self.generate_summary_image)
-        self.root.after(0, self.generate_summary_image)  # 最後更新總覽
+                bus.post("summary")
+        bus.post("summary")  # 最後更新總覽
 
     def show_loading_gif(self):
         # 顯示載入動畫 GIF
@@ -449,13 +618,12 @@ class CellImageGUI:
             self.root.after(30, self.animate_loading)  # 30ms 後刷新
 
     def generate_summary_image(self):
-        # 生成並顯示總覽圖表
-        import os
-        import cv2
-        import numpy as np
-        from PIL import Image, ImageTk, ImageDraw, ImageFont
-
+        # 生成並顯示總覽圖表 (縮圖畫布只更新有變動的格子)
         def update_summary():
+            with metrics.stage("summary", items=1):
+                render_summary()
+
+        def render_summary():
             if hasattr(self, 'loading_label') and self.loading_label.winfo_exists():  # 檢查載入標籤是否存在
                 self.loading_label.destroy()  # 銷毀載入標籤
             if hasattr(self, 'loading_frames'):  # 清理幀列表
@@ -464,171 +632,114 @@ class CellImageGUI:
                 del self.loading_gif
 
             self.image_prefix = os.path.splitext(self.image_files[self.image_index])[0]  # 獲取圖片前綴
-            self.cell_paths_by_class = {}  # 儲存每個類別的圖片路徑
-            cell_grids = {}  # 儲存每個類別的網格
-            cell_counts = {}  # 儲存每個類別的數量
-
-            for class_id in range(1, NUM_CLASSES + 1):  # 遍歷所有類別
-                class_path = os.path.join(CLUSTER_FOLDER, str(class_id))  # 構建類別資料夾路徑
-                image_files = sorted(
-                    [f for f in os.listdir(class_path) if f.startswith(self.image_prefix)],  # 過濾圖片
-                    key=lambda x: os.path.getmtime(os.path.join(class_path, x))  # 按修改時間排序
-                ) if os.path.exists(class_path) else []  # 檢查資料夾是否存在
-
-                paths = [os.path.join(class_path, f) for f in image_files]  # 構建圖片路徑列表
-                self.cell_paths_by_class[class_id] = paths.copy()  # 儲存路徑
-                cell_counts[class_id] = len(image_files)  # 記錄數量
-
-                cell_images = []  # 儲存圖片
-                for f in image_files:  # 遍歷圖片
-                    img = cv2.imread(os.path.join(class_path, f))  # 讀取圖片
-                    if img is not None:  # 檢查是否成功讀取
-                        img_resized = cv2.resize(img, (CELL_SIZE, CELL_SIZE))  # 調整大小
-                        cell_images.append(img_resized)  # 添加到列表
-
-                total_needed = MAX_PER_ROW * MAX_ROWS  # 計算所需總數
-                while len(cell_images) < total_needed:  # 填充空白
-                    cell_images.append(np.zeros((CELL_SIZE, CELL_SIZE, 3), dtype=np.uint8))
-                    self.cell_paths_by_class[class_id].append(None)
-
-                cell_images = cell_images[:total_needed]  # 截斷到最大數量
-                rows = [np.hstack(cell_images[i:i + MAX_PER_ROW]) for i in range(0, len(cell_images), MAX_PER_ROW)]  # 水平拼接
-                cell_grids[class_id] = np.vstack(rows)  # 垂直拼接
-
-            cell_height = MAX_ROWS * CELL_SIZE  # 計算網格高度
-            cell_width = MAX_PER_ROW * CELL_SIZE  # 計算網格寬度
-            summary_cv2 = np.full(((cell_height * 3) + 60, (cell_width * 2) + 80, 3), 255, dtype=np.uint8)  # 創建總覽畫布
-
-            for r in range(3):  # 遍歷 3 行
-                for c in range(2):  # 遍歷 2 列
-                    idx = r * 2 + c + 1  # 計算類別索引
-                    y, x = 60 + r * cell_height, 80 + c * cell_width  # 計算位置
-                    summary_cv2[y:y + cell_height, x:x + cell_width] = cell_grids[idx]  # 填充網格
-                    cv2.rectangle(summary_cv2, (x, y), (x + cell_width, y + cell_height), (0, 0, 0), 4)  # 繪製邊框
-
-            summary_pil = Image.fromarray(cv2.cvtColor(summary_cv2, cv2.COLOR_BGR2RGB))  # 轉換為 PIL 圖像
-            draw = ImageDraw.Draw(summary_pil)  # 創建繪圖物件
-            font = ImageFont.truetype(FONT_PATH, 27)  # 設置字體
-
-            for i, label in enumerate(COL_LABELS):  # 添加列標籤
-                x = 80 + i * cell_width + cell_width // 2 - 30
-                draw.text((x, 0), label, fill="black", font=font)
-
-            for i, label in enumerate(ROW_LABELS):  # 添加行標籤
-                y = 60 + i * cell_height + cell_height // 2 - 20
-                draw.text((0, y), label, fill="black", font=font)
-
-            if SCALING_FACTOR < 1.0:  # 檢查縮放因子
-                w, h = summary_pil.size  # 獲取圖像尺寸
-                try:
-                    summary_pil = summary_pil.resize((int(w * SCALING_FACTOR), int(h * SCALING_FACTOR)), resample=Image.Resampling.LANCZOS)
-                except AttributeError:
-                    summary_pil = summary_pil.resize((int(w * SCALING_FACTOR), int(h * SCALING_FACTOR)), resample=Image.LANCZOS)
-
-            for widget in self.image_frame.winfo_children():  # 清空舊 widget
-                widget.destroy()
-
-            summary_pil_tk = ImageTk.PhotoImage(summary_pil)  # 轉換為 Tkinter 格式
-            summary_label = tk.Label(self.image_frame, image=summary_pil_tk, anchor="nw", bg="white")  # 創建標籤
-            summary_label.image = summary_pil_tk  # 保留引用
-            summary_label.pack()  # 顯示圖像
-            summary_label.bind("<Button-1>", self.on_summary_click)  # 綁定點擊事件
-
-            total_cells = sum(cell_counts.values())  # 計算總細胞數
-            if not hasattr(self, 'stats_rows') or not self.stats_rows:  # 初始化統計行
-                self.stats_rows = []
-                for row in range(3):
-                    for col in range(2):
-                        stat_row = tk.Frame(self.stats_frame, bg="white")  # 創建統計行框架
-                        label = tk.Label(stat_row, text="", font=("Arial", 14), bg="white", width=18, anchor="w")  # 創建標籤
-                        label.pack(side="left")  # 放置在左側
-                        blocks = []  # 儲存進度塊
-                        for i in range(10):  # 創建 10 個進度塊
-                            block = tk.Frame(stat_row, width=11, height=17, bg="black", bd=1, relief="solid")  # 創建塊
-                            block.pack(side="left", padx=1)  # 放置在左側
-                            blocks.append(block)
-                        stat_row.grid(row=row, column=col, padx=4, pady=4, sticky="w")  # 佈局
-                        self.stats_rows.append((label, blocks))
-
-            for idx, (label_widget, blocks_widgets) in enumerate(self.stats_rows):  # 更新統計數據
-                cid = idx + 1  # 類別 ID
-                count = cell_counts.get(cid, 0)  # 獲取數量
-                percent = (count / total_cells) * 100 if total_cells > 0 else 0  # 計算百分比
-                lights_on = min(10, int((percent + 9.999) // 10)) if percent > 0 else 0  # 計算亮燈數
-
-                label_text = f"{CLASS_NAMES[cid]}: {percent:.1f}%"  # 格式化文字
-                label_widget.config(text=label_text)  # 更新標籤
-
-                colors = ["#fdcb6e"] * 3 + ["#e17055"] * 3 + ["#d63031"] * 4  # 定義顏色
-                for i in range(10):  # 更新進度塊顏色
-                    color = colors[i] if i < lights_on else "black"
-                    blocks_widgets[i].config(bg=color)
+            cell_counts = self.summary_atlas.sync(CLUSTER_FOLDER, self.image_prefix)  # 只重畫新增或變動的格子
+            self.cell_paths_by_class = self.summary_atlas.paths  # 每個類別的圖片路徑 (與畫布格子對應)
+
+            summary_pil = self.summary_atlas.to_pil()  # 已是 SCALING_FACTOR 尺寸
+            summary_label = getattr(self, 'summary_label', None)
+            if summary_label is not None and summary_label.winfo_exists() and summary_label.master is self.image_frame:
+                self.summary_photo.paste(summary_pil)  # 沿用同一張 PhotoImage，不重建 widget
+            else:
+                for widget in self.image_frame.winfo_children():  # 清空舊 widget
+                    widget.destroy()
+                self.summary_photo = ImageTk.PhotoImage(summary_pil)  # 轉換為 Tkinter 格式
+                summary_label = tk.Label(self.image_frame, image=self.summary_photo, anchor="nw", bg="white")  # 創建標籤
+                summary_label.image = self.summary_photo  # 保留引用
+                summary_label.pack()  # 顯示圖像
+                summary_label.bind("<Button-1>", self.on_summary_click)  # 綁定點擊事件
+                self.summary_label = summary_label
+
+            self.update_stats_rows(cell_counts)  # 更新統計表
 
         self.root.after(0, update_summary)  # 延遲執行更新
 
+    def update_stats_rows(self, cell_counts, class_ids=None):
+        # 更新統計表，class_ids 為 None 時更新全部六列
+        total_cells = sum(cell_counts.values())  # 計算總細胞數
+        if not hasattr(self, 'stats_rows') or not self.stats_rows:  # 初始化統計行
+            self.stats_rows = []
+            for row in range(3):
+                for col in range(2):
+                    stat_row = tk.Frame(self.stats_frame, bg="white")  # 創建統計行框架
+                    label = tk.Label(stat_row, text="", font=("Arial", 14), bg="white", width=18, anchor="w")  # 創建標籤
+                    label.pack(side="left")  # 放置在左側
+                    blocks = []  # 儲存進度塊
+                    for i in range(10):  # 創建 10 個進度塊
+                        block = tk.Frame(stat_row, width=11, height=17, bg="black", bd=1, relief="solid")  # 創建塊
+                        block.pack(side="left", padx=1)  # 放置在左側
+                        blocks.append(block)
+                    stat_row.grid(row=row, column=col, padx=4, pady=4, sticky="w")  # 佈局
+                    self.stats_rows.append((label, blocks))
+
+        for idx, (label_widget, blocks_widgets) in enumerate(self.stats_rows):  # 更新統計數據
+            cid = idx + 1  # 類別 ID
+            if class_ids is not None and cid not in class_ids:  # 只更新有變動的類別
+                continue
+            count = cell_counts.get(cid, 0)  # 獲取數量
+            percent = (count / total_cells) * 100 if total_cells > 0 else 0  # 計算百分比
+            lights_on = min(10, int((percent + 9.999) // 10)) if percent > 0 else 0  # 計算亮燈數
+
+            label_text = f"{CLASS_NAMES[cid]}: {percent:.1f}%"  # 格式化文字
+            label_widget.config(text=label_text)  # 更新標籤
+
+            colors = ["#fdcb6e"] * 3 + ["#e17055"] * 3 + ["#d63031"] * 4  # 定義顏色
+            for i in range(10):  # 更新進度塊顏色
+                color = colors[i] if i < lights_on else "black"
+                blocks_widgets[i].config(bg=color)
+
     def on_summary_click(self, event):
         # 處理總覽圖表點擊事件，切換細胞類別
-        scaling = getattr(self, 'scaling_factor', SCALING_FACTOR)  # 獲取縮放因子
-        x = int(event.x / scaling)  # 轉換 x 座標
-        y = int(event.y / scaling)  # 轉換 y 座標
-
-        from config import CELL_SIZE, MAX_PER_ROW, MAX_ROWS  # 導入配置
-        CELL_W = CELL_SIZE  # 單元格寬度
-        CELL_H = CELL_SIZE  # 單元格高度
-        PAD_X = 80  # 水平邊距
-        PAD_Y = 60  # 垂直邊距
-        GRID_W = MAX_PER_ROW * CELL_W  # 網格寬度
-        GRID_H = MAX_ROWS * CELL_H  # 網格高度
-
-        col = (x - PAD_X) // GRID_W  # 計算列
-        row = (y - PAD_Y) // GRID_H  # 計算行
-        if not (0 <= col <= 1 and 0 <= row <= 2):  # 檢查是否在範圍內
+        hit = self.summary_atlas.hit_test(event.x, event.y)  # 畫布已是縮放後的尺寸，直接換算格子
+        if hit is None:  # 檢查是否在範圍內
             print("點擊範圍超出六宮格")
             return
-
-        class_id = row * 2 + col + 1  # 計算類別 ID
-        local_x = (x - PAD_X - col * GRID_W)  # 計算局部 x
-        local_y = (y - PAD_Y - row * GRID_H)  # 計算局部 y
-        grid_c = local_x // CELL_W  # 計算列索引
-        grid_r = local_y // CELL_H  # 計算行索引
-        index = grid_r * MAX_PER_ROW + grid_c  # 計算索引
+        class_id, index = hit  # 類別 ID 與格子索引
 
         paths = self.cell_paths_by_class.get(class_id, [])  # 獲取路徑列表
         if 0 <= index < len(paths):  # 檢查索引有效性
             path = paths[index]  # 獲取路徑
             if path is not None:  # 檢查是否為有效圖片
                 print(f"✅ 點選 class_id={class_id}, index={index} → {os.path.basename(path)}")
-                self.toggle_cell_class(path, class_id)  # 切換類別
+                self.toggle_cell_class(path, class_id, index)  # 切換類別
             else:
                 print("⚠️ 點到空格子，無圖片")
         else:
             print("⚠️ 無效 index")
 
-    def toggle_cell_class(self, img_path, current_class_id):
-        # 切換細胞類別
-        import shutil  # 導入 shutil 用於檔案操作
+    def toggle_cell_class(self, img_path, current_class_id, index):
+        # 切換細胞類別：只重畫兩個格子與兩列統計，檔案搬移交給背景執行緒
         toggle_map = {1: 2, 2: 1, 3: 4, 4: 3, 5: 6, 6: 5}  # 定義切換映射
         new_class_id = toggle_map[current_class_id]  # 獲取新類別
         filename = os.path.basename(img_path)  # 獲取檔案名稱
-        new_dir = os.path.join("./sorted", str(new_class_id))  # 構建新資料夾路徑
-        os.makedirs(new_dir, exist_ok=True)  # 創建資料夾
-
-        try:
-            dst_path = os.path.join(new_dir, filename)  # 構建目標路徑
-            shutil.move(img_path, dst_path)  # 移動檔案
-            os.utime(dst_path, None)  # 更新檔案時間
-            print(f"✅ 已將 {filename} 從類別 {current_class_id} 移至 {new_class_id}")
-            self.root.after(0, self.generate_summary_image)  # 更新總覽圖表
-        except Exception as e:
-            print(f"❌ 移動失敗: {e}")  # 打印錯誤訊息
+        dst_path = os.path.join("./sorted", str(new_class_id), filename)  # 構建目標路徑
+
+        self.summary_atlas.move(current_class_id, index, new_class_id, dst_path)  # 更新記憶體中的類別與畫布
+        self.summary_photo.paste(self.summary_atlas.to_pil())  # 沿用同一張 PhotoImage
+        self.update_stats_rows(self.summary_atlas.counts, class_ids=(current_class_id, new_class_id))  # 只更新兩列統計
+        self.move_queue.put((img_path, dst_path))  # 背景搬移檔案
+        print(f"✅ 已將 {filename} 從類別 {current_class_id} 移至 {new_class_id}")
+
+    def file_mover_loop(self):
+        # 背景執行緒：依序把手動改類別的檔案搬到新資料夾
+        while True:
+            src_path, dst_path = self.move_queue.get()
+            try:
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)  # 創建資料夾
+                shutil.move(src_path, dst_path)  # 移動檔案
+                os.utime(dst_path, None)  # 更新檔案時間
+            except Exception as e:
+                print(f"❌ 移動失敗: {e}")  # 打印錯誤訊息
+            finally:
+                self.summary_atlas.finish_move(dst_path)  # 搬移結束後總覽改以磁碟內容為準
+                self.move_queue.task_done()
 
     def on_yolo_select(self, event):
         # 處理 YOLO 模型選擇事件
         selected_yolo_model = self.yolo_model_selector.get()  # 獲取選中模型
         if selected_yolo_model != self.current_yolo_model:  # 檢查是否為新模型
             self.current_yolo_model = selected_yolo_model  # 更新當前模型
-            yolo_folder = os.path.join("./weights", "YOLO")  # 構建 YOLO 資料夾路徑
-            self.yolo_model = load_yolo_model(os.path.join(yolo_folder, self.current_yolo_model))  # 載入新模型
+            self.request_yolo_model()  # 背景載入新模型，管線需要時才等待
+            self.slice_detections = {}  # 偵測結果跟著模型失效
             print(f"✅ 已切換至 YOLO 模型: {self.current_yolo_model}")
             for widget in self.image_frame.winfo_children():
                 widget.destroy()  # 清空總覽框架
@@ -648,8 +759,7 @@ class CellImageGUI:
         for widget in self.stats_frame.winfo_children():
             widget.destroy()  # 清空統計框架
         self.stats_rows = []  # 重置統計行
-        self.cleanup_temp_files()  # 清理臨時檔案
-        self.load_image()  # 載入圖片
+        self.load_image(prepare=self.cleanup_temp_files)  # 載入圖片；舊切片的工作停下後才清理臨時檔案
         self.update_slice_info()  # 更新切片資訊
 
     def next_image(self):
@@ -662,12 +772,12 @@ class CellImageGUI:
         for widget in self.stats_frame.winfo_children():
             widget.destroy()  # 清空統計框架
         self.stats_rows = []  # 重置統計行
-        self.cleanup_temp_files()  # 清理臨時檔案
-        self.load_image()  # 載入圖片
+        self.load_image(prepare=self.cleanup_temp_files)  # 載入圖片；舊切片的工作停下後才清理臨時檔案
         self.update_slice_info()  # 更新切片資訊
 
-    def load_image(self):
+    def load_image(self, prepare=None):
         # 載入當前圖片
+        # prepare：交給管線工作在開始前執行 (在排程器中執行，舊切片的工作已經停下)
         if not self.image_files:  # 檢查是否有圖片
             self.img_label.configure(image=None, text="尚未載入圖片")  # 顯示提示
             self.update_slice_info()  # 更新切片資訊
@@ -691,11 +801,10 @@ class CellImageGUI:
         self.esrgan_progress['value'] = 0  # 重置進度條
         self.esrgan_progress.lift()  # 顯示進度條
         self.root.update_idletasks()  # 更新界面
-        threading.Thread(
-            target=self.run_full_pipeline,
-            args=(selected_img_name, selected_img_path, esrgan_output_path, light_contrast_output_path, final_with_boxes_path, final_txt_path),
-            daemon=True  # 設置為背景執行緒
-        ).start()  # 啟動執行緒
+        # 交給排程器：同一時間只處理一個切片，先前還沒做完的切片工作自動作廢
+        self.scheduler.submit(self.run_full_pipeline, selected_img_name, selected_img_path, esrgan_output_path,
+                              light_contrast_output_path, final_with_boxes_path, final_txt_path,
+                              group="slice", priority=PRIORITY_CURRENT, prepare=prepare)
 
         self.update_slice_info()  # 更新切片資訊
 
@@ -720,6 +829,12 @@ class CellImageGUI:
             print(f"⚠️ 選擇的圖片 {selected_image} 不在原始圖片列表中！")
             return
 
+        self.summary_ready = True  # 設置總覽準備狀態
+        # 清空與切割交給排程器：舊切片的工作可能還在讀 IMAGE_FOLDER，等它停下後才動手
+        self.scheduler.submit(self.split_origin_image, selected_image, group="slice", priority=PRIORITY_CURRENT)
+
+    def split_origin_image(self, selected_image, token):
+        # 排程器的 worker 執行緒：清空 IMAGE_FOLDER 並切割原圖，完成後通知主執行緒載入切片
         if os.path.exists(IMAGE_FOLDER):  # 檢查資料夾是否存在
             for file in os.listdir(IMAGE_FOLDER):  # 遍歷資料夾內容
                 file_path = os.path.join(IMAGE_FOLDER, file)
@@ -728,16 +843,20 @@ class CellImageGUI:
         else:
             os.makedirs(IMAGE_FOLDER)  # 創建資料夾
 
-        self.summary_ready = True  # 設置總覽準備狀態
         current_path = os.path.join(ORIGIN_FOLDER, selected_image)  # 構建圖片路徑
-
         try:
-            split_paths = split_image_to_nine(current_path, IMAGE_FOLDER)  # 執行圖片分割
+            with metrics.stage("split", items=1):
+                # 相鄰切片重疊 TILE_OVERLAP 像素，切在邊界上的細胞至少會完整出現在其中一張切片裡
+                _, regions = split_image_tiles(current_path, IMAGE_FOLDER, overlap=TILE_OVERLAP)  # 執行圖片分割
         except Exception as e:
             print(f"切割失敗: {e}")  # 打印錯誤訊息
             return
+        self.progress_bus.job(token).post("slices", selected_image, regions)
 
+    def show_split_slices(self, selected_image, regions):
+        # 主執行緒：原圖切割完成後更新切片列表並載入第一張
         base_name = os.path.splitext(selected_image)[0]  # 獲取檔案名（不含擴展名）
+        self.slice_regions = {f"{base_name}_{idx+1}.jpg": region for idx, region in enumerate(regions)}
         self.image_files = sorted([
             f for f in os.listdir(IMAGE_FOLDER)
             if f.lower().endswith((".jpg", ".png", ".bmp")) and f.startswith(base_name)
@@ -747,6 +866,14 @@ class CellImageGUI:
         if self.image_files:
             self.load_image()  # 載入第一張圖片
 
+    def show_metrics_panel(self):
+        # 開啟效能面板 (已開啟時只拉到最前面)
+        panel = getattr(self, 'metrics_panel', None)
+        if panel is not None and panel.window.winfo_exists():
+            panel.window.lift()
+            return
+        self.metrics_panel = MetricsPanel(self.root, metrics, output_dir=METRICS_OUTPUT_DIR)
+
     def cleanup_temp_files(self):
         # 清理臨時檔案和資料夾
         temp_folders = ["./image/ESRGAN/", "./image/light&contrast/", "./image/YOLO/", "./image/label/", "./image/cropped/"]  # 定義臨時資料夾
@@ -0,0 +1,206 @@
+# batch_cli.py
+# 無 GUI 的批次處理：對 ORIGIN_FOLDER 裡每張原圖跑完整管線
+# 重疊切片 → 超解析 → 亮度對比 → YOLO → 裁切 → 全域 NMS 合併 → 分類 (細胞座標為原圖座標)
+# 用法：python batch_cli.py --workers 4 --output ./batch_output
+#       python batch_cli.py --tile-size 1024 --overlap 48     (依原圖大小自動切片)
+#       python batch_cli.py --yolo-backend onnx               (YOLO 改用 ONNX Runtime)
+# 中斷後用同樣的指令重跑，會依 checkpoint 清單從中斷處繼續
+
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import ORIGIN_FOLDER, CLASS_NAMES, NUM_CLASSES, CLASSIFY_BATCH_SIZE, TILE_ROWS, TILE_COLS, TILE_OVERLAP, TILE_SIZE, YOLO_BACKEND
+from metrics import metrics
+from tiled_reader import TiledImage
+
+CELL_COLUMNS = ["image", "slice", "cell", "x1", "y1", "x2", "y2", "det_conf", "class_id", "class_name", "class_conf"]
+IMAGE_COLUMNS = ["image", "slices", "cells"] + [CLASS_NAMES[cid] for cid in range(1, NUM_CLASSES + 1)]
+
+# 每個 worker 行程各自持有的模型
+_worker_state = {}
+
+def _init_worker(yolo_path, classifier_name, device_name, contrast, brightness, slice_batch=None, tiling=None, yolo_backend="pytorch"):
+    # worker 行程啟動時載入一次模型，之後每張原圖重複使用
+    import torch
+    from image_utils import load_yolo_model, load_classifier, get_esrgan_engine
+
+    device = torch.device(device_name)
+    load_yolo_model(yolo_path, yolo_backend)
+    get_esrgan_engine()
+    classifier, normalization = load_classifier(classifier_name, device)
+    _worker_state.update(
+        classifier=classifier,
+        normalization=normalization,
+        device=device,
+        contrast=contrast,
+        brightness=brightness,
+        slice_batch=slice_batch,
+        tiling=tiling or {},
+    )
+
+def process_origin_image(image_path):
+    """
+    在 worker 行程中處理一張原圖
+    回傳：(原圖檔名, 每個細胞的資料列 list, 整張原圖的統計列, 這張原圖的各階段效能紀錄)
+    細胞座標為原圖座標，重疊切片間的重複偵測已合併
+    """
+    from pipeline import run_origin_pipeline
+
+    image_name = os.path.basename(image_path)
+    # 大型 TIFF 以記憶體映射開啟，切片處理到時才讀出
+    with TiledImage(image_path) as img:
+        result = run_origin_pipeline(
+            img,
+            _worker_state["classifier"],
+            _worker_state["normalization"],
+            _worker_state["device"],
+            contrast=_worker_state["contrast"],
+            brightness=_worker_state["brightness"],
+            classify_batch_size=CLASSIFY_BATCH_SIZE,
+            slice_batch=_worker_state["slice_batch"],
+            **_worker_state["tiling"],
+        )
+
+    base_name = os.path.splitext(image_name)[0]
+    cell_rows = []
+    class_counts = {cid: 0 for cid in range(1, NUM_CLASSES + 1)}
+    detections = result["detections"]
+    for cell_idx, (box, det_conf, tile, pred, class_conf) in enumerate(zip(detections["boxes"], detections["confs"], detections["tiles"], result["classes"], result["class_confs"])):
+        class_id = int(pred) + 1
+        class_counts[class_id] += 1
+        x1, y1, x2, y2 = (round(float(v), 1) for v in box)
+        cell_rows.append([image_name, f"{base_name}_{int(tile)+1}", cell_idx, x1, y1, x2, y2,
+                          round(float(det_conf), 4), class_id, CLASS_NAMES[class_id], round(float(class_conf), 4)])
+
+    image_row = [image_name, len(result["regions"]), len(cell_rows)] + [class_counts[cid] for cid in range(1, NUM_CLASSES + 1)]
+    return image_name, cell_rows, image_row, metrics.drain_records()
+
+def load_manifest(manifest_path):
+    # 讀取 checkpoint 清單，回傳已完成的原圖檔名集合
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return set(json.load(f).get("completed", []))
+
+def save_manifest(manifest_path, completed):
+    # 先寫暫存檔再取代，避免中斷時留下寫一半的清單
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"completed": sorted(completed)}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def drop_unfinished_rows(csv_path, completed):
+    # 上次中斷時可能已寫出結果但還沒記進清單，重跑前把這些資料列移除避免重複
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return
+    kept = [rows[0]] + [row for row in rows[1:] if row and row[0] in completed]
+    if len(kept) != len(rows):
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(kept)
+        print(f"🔍 已移除 {len(rows) - len(kept)} 筆未完成的資料列: {csv_path}")
+
+def open_csv(csv_path, columns):
+    # 以附加模式開啟結果檔，新檔案先寫標題列
+    is_new = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    f = open(csv_path, "a", newline="", encoding="utf-8")
+    writer = csv.writer(f)
+    if is_new:
+        writer.writerow(columns)
+    return f, writer
+
+def main():
+    from yolo_backend import BACKENDS, export_yolo
+
+    parser = argparse.ArgumentParser(description="批次執行細胞活性分析管線 (無 GUI)")
+    parser.add_argument("--origin", default=ORIGIN_FOLDER, help="原圖資料夾")
+    parser.add_argument("--output", default="./batch_output", help="結果輸出資料夾")
+    parser.add_argument("--workers", type=int, default=1, help="worker 行程數")
+    parser.add_argument("--yolo", default=None, help="YOLO 權重路徑 (預設為 ./weights/YOLO 中的第一個)")
+    parser.add_argument("--yolo-backend", choices=BACKENDS, default=YOLO_BACKEND, help="YOLO 推論後端 (onnx / openvino 在 CPU 上較快)")
+    parser.add_argument("--classifier", default="Vision.pth", help="分類模型權重檔名 (位於 ./weights)")
+    parser.add_argument("--device", default="cpu", help="分類模型使用的裝置")
+    parser.add_argument("--contrast", type=float, default=0)
+    parser.add_argument("--brightness", type=float, default=0)
+    parser.add_argument("--slice-batch", type=int, default=None, help="每次讀入並處理的切片數 (預設全部一起；超大原圖可設小一點降低記憶體用量)")
+    parser.add_argument("--rows", type=int, default=TILE_ROWS, help="切片列數")
+    parser.add_argument("--cols", type=int, default=TILE_COLS, help="切片行數")
+    parser.add_argument("--overlap", type=int, default=TILE_OVERLAP, help="相鄰切片重疊的像素數")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="依原圖大小自動切片，每塊不超過這個邊長 (取代 --rows / --cols)")
+    args = parser.parse_args()
+
+    yolo_path = args.yolo
+    if yolo_path is None:
+        yolo_folder = os.path.join("./weights", "YOLO")
+        candidates = sorted(f for f in os.listdir(yolo_folder) if f.endswith(".pt"))
+        if not candidates:
+            print(f"❌ 無可用 YOLO 模型，請檢查 {yolo_folder} 資料夾")
+            return
+        yolo_path = os.path.join(yolo_folder, candidates[0])
+
+    yolo_backend = args.yolo_backend
+    if yolo_backend != "pytorch":
+        # 先在主行程匯出一次，避免多個 worker 同時匯出同一個權重
+        try:
+            export_yolo(yolo_path, yolo_backend)
+        except Exception as e:
+            print(f"⚠️ 無法使用 {yolo_backend} 後端，改用 PyTorch: {e}")
+            yolo_backend = "pytorch"
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = os.path.join(args.output, "checkpoint.json")
+    cells_path = os.path.join(args.output, "cells.csv")
+    images_path = os.path.join(args.output, "images.csv")
+
+    completed = load_manifest(manifest_path)
+    drop_unfinished_rows(cells_path, completed)
+    drop_unfinished_rows(images_path, completed)
+
+    origin_files = sorted(f for f in os.listdir(args.origin) if f.lower().endswith((".jpg", ".png", ".bmp", ".tif", ".tiff")))
+    pending = [f for f in origin_files if f not in completed]
+    print(f"🔍 共 {len(origin_files)} 張原圖，已完成 {len(origin_files) - len(pending)} 張，待處理 {len(pending)} 張")
+    if not pending:
+        return
+
+    cells_file, cells_writer = open_csv(cells_path, CELL_COLUMNS)
+    images_file, images_writer = open_csv(images_path, IMAGE_COLUMNS)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max(1, args.workers),
+            initializer=_init_worker,
+            initargs=(yolo_path, args.classifier, args.device, args.contrast, args.brightness, args.slice_batch,
+                      {"rows": args.rows, "cols": args.cols, "overlap": args.overlap, "tile_size": args.tile_size}, yolo_backend),
+        ) as executor:
+            futures = {executor.submit(process_origin_image, os.path.join(args.origin, f)): f for f in pending}
+            for future in as_completed(futures):
+                image_name = futures[future]
+                try:
+                    _, cell_rows, image_row, stage_records = future.result()
+                except Exception as e:
+                    print(f"❌ 處理 {image_name} 失敗: {e}")
+                    continue
+
+                # 結果先落地，再記進 checkpoint 清單
+                cells_writer.writerows(cell_rows)
+                images_writer.writerow(image_row)
+                cells_file.flush()
+                images_file.flush()
+                metrics.extend(stage_records)  # 合併 worker 的效能紀錄
+                completed.add(image_name)
+                save_manifest(manifest_path, completed)
+                print(f"✅ {image_name} 完成，共 {len(cell_rows)} 個細胞 ({len(completed)}/{len(origin_files)})")
+    finally:
+        cells_file.close()
+        images_file.close()
+        metrics.dump_json(os.path.join(args.output, "metrics.json"))
+        metrics.dump_csv(os.path.join(args.output, "metrics.csv"))
+
+    print(f"🎉 批次處理完成，結果已輸出到 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# benchmark.py
+# 各管線階段的可重現效能測試 (只需 CPU，不需下載任何權重)
+# 以合成的綠 (活) / 紅 (死) 螢光細胞原圖測量：切割 → 超解析 → 亮度對比 → 偵測 → 裁切 → 分類 → 總覽
+# 超解析、偵測、分類改用隨機初始化的小模型代替，只量測資料搬移與前後處理的成本
+# 用法：python benchmark.py --sizes 768 1536 --repeat 3 --output ./metrics/benchmark.json
+#       python benchmark.py --compare ./metrics/benchmark_old.json   (與上一次的報告比較)
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import platform
+import argparse
+import subprocess
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from metrics import PipelineMetrics
+from summary_atlas import SummaryAtlas
+from image_utils import split_image_arrays, split_image_to_nine, adjust_image, draw_detections, crop_detections, classify_crops
+from config import NUM_CLASSES
+
+SR_SCALE = 4
+STAGES = ["split", "split_to_files", "sr", "adjust", "detect", "crop", "classify", "summary"]
+
+def make_synthetic_slide(size, live, dead, seed=0, rows=3, cols=3):
+    """
+    產生一張 size x size 的合成螢光原圖 (BGR)
+    活細胞為綠色、死細胞為紅色的模糊圓點，彼此不重疊且不跨越切割線，所以切割後總數不變
+    回傳：(影像, 活細胞數, 死細胞數)
+    """
+    rng = np.random.default_rng(seed)
+    img = rng.normal(12, 4, (size, size, 3)).clip(0, 255).astype(np.uint8)  # 暗背景雜訊
+    radius_max = max(3, size // 160)
+    tile_h, tile_w = size // rows, size // cols
+    margin = radius_max * 3
+
+    centers = []
+    placed = {"live": 0, "dead": 0}
+    for kind, target in (("live", live), ("dead", dead)):
+        attempts = 0
+        while placed[kind] < target and attempts < target * 200:
+            attempts += 1
+            x, y = rng.integers(margin, size - margin, 2)
+            if min(x % tile_w, tile_w - x % tile_w, y % tile_h, tile_h - y % tile_h) < margin:
+                continue  # 太靠近切割線
+            if any((x - cx) ** 2 + (y - cy) ** 2 < (3 * radius_max) ** 2 for cx, cy in centers):
+                continue  # 與其他細胞重疊
+            radius = int(rng.integers(max(2, radius_max // 2), radius_max + 1))
+            intensity = int(rng.integers(140, 255))
+            color = (0, intensity, 0) if kind == "live" else (0, 0, intensity)
+            cv2.circle(img, (int(x), int(y)), radius, color, -1, lineType=cv2.LINE_AA)
+            centers.append((x, y))
+            placed[kind] += 1
+    img = cv2.GaussianBlur(img, (0, 0), max(0.8, radius_max / 4))
+    return img, placed["live"], placed["dead"]
+
+class TinyUpscaler(nn.Module):
+    """代替 RRDBNet 的小型 x4 超解析網路 (隨機權重)，輸出大小與資料流與真實引擎相同"""
+    def __init__(self, scale=SR_SCALE):
+        super().__init__()
+        self.scale = scale
+        self.body = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(inplace=True), nn.Conv2d(8, 3 * scale * scale, 3, padding=1))
+        self.shuffle = nn.PixelShuffle(scale)
+
+    def forward(self, x):
+        base = nn.functional.interpolate(x, scale_factor=self.scale, mode="nearest")
+        return base + 0.01 * self.shuffle(self.body(x))  # 結果接近最近鄰放大，偵測結果仍可預期
+
+    def enhance_batch(self, images):
+        outputs = []
+        with torch.no_grad():
+            for img in images:
+                tensor = torch.from_numpy(np.ascontiguousarray(img)).permute(2, 0, 1).unsqueeze(0).float().div_(255)
+                out = self(tensor).squeeze(0).clamp_(0, 1).mul_(255).round_()
+                outputs.append(out.permute(1, 2, 0).to(torch.uint8).numpy())
+        return outputs
+
+class TinyDetector:
+    """代替 YOLO 的偵測器：亮度門檻 + 連通元件，輸出格式與 yolo_detect 相同"""
+    def __init__(self, threshold=60, min_area=4):
+        self.threshold = threshold
+        self.min_area = min_area
+
+    def detect(self, img):
+        mask = (img[:, :, 1:].max(axis=2) > self.threshold).astype(np.uint8)  # 綠或紅通道
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        stats = stats[1:]  # 去掉背景
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area]
+        x, y, w, h = (stats[:, i].astype(np.float32) for i in (cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP, cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT))
+        return {
+            "boxes": np.stack([x, y, x + w, y + h], axis=1) if len(stats) else np.zeros((0, 4), dtype=np.float32),
+            "classes": np.zeros(len(stats), dtype=np.int64),
+            "confs": np.ones(len(stats), dtype=np.float32),
+        }
+
+def tiny_classifier():
+    """代替 timm 分類模型的小型 CNN (隨機權重)，輸入 224x224，輸出 NUM_CLASSES 類"""
+    return nn.Sequential(
+        nn.Conv2d(3, 8, 3, stride=4, padding=1), nn.ReLU(inplace=True),
+        nn.Conv2d(8, 16, 3, stride=4, padding=1), nn.ReLU(inplace=True),
+        nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(16, NUM_CLASSES),
+    ).eval()
+
+def benchmark_slide(slide, recorder, upscaler, detector, classifier, work_dir):
+    """對一張原圖跑一次完整管線，各階段計時記在 recorder；回傳偵測到的細胞數"""
+    with recorder.stage("split", items=1):
+        slices = split_image_arrays(slide, 3, 3)
+
+    slide_path = os.path.join(work_dir, "slide.png")
+    cv2.imwrite(slide_path, slide)
+    split_folder = os.path.join(work_dir, "split")
+    with recorder.stage("split_to_files", items=1):
+        split_image_to_nine(slide_path, split_folder)
+
+    with recorder.stage("sr", items=len(slices)):
+        sr_images = upscaler.enhance_batch(slices)
+
+    with recorder.stage("adjust", items=len(sr_images)):
+        adjusted = [adjust_image(img, 0, 0) for img in sr_images]
+
+    with recorder.stage("detect", items=len(adjusted)):
+        detections = [detector.detect(img) for img in adjusted]
+
+    crops = []
+    with recorder.stage("crop", items=sum(len(d["boxes"]) for d in detections)):
+        for img, slice_detections in zip(adjusted, detections):
+            draw_detections(img, slice_detections)
+            crops.extend(crop_detections(img, slice_detections))
+
+    with recorder.stage("classify", items=len(crops)):
+        preds, _ = classify_crops(classifier, crops, [0.5, 0.5, 0.5], [0.5, 0.5, 0.5], torch.device("cpu"))
+
+    # 總覽：分類結果寫進各類別資料夾 (不計時)，只量測畫布同步
+    cluster_folder = os.path.join(work_dir, "sorted")
+    shutil.rmtree(cluster_folder, ignore_errors=True)
+    for class_id in range(1, NUM_CLASSES + 1):
+        os.makedirs(os.path.join(cluster_folder, str(class_id)), exist_ok=True)
+    for idx, (crop, pred) in enumerate(zip(crops, preds.tolist())):
+        cv2.imwrite(os.path.join(cluster_folder, str(pred + 1), f"slide_{idx}_c{pred+1}.jpg"), crop)
+    with recorder.stage("summary", items=len(crops)):
+        SummaryAtlas().sync(cluster_folder, "slide")
+
+    return len(crops)
+
+def environment_info():
+    # 報告中記錄執行環境，比較不同提交時才知道數字是否可比
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+def run_benchmark(sizes, repeat=3, seed=0, density=1e-4):
+    """
+    每個解析度先暖機一次，再重複 repeat 次
+    density：每個像素的細胞數，活 / 死各半
+    回傳：可直接寫成 JSON 的報告 dict
+    """
+    torch.manual_seed(seed)
+    upscaler = TinyUpscaler().eval()
+    detector = TinyDetector()
+    classifier = tiny_classifier()
+
+    report = {"environment": environment_info(), "config": {"sizes": sizes, "repeat": repeat, "seed": seed, "density": density}, "results": {}}
+    work_dir = tempfile.mkdtemp(prefix="cell_benchmark_")
+    try:
+        for size in sizes:
+            cells = max(2, int(size * size * density))
+            slide, live, dead = make_synthetic_slide(size, cells // 2, cells - cells // 2, seed=seed)
+            print(f"🔍 {size}x{size}：活細胞 {live}、死細胞 {dead}")
+
+            benchmark_slide(slide, PipelineMetrics(), upscaler, detector, classifier, work_dir)  # 暖機，不計入
+            recorder = PipelineMetrics()
+            detected = 0
+            for _ in range(repeat):
+                detected = benchmark_slide(slide, recorder, upscaler, detector, classifier, work_dir)
+
+            summary = recorder.summary()
+            report["results"][f"{size}x{size}"] = {
+                "live": live,
+                "dead": dead,
+                "detected": detected,
+                "count_error": detected - (live + dead),
+                "peak_rss_mb": summary["peak_rss_mb"],
+                "stages": summary["stages"],
+            }
+            total = sum(stats["mean_wall_ms"] for stats in summary["stages"].values())
+            print(f"✅ {size}x{size} 完成：每次 {total:.1f} ms，偵測 {detected}/{live + dead} 個細胞")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+def compare_reports(baseline, current):
+    """印出每個解析度、每個階段的平均時間與 baseline 的比值 (<1 代表變快)"""
+    for resolution, result in current["results"].items():
+        base = baseline.get("results", {}).get(resolution)
+        if base is None:
+            continue
+        print(f"📊 {resolution}")
+        for stage in STAGES:
+            new = result["stages"].get(stage)
+            old = base["stages"].get(stage)
+            if new is None or old is None or not old["mean_wall_ms"]:
+                continue
+            ratio = new["mean_wall_ms"] / old["mean_wall_ms"]
+            print(f"   {stage:<15}{old['mean_wall_ms']:>10.2f} ms → {new['mean_wall_ms']:>10.2f} ms  x{ratio:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="細胞活性管線各階段效能測試 (合成影像、CPU、不需權重)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[768, 1536, 3072], help="合成原圖的邊長 (像素)")
+    parser.add_argument("--repeat", type=int, default=3, help="每個解析度重複次數 (不含暖機)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=None, help="torch 執行緒數，固定後結果較穩定")
+    parser.add_argument("--output", default="./metrics/benchmark.json", help="報告輸出路徑")
+    parser.add_argument("--compare", default=None, help="要比較的舊報告")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+        cv2.setNumThreads(args.threads)
+
+    report = run_benchmark(args.sizes, repeat=args.repeat, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 已輸出效能報告: {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_reports(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# classifier_backend.py
+# timm 細胞分類模型的 CPU 加速模式 (選用，預設仍為 fp32)
+# 模式名稱可以用 + 組合，例如 "int8+channels_last"：
+#   fp32           原本的 eager fp32
+#   int8           nn.Linear 動態 int8 量化 (ViT / Swin 大部分計算在 Linear)
+#   bf16           bf16 autocast (CPU 支援 AVX512-BF16 / AMX 時才有效)
+#   channels_last  NHWC 記憶體排列 (卷積網路如 MobileNet 較有幫助)
+#   onnx           匯出 ONNX 後以 ONNX Runtime 推論 (不能和其他模式組合)
+# ONNX 匯出結果放在權重旁邊，檔名帶權重雜湊：weights/Vision.<雜湊>.onnx
+#
+# 加速後的結果與 fp32 可能有些微差異，先用留存的細胞小圖比較再決定要用哪個模式：
+#     python classifier_backend.py --model Vision.pth --crops ./sorted
+#     python classifier_backend.py --model best_mobilenet.pth --crops ./image/cropped --modes fp32 int8 channels_last onnx --output drift.xlsx
+# crops 資料夾底下若是 1 ~ 6 的類別子資料夾 (如 ./sorted)，報表會另外列出各模式的正確率
+
+import os
+import copy
+import glob
+import time
+import inspect
+import argparse
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from result_cache import file_fingerprint
+
+MODES = ("fp32", "int8", "bf16", "channels_last", "onnx")
+DRIFT_TOLERANCE = 0.99  # 與 fp32 預測類別一致的比例至少要這麼多才算在容許範圍內
+
+def parse_mode(mode):
+    """把 "int8+channels_last" 拆成選項集合，並檢查組合是否合法"""
+    options = {part.strip() for part in mode.split("+") if part.strip()} - {"fp32"}
+    unknown = options - set(MODES)
+    if unknown:
+        raise ValueError(f"未知的分類加速模式: {', '.join(sorted(unknown))} (可用 {', '.join(MODES)})")
+    if "onnx" in options and len(options) > 1:
+        raise ValueError("onnx 模式不能和其他模式組合")
+    return options
+
+def bf16_supported():
+    """CPU 是否有原生 bf16 指令 (沒有時 autocast 反而變慢)"""
+    checks = [getattr(torch.cpu, name, None) for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported")]
+    return any(check() for check in checks if check is not None)
+
+class _AutocastBF16(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return self.model(x)
+
+class _ChannelsLast(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+class _OnnxClassifier:
+    """ONNX Runtime 的包裝，呼叫方式與 nn.Module 相同 (輸入輸出皆為 torch.Tensor)"""
+    def __init__(self, onnx_path):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("onnx 模式需要安裝 onnxruntime (pip install onnxruntime)")
+        self.session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        logits = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+    def eval(self):
+        return self
+
+def export_classifier_onnx(model, weights_path, input_size=224):
+    """匯出 (或取回已匯出的) ONNX 分類模型，權重檔更新時重新匯出並刪除舊檔"""
+    stem = os.path.splitext(weights_path)[0]
+    target = f"{stem}.{file_fingerprint(weights_path)[:12]}.onnx"
+    if os.path.exists(target):
+        return target
+    for stale in glob.glob(f"{glob.escape(stem)}.{'[0-9a-f]' * 12}.onnx"):
+        os.remove(stale)
+        print(f"🔍 已刪除過期的匯出模型: {stale}")
+
+    print(f"🔍 匯出 {os.path.basename(weights_path)} 為 ONNX (只需一次)...")
+    example = torch.zeros(1, 3, input_size, input_size)
+    # 較新的 torch 預設改用 dynamo 匯出器，這裡固定使用 TorchScript 匯出器
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    tmp_path = target + ".tmp"
+    torch.onnx.export(model.cpu().eval(), example, tmp_path, input_names=["input"], output_names=["logits"],
+                      dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}}, opset_version=17, **extra)
+    os.replace(tmp_path, target)
+    print(f"✅ 已匯出: {target}")
+    return target
+
+def accelerate_classifier(model, mode="fp32", weights_path=None, input_size=224):
+    """
+    依模式包裝已載入權重的 fp32 模型 (只支援 CPU)
+    回傳：可直接交給 classify_crops 的模型
+    """
+    options = parse_mode(mode)
+    model.eval()
+    if "onnx" in options:
+        if weights_path is None:
+            raise ValueError("onnx 模式需要權重路徑 (用來快取匯出結果)")
+        return _OnnxClassifier(export_classifier_onnx(model, weights_path, input_size))
+    if "int8" in options:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if "channels_last" in options:
+        model = _ChannelsLast(model)
+    if "bf16" in options:
+        if not bf16_supported():
+            print("⚠️ 此 CPU 沒有原生 bf16 指令，bf16 模式可能比 fp32 慢")
+        model = _AutocastBF16(model)
+    return model.eval()
+
+def _load_crops(crop_dir, limit):
+    # 有 1 ~ 6 的類別子資料夾時以資料夾名稱作為標註 (0 起算)，否則沒有標註
+    exts = (".jpg", ".png", ".bmp")
+    subdirs = sorted(d for d in os.listdir(crop_dir) if d.isdigit() and os.path.isdir(os.path.join(crop_dir, d)))
+    if subdirs:
+        items = [(os.path.join(crop_dir, d, f), int(d) - 1) for d in subdirs
+                 for f in sorted(os.listdir(os.path.join(crop_dir, d))) if f.lower().endswith(exts)]
+    else:
+        items = [(os.path.join(crop_dir, f), None) for f in sorted(os.listdir(crop_dir)) if f.lower().endswith(exts)]
+    items = items[:limit] if limit else items
+    crops, labels = [], []
+    for path, label in items:
+        img = cv2.imread(path)
+        if img is not None:
+            crops.append(img)
+            labels.append(label)
+    return crops, labels
+
+def _run(model, crops, normalization, batch_size):
+    # 回傳 (預測類別, 每類機率, 每張平均毫秒數)；機率用 classify_crops 相同的前處理自行計算
+    from image_utils import classify_crops
+    mean, std = normalization
+    classify_crops(model, crops[:batch_size], mean, std, torch.device("cpu"), batch_size=batch_size)  # 暖機
+    probs = []
+
+    class _Recorder:
+        # 記下每批的 softmax，classify_crops 本身只回傳最大值
+        def __call__(self, x):
+            logits = model(x)
+            probs.append(torch.softmax(logits.float(), dim=1).cpu().numpy())
+            return logits
+
+    start = time.perf_counter()
+    preds, _ = classify_crops(_Recorder(), crops, mean, std, torch.device("cpu"), batch_size=batch_size)
+    elapsed = (time.perf_counter() - start) * 1000 / len(crops)
+    return preds, np.concatenate(probs), elapsed
+
+def drift_report(base_model, weights_path, crops, normalization, modes, labels=None, batch_size=32, input_size=224):
+    """
+    用同一組細胞小圖比較各加速模式與 fp32 的差異與速度
+    回傳：每個模式一個 dict (與 fp32 一致的比例、機率最大差異、平均毫秒數、加速倍率、正確率)
+    """
+    reference_preds, reference_probs, reference_ms = _run(base_model, crops, normalization, batch_size)
+    has_labels = labels is not None and all(label is not None for label in labels)
+    rows = []
+    for mode in modes:
+        if not parse_mode(mode):
+            preds, probs, ms = reference_preds, reference_probs, reference_ms
+        else:
+            try:
+                model = accelerate_classifier(copy.deepcopy(base_model), mode, weights_path, input_size)
+                preds, probs, ms = _run(model, crops, normalization, batch_size)
+            except Exception as e:
+                print(f"❌ {mode} 模式無法使用: {e}")
+                continue
+        agreement = float((preds == reference_preds).mean())
+        diff = np.abs(probs - reference_probs)
+        rows.append({
+            "mode": mode,
+            "agreement": agreement,
+            "max_prob_diff": float(diff.max()),
+            "mean_prob_diff": float(diff.mean()),
+            "ms_per_crop": ms,
+            "speedup": reference_ms / ms,
+            "accuracy": float((preds == np.asarray(labels)).mean()) if has_labels else None,
+            "within_tolerance": agreement >= DRIFT_TOLERANCE,
+        })
+    return rows
+
+REPORT_COLUMNS = ["模式", "與 fp32 一致比例", "機率最大差異", "機率平均差異", "毫秒/張", "加速倍率", "正確率", "在容許範圍內"]
+REPORT_TYPES = ["str", "float", "float", "float", "float", "float", "float", "bool"]
+
+def main():
+    from image_utils import load_classifier
+    from result_sink import open_sink
+
+    parser = argparse.ArgumentParser(description="比較細胞分類模型各加速模式與 fp32 的準確度差異與速度")
+    parser.add_argument("--model", default="Vision.pth", help="分類模型權重檔名 (位於 --weights)")
+    parser.add_argument("--weights", default="./weights")
+    parser.add_argument("--crops", default="./sorted", help="留存的細胞小圖資料夾 (可含 1 ~ 6 類別子資料夾)")
+    parser.add_argument("--modes", nargs="+", default=["fp32", "int8", "bf16", "channels_last", "int8+channels_last", "onnx"])
+    parser.add_argument("--limit", type=int, default=2000, help="最多使用幾張小圖")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", default=None, help="另存報表 (.csv / .parquet / .xlsx)")
+    args = parser.parse_args()
+
+    crops, labels = _load_crops(args.crops, args.limit)
+    if not crops:
+        print(f"❌ {args.crops} 中沒有可用的小圖")
+        return
+
+    torch.set_grad_enabled(False)
+    model, normalization = load_classifier(args.model, torch.device("cpu"), args.weights, mode="fp32")
+    rows = drift_report(model, os.path.join(args.weights, args.model), crops, normalization, args.modes,
+                        labels, args.batch_size)
+
+    print(f"📊 {args.model}，{len(crops)} 張小圖")
+    for row in rows:
+        status = "✅" if row["within_tolerance"] else "⚠️"
+        accuracy = f"，正確率 {row['accuracy']:.3f}" if row["accuracy"] is not None else ""
+        print(f"{status} {row['mode']:<20} 一致 {row['agreement']:.4f}，機率差最大 {row['max_prob_diff']:.4f}"
+              f"{accuracy}，{row['ms_per_crop']:.2f} ms/張 (x{row['speedup']:.2f})")
+
+    candidates = [row for row in rows if row["within_tolerance"]]
+    if candidates:
+        best = max(candidates, key=lambda row: row["speedup"])
+        print(f"🎉 容許範圍內最快的模式: {best['mode']} (x{best['speedup']:.2f})，可設定 config.CLASSIFIER_MODE = \"{best['mode']}\"")
+
+    if args.output:
+        with open_sink(args.output) as sink:
+            table = sink.table("Classifier_Drift", REPORT_COLUMNS, REPORT_TYPES)
+            for row in rows:
+                table.write([row["mode"], row["agreement"], row["max_prob_diff"], row["mean_prob_diff"],
+                             row["ms_per_crop"], row["speedup"], row["accuracy"], row["within_tolerance"]])
+        print(f"✅ 已輸出報表: {args.output}")
+
+if __name__ == "__main__":
+    main()
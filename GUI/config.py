@@ -37,6 +37,48 @@ CLASS_NAMES_CH = {
     6: "弱 / 非活化",
 }
 
+# === 分類模型設定 ===
+# 權重檔名 -> timm 模型名稱
+CLASSIFIER_TIMM_MAP = {
+    "Vision.pth": "vit_base_patch16_224",
+    "best_mobilenet.pth": "mobilenetv2_100",
+    "swin_6class.pth": "swin_tiny_patch4_window7_224",
+}
+# 權重檔名 -> (mean, std) 正規化參數
+CLASSIFIER_NORMALIZATION = {
+    "Vision.pth": ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
+    "swin_6class.pth": ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]),
+    "best_mobilenet.pth": ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+}
+
 # === 統計表 標籤 ===
 ROW_LABELS = ["Strong", "Med", "Weak"]
 COL_LABELS = ["Activate", "Inactivate"]
+
+# === 管線設定 ===
+IN_MEMORY_PIPELINE = True  # True：各階段在記憶體內傳遞陣列，只有按「匯出」才寫檔
+CLASSIFY_BATCH_SIZE = 32   # 細胞分類每批張數
+PIPELINE_WORKERS = 1       # 管線排程器的 worker 數 (同一時間只處理目前的切片，多開只會互搶 CPU)
+CLASSIFIER_MODE = "fp32"   # 分類模型 CPU 加速模式："fp32" / "int8" / "bf16" / "channels_last" / "onnx"，可用 + 組合 (先用 classifier_backend.py 檢查準確度差異)
+YOLO_BACKEND = "pytorch"   # YOLO 推論後端："pytorch" / "onnx" / "openvino" (後兩者在 CPU 上較快，首次使用時自動匯出)
+
+# === 超解析 ===
+ESRGAN_WEIGHTS = "weights/RealESRGAN_x4plus.pth"  # Real-ESRGAN 權重 (快取鍵也以這個檔案的雜湊區分)
+ESRGAN_SCALE = 4                                   # 放大倍率
+
+# === 原圖切片 (批次管線) ===
+TILE_ROWS = 3        # 切片列數
+TILE_COLS = 3        # 切片行數
+TILE_OVERLAP = 32    # 相鄰切片重疊的像素數 (原圖座標)，應大於最大的細胞直徑
+TILE_SIZE = None     # 設定數值時依原圖大小自動決定列數/行數，每塊 (含重疊) 不超過這個邊長
+
+# === 模型登錄表 ===
+MODEL_REGISTRY_MAX_MODELS = 4    # 留在記憶體中的模型數 (YOLO 與分類模型合計)
+MODEL_REGISTRY_MAX_MB = 3072     # 留在記憶體中的模型總大小上限，超過時淘汰最久沒用的模型
+
+# === 結果快取 ===
+RESULT_CACHE_DIR = "./cache"     # 各階段結果快取的位置
+RESULT_CACHE_MAX_MB = 2048       # 快取容量上限，超過時淘汰最久沒用的項目
+
+# === 效能紀錄 ===
+METRICS_OUTPUT_DIR = "./metrics"  # 各階段計時與記憶體紀錄的匯出位置 (JSON / CSV)
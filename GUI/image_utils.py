@@ -1,120 +1,308 @@
 # image_utils.py
+# torch / timm / realesrgan / basicsr / ultralytics 很重 (合計數秒)，只在第一次用到的函式裡才匯入，
+# 讓 GUI 與 CLI 啟動時不必等待；各進入點的匯入時間可用 import_report.py 檢查
 
 import os
 import cv2
 from PIL import Image, ImageTk, ImageDraw, ImageFont
-from realesrgan import RealESRGANer
-import torch 
 import numpy as np
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from ultralytics import YOLO
-import timm
+from config import CLASSIFIER_TIMM_MAP, CLASSIFIER_NORMALIZATION, NUM_CLASSES, YOLO_BACKEND, CLASSIFIER_MODE, ESRGAN_WEIGHTS, ESRGAN_SCALE
+from preprocess import adjust_chain
+from tiled_reader import TiledImage
+from tiling import split_regions, tile_regions
 yolo_model = None
-def split_image_to_nine(img_path, output_folder):
+yolo_model_path = None  # 目前載入的 YOLO 權重路徑 (快取鍵會用到)
+yolo_backend = None     # 目前實際使用的推論後端 (快取鍵會用到)
+def split_image_arrays(img, rows=3, cols=3):
+    """
+    把 BGR 陣列切成 rows x cols 等分 (不寫檔)
+    img 也可以是 TiledImage，這時每一塊才從檔案讀出
+    回傳：切好的陣列 list，順序為由左到右、由上到下
+    """
+    h, w = img.shape[:2]
+    return [img[y1:y2, x1:x2] for x1, y1, x2, y2 in split_regions(h, w, rows, cols)]
+
+def split_image_to_nine(img_path, output_folder, overlap=0):
     """
     把指定圖片切成9等分，存到 output_folder
+    overlap：相鄰切片重疊的像素數，切在邊界上的細胞至少會完整出現在其中一張切片裡
+    大型 TIFF 以記憶體映射逐塊讀出，不會整張解碼
     回傳：切好的圖片路徑 list
     """
-    img = cv2.imread(img_path)
-    if img is None:
-        raise FileNotFoundError(f"Cannot load image: {img_path}")
-
-    h, w = img.shape[:2]
-    split_h = h // 3
-    split_w = w // 3
+    return split_image_tiles(img_path, output_folder, overlap=overlap)[0]
 
+def split_image_tiles(img_path, output_folder, rows=3, cols=3, overlap=0):
+    """
+    與 split_image_to_nine 相同，另外回傳每張切片在原圖中的區域
+    回傳：(切好的圖片路徑 list, [(x1, y1, x2, y2)])，順序為由左到右、由上到下
+    """
     os.makedirs(output_folder, exist_ok=True)
     split_paths = []
 
     base_name = os.path.splitext(os.path.basename(img_path))[0]
 
-    for row in range(3):
-        for col in range(3):
-            y1 = row * split_h
-            y2 = (row + 1) * split_h
-            x1 = col * split_w
-            x2 = (col + 1) * split_w
-            sub_img = img[y1:y2, x1:x2]
-
-            split_filename = f"{base_name}_{row*3+col+1}.jpg"
+    with TiledImage(img_path) as image:
+        regions = tile_regions(image.shape[0], image.shape[1], rows, cols, overlap)
+        for idx, sub_img in enumerate(image.regions(rows, cols, overlap)):
+            split_filename = f"{base_name}_{idx+1}.jpg"
             split_path = os.path.join(output_folder, split_filename)
             cv2.imwrite(split_path, sub_img)
             split_paths.append(split_path)
 
-    return split_paths
-def enhance_single_image(input_path, output_path):
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    return split_paths, regions
+
+SR_BATCH_MAX_PAD = 0.25  # 切片補邊後多出的面積比例上限，在這之內的切片合併成同一批推論
+
+class ESRGANEngine:
+    """
+    常駐的 Real-ESRGAN 超解析引擎：模型與權重只載入一次，之後重複使用
+    輸入/輸出皆為 BGR uint8 numpy 陣列 (cv2 慣例)
+    """
+    def __init__(self, model_path=ESRGAN_WEIGHTS, scale=ESRGAN_SCALE, tile=0, tile_pad=10, pre_pad=0, batch_size=3):
+        import torch
+        from realesrgan import RealESRGANer
+        from basicsr.archs.rrdbnet_arch import RRDBNet
+
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model_path = model_path
+        self.scale = scale
+        self.batch_size = batch_size
+        self.half = torch.cuda.is_available()  # 有GPU就開half
+
+        model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=scale)
+        self.upsampler = RealESRGANer(
+            scale=scale,
+            model_path=model_path,
+            model=model,
+            tile=tile,
+            tile_pad=tile_pad,
+            pre_pad=pre_pad,
+            half=self.half,
+            device=self.device
+        )
+        print(f"✅ 成功載入 Real-ESRGAN 模型: {model_path}")
+
+    def enhance(self, img):
+        """單張超解析，img 為 BGR uint8，回傳放大 scale 倍的 BGR uint8"""
+        return self.enhance_batch([img])[0]
+
+    def enhance_batch(self, images, progress=None):
+        """
+        多張超解析 (例如 split_image_to_nine 的九張切片)
+        尺寸相近的切片 (邊界取整差 1、2 像素，或邊緣切片少了重疊的部分) 在右下補邊到同一尺寸後疊成一個 batch 一次推論，
+        輸出再裁回各自的大小，回傳順序與輸入相同
+        progress：回呼 (已完成張數, 總張數)
+        """
+        import torch
+
+        results = [None] * len(images)
+        done = 0
 
-    model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
+        # 有開 tile 時交給 RealESRGANer 逐張切塊處理
+        if self.upsampler.tile_size > 0 or self.upsampler.pre_pad != 0:
+            for i, img in enumerate(images):
+                # RealESRGANer.enhance 會把輸入當 BGR 轉成 RGB，這裡先反轉讓網路看到的通道順序與批次路徑一致
+                sr_image, _ = self.upsampler.enhance(np.ascontiguousarray(img[:, :, ::-1]), outscale=self.scale)
+                results[i] = np.ascontiguousarray(sr_image[:, :, ::-1])
+                if progress is not None:
+                    progress(i + 1, len(images))
+            return results
 
-    upsampler = RealESRGANer(
-        scale=4,
-        model_path='weights/RealESRGAN_x4plus.pth',
-        model=model,
-        tile=0,
-        tile_pad=10,
-        pre_pad=0,
-        half=torch.cuda.is_available(),  # 有GPU就開half
-        device=device
-    )
+        # 依尺寸分組：由大到小，補邊到該組最大尺寸後多出的面積不超過 SR_BATCH_MAX_PAD 就放進同一組
+        groups = []  # [(目標高, 目標寬, 通道), [索引]]
+        for i in sorted(range(len(images)), key=lambda i: -images[i].shape[0] * images[i].shape[1]):
+            h, w = images[i].shape[:2]
+            for target, indices in groups:
+                if target[2:] == images[i].shape[2:] and target[0] * target[1] <= (1 + SR_BATCH_MAX_PAD) * h * w \
+                        and h <= target[0] and w <= target[1]:
+                    indices.append(i)
+                    break
+            else:
+                groups.append((images[i].shape, [i]))
 
-    img = Image.open(input_path).convert('RGB')
-    sr_image, _ = upsampler.enhance(np.array(img), outscale=4)
+        for _, indices in groups:
+            indices.sort()
+            for start in range(0, len(indices), self.batch_size):
+                chunk = indices[start:start + self.batch_size]
+                target_h = max(images[i].shape[0] for i in chunk)
+                target_w = max(images[i].shape[1] for i in chunk)
+                padded = [cv2.copyMakeBorder(images[i], 0, target_h - images[i].shape[0], 0, target_w - images[i].shape[1],
+                                             cv2.BORDER_REFLECT_101) for i in chunk]
+                batch = np.stack(padded).astype(np.float32) / 255.0
+                tensor = torch.from_numpy(batch).permute(0, 3, 1, 2).to(self.device)
+                if self.half:
+                    tensor = tensor.half()
 
-    sr_image = Image.fromarray(sr_image)
-    sr_image.save(output_path)
+                with torch.no_grad():
+                    output = self.upsampler.model(tensor)
+
+                output = output.float().clamp_(0, 1).mul_(255.0).round_()
+                output = output.permute(0, 2, 3, 1).to(torch.uint8).cpu().numpy()
+                for i, sr_image in zip(chunk, output):
+                    h, w = images[i].shape[:2]
+                    results[i] = np.ascontiguousarray(sr_image[:h * self.scale, :w * self.scale])  # 裁掉補邊的部分
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, len(images))
+        return results
+
+
+esrgan_engine = None
+
+def get_esrgan_engine():
+    """取得共用的超解析引擎，第一次呼叫時才建立"""
+    global esrgan_engine
+    if esrgan_engine is None:
+        esrgan_engine = ESRGANEngine()
+    return esrgan_engine
+
+def enhance_single_image(input_path, output_path):
+    img = cv2.imread(input_path)
+    if img is None:
+        raise FileNotFoundError(f"Cannot load image: {input_path}")
+
+    sr_image = get_esrgan_engine().enhance(img)
+
+    cv2.imwrite(output_path, sr_image)
     print(f"✅ 單張超解析完成: {output_path}")
 
+def enhance_images(input_paths, output_paths=None):
+    """
+    整批超解析：一次把同一張原圖的所有切片送進引擎
+    output_paths 為 None 時只回傳結果不存檔
+    回傳：超解析後的 BGR 陣列 list
+    """
+    images = []
+    for input_path in input_paths:
+        img = cv2.imread(input_path)
+        if img is None:
+            raise FileNotFoundError(f"Cannot load image: {input_path}")
+        images.append(img)
+
+    sr_images = get_esrgan_engine().enhance_batch(images)
+
+    for output_path, sr_image in zip(output_paths or [], sr_images):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cv2.imwrite(output_path, sr_image)
+    print(f"✅ 批次超解析完成: {len(sr_images)} 張")
+    return sr_images
+
 
 
+def adjust_image(img, contrast, brightness):
+    """亮度/對比調整，輸入輸出皆為 BGR uint8 陣列 (整條轉換編成一張 uint8 查表，不轉成浮點數)"""
+    return adjust_chain(contrast, brightness).apply(img)
+
 def adjust_single_image(input_path, output_path, contrast, brightness):
     img = cv2.imread(input_path)
     if img is None:
         print(f"⚠️ 無法讀取圖片: {input_path}")
         return
 
-    output = img * (contrast / 127 + 1) - contrast + brightness
-    output = np.clip(output, 0, 255)
-    output = np.uint8(output)
+    output = adjust_image(img, contrast, brightness)
 
     cv2.imwrite(output_path, output)
     print(f"✅ 單張亮度對比調整完成: {output_path}")
 
-def load_yolo_model(model_path):
-    global yolo_model
-    yolo_model = YOLO(model_path)
-    print(f"✅ 成功載入 YOLOv8 模型: {model_path}")
+def load_yolo_model(model_path, backend=YOLO_BACKEND):
+    """
+    載入 YOLO 權重 (.pt)
+    backend 為 "onnx" / "openvino" 時使用匯出後的模型 (快取在權重旁邊)，無法使用時退回 PyTorch
+    """
+    from yolo_backend import load_backend_model
 
-def yolo_detect_and_draw_and_save_txt(input_path, output_image_path, output_txt_path):
+    model, used_backend = load_backend_model(model_path, backend)
+    use_yolo_model(model, model_path, used_backend)
+    print(f"✅ 成功載入 YOLOv8 模型: {model_path} ({used_backend})")
+
+def use_yolo_model(model, model_path, backend="pytorch"):
+    """改用已載入的 YOLO 模型 (例如模型登錄表中預先載入好的)"""
+    global yolo_model, yolo_model_path, yolo_backend
+    yolo_model, yolo_model_path, yolo_backend = model, model_path, backend
+
+def yolo_detect(img, conf=0.1, iou=0.1, imgsz=640):
+    """
+    對單張 BGR 陣列做 YOLO 偵測
+    回傳：{"boxes": (N,4) xyxy 像素座標, "classes": (N,) int, "confs": (N,) float}
+    """
     if yolo_model is None:
         raise Exception("❌ 請先呼叫 load_yolo_model 載入模型")
 
-    # 🔥 加上你的設定：iou=0.5, conf=0.1
-    results = yolo_model.predict(source=input_path, save=False, imgsz=640, conf=0.1, iou=0.1, verbose=False)
+    results = yolo_model.predict(source=img, save=False, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+    return _result_to_detections(results[0])
 
-    img = cv2.imread(input_path)
-    if img is None:
-        raise Exception(f"❌ 無法讀取圖片 {input_path}")
+def yolo_detect_batch(images, conf=0.1, iou=0.1, imgsz=640, batch_size=9, progress=None):
+    """
+    多張 BGR 陣列一次送進 YOLO 批次推論 (例如 split_image_to_nine 的九張切片)
+    progress：回呼 (已完成張數, 總張數)
+    回傳：每張圖一個 dict，格式同 yolo_detect，順序與輸入相同
+    """
+    if yolo_model is None:
+        raise Exception("❌ 請先呼叫 load_yolo_model 載入模型")
+
+    detections = []
+    for start in range(0, len(images), batch_size):
+        chunk = list(images[start:start + batch_size])
+        results = yolo_model.predict(source=chunk, save=False, imgsz=imgsz, conf=conf, iou=iou, batch=len(chunk), verbose=False)
+        detections.extend(_result_to_detections(r) for r in results)
+        if progress is not None:
+            progress(len(detections), len(images))
+    return detections
+
+def _result_to_detections(result):
+    boxes = result.boxes
+    return {
+        "boxes": boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4),
+        "classes": boxes.cls.cpu().numpy().astype(np.int64),
+        "confs": boxes.conf.cpu().numpy().astype(np.float32),
+    }
+
+def draw_detections(img, detections):
+    """在圖片副本上畫黃色框，回傳新的陣列"""
+    output = img.copy()
+    for x1, y1, x2, y2 in detections["boxes"]:
+        cv2.rectangle(output, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 2)
+    return output
+
+def detections_to_yolo_lines(detections, width, height):
+    """轉成 YOLO txt 格式 (cls cx cy w h，歸一化)"""
+    lines = []
+    for (x1, y1, x2, y2), cls_id in zip(detections["boxes"], detections["classes"]):
+        center_x = (x1 + x2) / 2 / width
+        center_y = (y1 + y2) / 2 / height
+        w = (x2 - x1) / width
+        h = (y2 - y1) / height
+        lines.append(f"{int(cls_id)} {center_x:.6f} {center_y:.6f} {w:.6f} {h:.6f}")
+    return lines
 
+def crop_detections(img, detections):
+    """依偵測框裁切物件，回傳裁切後的 BGR 陣列 list (順序與偵測框相同)"""
     height, width = img.shape[:2]
-    annotations = []
+    crops = []
+    for x1, y1, x2, y2 in detections["boxes"]:
+        xmin = max(0, int(x1))
+        ymin = max(0, int(y1))
+        xmax = min(width, int(x2))
+        ymax = min(height, int(y2))
+        crops.append(img[ymin:ymax, xmin:xmax])
+    return crops
 
-    for r in results:
-        for box in r.boxes:
-            xyxy = box.xyxy[0].cpu().numpy()  # (x1, y1, x2, y2)
-            cls_id = int(box.cls[0].cpu().numpy())
-            conf = float(box.conf[0])
+def yolo_detect_and_draw_and_save_txt(input_path, output_image_path, output_txt_path):
+    if yolo_model is None:
+        raise Exception("❌ 請先呼叫 load_yolo_model 載入模型")
+
+    img = cv2.imread(input_path)
+    if img is None:
+        raise Exception(f"❌ 無法讀取圖片 {input_path}")
 
-            x1, y1, x2, y2 = xyxy
-            center_x = (x1 + x2) / 2 / width
-            center_y = (y1 + y2) / 2 / height
-            w = (x2 - x1) / width
-            h = (y2 - y1) / height
+    # 🔥 加上你的設定：iou=0.5, conf=0.1
+    detections = yolo_detect(img, conf=0.1, iou=0.1)
 
-            annotations.append(f"{cls_id} {center_x:.6f} {center_y:.6f} {w:.6f} {h:.6f}")
+    height, width = img.shape[:2]
+    annotations = detections_to_yolo_lines(detections, width, height)
 
-            # 🔥 畫黃色框 (255, 255, 0)
-            cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 2)
+    # 🔥 畫黃色框 (255, 255, 0)
+    img = draw_detections(img, detections)
 
     # 儲存畫好框線的圖片
     os.makedirs(os.path.dirname(output_image_path), exist_ok=True)
@@ -129,10 +317,84 @@ def yolo_detect_and_draw_and_save_txt(input_path, output_image_path, output_txt_
     print(f"✅ 已儲存框線標註txt：{output_txt_path}")
 
 def load_vit_model(model_path):
+    import torch
+    import timm
+
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     model = timm.create_model('vit_base_patch16_224', pretrained=False, num_classes=6)
     model.load_state_dict(torch.load(model_path, map_location=device))
     model = model.to(device)
     model.eval()
     print(f"✅ 成功載入ViT模型")
-    return model, device
\ No newline at end of file
+    return model, device
+
+def load_classifier(model_name, device, weights_folder="./weights", mode=CLASSIFIER_MODE):
+    """
+    依權重檔名載入 timm 細胞分類模型 (對應表見 config.CLASSIFIER_TIMM_MAP)
+    mode：CPU 加速模式 (見 classifier_backend.py)，GPU 上一律使用 fp32
+    回傳：(model, (mean, std))
+    """
+    import torch
+    import timm
+
+    timm_model_name = CLASSIFIER_TIMM_MAP.get(model_name, "vit_base_patch16_224")
+    model_path = os.path.join(weights_folder, model_name)
+    model = timm.create_model(timm_model_name, pretrained=False, num_classes=NUM_CLASSES)
+    state_dict = torch.load(model_path, map_location=device)
+    model.load_state_dict(state_dict)
+    model.to(device)
+    model.eval()
+    if mode != "fp32" and device.type == "cpu":
+        from classifier_backend import accelerate_classifier
+        model = accelerate_classifier(model, mode, model_path)
+    print(f"✅ 成功載入 {model_name} (timm 模型: {timm_model_name}，{mode if device.type == 'cpu' else 'fp32'})")
+    normalization = CLASSIFIER_NORMALIZATION.get(model_name, ([0.5, 0.5, 0.5], [0.5, 0.5, 0.5]))
+    return model, normalization
+
+def classify_crops(model, crops, mean, std, device, batch_size=32, input_size=224, progress=None):
+    """
+    批次分類裁切的細胞小圖
+    crops：BGR uint8 陣列 list
+    progress：回呼 (已完成張數, 總張數)
+    所有小圖先 resize 進同一塊預先配置的緩衝區，再整批正規化並推論
+    回傳：(預測類別 (N,) int, 信心值 (N,) float)，類別從 0 開始
+    """
+    import torch
+
+    num_crops = len(crops)
+    preds = np.empty(num_crops, dtype=np.int64)
+    confs = np.empty(num_crops, dtype=np.float32)
+    if num_crops == 0:
+        return preds, confs
+
+    batch_size = max(1, min(batch_size, num_crops))
+    pixels = np.zeros((batch_size, input_size, input_size, 3), dtype=np.uint8)  # resize 用的緩衝區
+    inputs = torch.empty((batch_size, 3, input_size, input_size), dtype=torch.float32, device=device)
+    # 把 /255 與 Normalize 合併成一次乘加：x * scale + shift
+    scale = torch.tensor([1.0 / (255.0 * s) for s in std], device=device).view(1, 3, 1, 1)
+    shift = torch.tensor([-m / s for m, s in zip(mean, std)], device=device).view(1, 3, 1, 1)
+
+    for start in range(0, num_crops, batch_size):
+        chunk = crops[start:start + batch_size]
+        n = len(chunk)
+        for i, crop in enumerate(chunk):
+            if crop is None or crop.size == 0:
+                pixels[i] = 0
+                continue
+            cv2.resize(crop, (input_size, input_size), dst=pixels[i], interpolation=cv2.INTER_LINEAR)
+
+        # BGR -> RGB 並轉成 NCHW
+        batch = torch.from_numpy(pixels[:n, :, :, ::-1].copy()).to(device).permute(0, 3, 1, 2)
+        inputs[:n].copy_(batch).mul_(scale).add_(shift)
+
+        with torch.no_grad():
+            logits = model(inputs[:n])
+            probs = torch.softmax(logits.float(), dim=1)
+            batch_confs, batch_preds = probs.max(dim=1)
+
+        preds[start:start + n] = batch_preds.cpu().numpy()
+        confs[start:start + n] = batch_confs.cpu().numpy()
+        if progress is not None:
+            progress(start + n, num_crops)
+
+    return preds, confs
@@ -0,0 +1,78 @@
+# import_report.py
+# 各進入點的啟動匯入時間報告 (使用 python -X importtime，每個進入點在新的行程中量測)
+# 列出匯入總時間與最花時間的套件；torch / timm / ultralytics 等重量級套件應該在用到時才匯入，
+# 啟動時就被匯入的會特別標出
+# 用法：python import_report.py
+#       python import_report.py --modules GUI batch_cli --top 15 --budget 1500   (超過 1500 ms 時以錯誤碼結束)
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ENTRY_MODULES = ["GUI", "gui_events", "batch_cli", "pipeline"]
+HEAVY_PACKAGES = {"torch", "torchvision", "timm", "ultralytics", "realesrgan", "basicsr", "onnxruntime", "openvino"}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+def measure_imports(module, cwd=None):
+    """
+    在新的 Python 行程中匯入 module，解析 -X importtime 的輸出
+    回傳 dict：total_ms (整體)、packages ({套件: 累計 ms})、error (匯入失敗時的訊息)
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd or os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)), match.group(3)
+        if name == module:
+            total_us = cumulative
+        elif "." not in name:
+            # 每個模組只在第一次載入時出現，累計時間已包含它底下的子模組 (套件之間可能互相包含)
+            packages.setdefault(name, cumulative)
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["匯入失敗"])[-1]
+    if not total_us:
+        total_us = sum(packages.values())
+    return {
+        "total_ms": total_us / 1000,
+        "packages": {name: us / 1000 for name, us in packages.items()},
+        "error": error,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="量測 GUI / CLI 各進入點的啟動匯入時間")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_MODULES, help="要量測的模組 (位於 GUI 資料夾)")
+    parser.add_argument("--top", type=int, default=10, help="列出最花時間的前幾個套件")
+    parser.add_argument("--budget", type=float, default=None, help="每個進入點的匯入時間上限 (ms)，超過時以錯誤碼結束")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        report = measure_imports(module)
+        if report["error"]:
+            print(f"❌ {module}: {report['error']}")
+            over_budget = True
+            continue
+
+        heavy = sorted(HEAVY_PACKAGES & set(report["packages"]))
+        status = "✅"
+        if args.budget is not None and report["total_ms"] > args.budget:
+            status = "❌"
+            over_budget = True
+        elif heavy:
+            status = "⚠️"
+        print(f"{status} {module}: {report['total_ms']:.0f} ms")
+        for name, ms in sorted(report["packages"].items(), key=lambda item: -item[1])[:args.top]:
+            mark = "  ⚠️ 啟動時就被匯入" if name in heavy else ""
+            print(f"    {name:<20} {ms:8.1f} ms{mark}")
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# job_scheduler.py
+# 管線工作排程器：所有背景管線工作都交給固定數量的 worker 執行緒
+# 同一個群組 (例如 "slice") 送出新工作時，舊的工作自動作廢：還沒開始的直接丟掉，
+# 執行中的會在下一個檢查點 (階段之間或進度回報時) 停下來
+# 同一個群組一次只執行一個工作，作廢的工作停下之前新的工作不會開始，不會同時寫同一批檔案
+# priority 數字越小越優先，使用者正在看的切片用 PRIORITY_CURRENT
+#
+# 用法：
+#     scheduler = JobScheduler(workers=1)
+#     token = scheduler.submit(run, arg1, group="slice")   # run(arg1, token=token)
+#     def run(arg1, token):
+#         ...
+#         token.check()   # 已作廢時丟出 JobCancelled
+
+import threading
+import itertools
+
+PRIORITY_CURRENT = 0      # 使用者正在看的切片
+PRIORITY_BACKGROUND = 10  # 其餘可以晚點做的工作
+
+class JobCancelled(Exception):
+    """工作已被取消或被較新的工作取代"""
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """在檢查點呼叫：工作已作廢時丟出 JobCancelled"""
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def progress(self, callback=None):
+        """包裝進度回呼 (done, total)，每次回報進度時順便檢查是否已作廢"""
+        def report(done, total):
+            self.check()
+            if callback is not None:
+                callback(done, total)
+        return report
+
+class _Job:
+    def __init__(self, fn, args, kwargs, group, priority, seq):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.group = group
+        self.priority = priority
+        self.seq = seq
+        self.token = CancelToken()
+
+class JobScheduler:
+    def __init__(self, workers=1):
+        self._cond = threading.Condition()
+        self._pending = []            # 等待中的工作
+        self._running_groups = set()  # 正在執行的群組
+        self._latest = {}             # 群組 -> 最新工作的 token
+        self._seq = itertools.count()
+        self._stopped = False
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"pipeline-worker-{i}", daemon=True).start()
+
+    def submit(self, fn, *args, group=None, priority=PRIORITY_CURRENT, **kwargs):
+        """
+        排入一個工作，fn 會以 fn(*args, token=token, **kwargs) 呼叫
+        有 group 時，同群組先前的工作全部作廢
+        回傳這個工作的 CancelToken
+        """
+        with self._cond:
+            job = _Job(fn, args, kwargs, group, priority, next(self._seq))
+            if group is not None:
+                self._cancel_group_locked(group)
+                self._latest[group] = job.token
+            self._pending.append(job)
+            self._cond.notify_all()
+            return job.token
+
+    def cancel_group(self, group):
+        """作廢某群組所有等待中與執行中的工作"""
+        with self._cond:
+            self._cancel_group_locked(group)
+            self._latest.pop(group, None)
+
+    def _cancel_group_locked(self, group):
+        token = self._latest.get(group)
+        if token is not None:
+            token.cancel()
+        dropped = [job for job in self._pending if job.group == group]
+        for job in dropped:
+            job.token.cancel()
+        if dropped:
+            self._pending = [job for job in self._pending if job.group != group]
+            print(f"🔍 已丟棄 {len(dropped)} 個過期的 {group} 工作")
+
+    def _next_job_locked(self):
+        # 優先順序最高 (數字最小)、其次最早送出，且同群組沒有工作在執行的
+        self._pending = [job for job in self._pending if not job.token.cancelled]
+        ready = [job for job in self._pending if job.group is None or job.group not in self._running_groups]
+        if not ready:
+            return None
+        job = min(ready, key=lambda job: (job.priority, job.seq))
+        self._pending.remove(job)
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job_locked()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = self._next_job_locked()
+                if self._stopped:
+                    return
+                if job.group is not None:
+                    self._running_groups.add(job.group)
+            try:
+                job.token.check()
+                job.fn(*job.args, token=job.token, **job.kwargs)
+            except JobCancelled:
+                print(f"🔍 已取消過期的工作: {getattr(job.fn, '__name__', job.fn)}")
+            except Exception as e:
+                print(f"❌ 背景工作錯誤: {e}")
+            finally:
+                with self._cond:
+                    self._running_groups.discard(job.group)
+                    self._cond.notify_all()
+
+    def shutdown(self):
+        """作廢所有工作並讓 worker 結束 (執行中的工作會在下一個檢查點停下)"""
+        with self._cond:
+            self._stopped = True
+            for token in self._latest.values():
+                token.cancel()
+            for job in self._pending:
+                job.token.cancel()
+            self._pending = []
+            self._cond.notify_all()
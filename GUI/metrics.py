@@ -0,0 +1,195 @@
+# metrics.py
+# 管線各階段的計時與記憶體紀錄
+# 用法：
+#     from metrics import metrics
+#     with metrics.stage("detect", items=9):
+#         ...
+# 可匯出成 JSON / CSV，GUI 中可開啟 MetricsPanel 即時查看
+
+import os
+import csv
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 延遲直方圖的分桶上界 (ms)
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf")]
+
+RECORD_COLUMNS = ["timestamp", "stage", "items", "wall_ms", "cpu_ms", "peak_rss_mb"]
+
+def peak_rss_mb():
+    """目前行程的記憶體高峰 (MB)，平台不支援時回傳 None"""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)  # Windows 才有
+        if peak is not None:
+            return peak / (1024 * 1024)
+    except ImportError:
+        psutil = None
+    try:
+        import resource
+        import sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 單位為 KB，macOS 為 bytes
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    return None
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class PipelineMetrics:
+    def __init__(self, window=200, max_records=10000):
+        self.window = window  # 每個階段保留最近幾筆延遲做滾動統計
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+        self._latencies = {}  # 階段 -> deque(最近的 wall_ms)
+        self._totals = {}  # 階段 -> {"count", "items", "wall_ms", "cpu_ms"}
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """計時一個階段：wall time、該執行緒的 CPU time、行程記憶體高峰與處理數量"""
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, items, (time.perf_counter() - wall_start) * 1000, (time.thread_time() - cpu_start) * 1000, peak_rss_mb())
+
+    def record(self, name, items, wall_ms, cpu_ms, rss_mb=None, timestamp=None):
+        row = {
+            "timestamp": round(timestamp if timestamp is not None else time.time(), 3),
+            "stage": name,
+            "items": items,
+            "wall_ms": round(wall_ms, 3),
+            "cpu_ms": round(cpu_ms, 3),
+            "peak_rss_mb": None if rss_mb is None else round(rss_mb, 1),
+        }
+        with self._lock:
+            self._records.append(row)
+            self._latencies.setdefault(name, deque(maxlen=self.window)).append(wall_ms)
+            totals = self._totals.setdefault(name, {"count": 0, "items": 0, "wall_ms": 0.0, "cpu_ms": 0.0})
+            totals["count"] += 1
+            totals["items"] += items
+            totals["wall_ms"] += wall_ms
+            totals["cpu_ms"] += cpu_ms
+
+    def extend(self, rows):
+        """合併其他行程送回來的紀錄 (例如 batch_cli 的 worker)"""
+        for row in rows:
+            self.record(row["stage"], row["items"], row["wall_ms"], row["cpu_ms"], row["peak_rss_mb"], row["timestamp"])
+
+    def drain_records(self):
+        """取出並清空目前的紀錄 (worker 行程每處理完一張原圖就交回主行程)"""
+        with self._lock:
+            rows = list(self._records)
+            self._records.clear()
+        return rows
+
+    def histogram(self, name):
+        """最近 window 筆延遲的分桶計數：[(上界 ms, 筆數)]"""
+        with self._lock:
+            latencies = list(self._latencies.get(name, ()))
+        counts = [0] * len(HISTOGRAM_BUCKETS_MS)
+        for value in latencies:
+            for i, upper in enumerate(HISTOGRAM_BUCKETS_MS):
+                if value <= upper:
+                    counts[i] += 1
+                    break
+        return list(zip(HISTOGRAM_BUCKETS_MS, counts))
+
+    def summary(self):
+        """每個階段的累計與滾動統計"""
+        with self._lock:
+            stages = {name: (dict(totals), sorted(self._latencies.get(name, ()))) for name, totals in self._totals.items()}
+            peak = max((row["peak_rss_mb"] for row in self._records if row["peak_rss_mb"] is not None), default=None)
+        result = {}
+        for name, (totals, latencies) in stages.items():
+            result[name] = {
+                "count": totals["count"],
+                "items": totals["items"],
+                "total_wall_ms": round(totals["wall_ms"], 3),
+                "total_cpu_ms": round(totals["cpu_ms"], 3),
+                "mean_wall_ms": round(totals["wall_ms"] / totals["count"], 3) if totals["count"] else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.5), 3),
+                "p90_ms": round(_percentile(latencies, 0.9), 3),
+                "p99_ms": round(_percentile(latencies, 0.99), 3),
+                "ms_per_item": round(totals["wall_ms"] / totals["items"], 3) if totals["items"] else None,
+            }
+        return {"stages": result, "peak_rss_mb": peak}
+
+    def dump_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            records = list(self._records)
+        data = self.summary()
+        data["histograms"] = {name: [[upper if upper != float("inf") else "inf", count] for upper, count in self.histogram(name)]
+                              for name in data["stages"]}
+        data["records"] = records
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"✅ 已匯出效能紀錄: {path}")
+
+    def dump_csv(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            records = list(self._records)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_COLUMNS)
+            writer.writeheader()
+            writer.writerows(records)
+        print(f"✅ 已匯出效能紀錄: {path}")
+
+# 全程式共用的紀錄器
+metrics = PipelineMetrics()
+
+class MetricsPanel:
+    """GUI 中的效能面板：每秒更新一次各階段統計"""
+    COLUMNS = ("count", "items", "mean_wall_ms", "p50_ms", "p90_ms", "p99_ms", "total_cpu_ms")
+
+    def __init__(self, root, recorder=metrics, output_dir="./metrics"):
+        import tkinter as tk
+        from tkinter import ttk
+
+        self.recorder = recorder
+        self.output_dir = output_dir
+        self.window = tk.Toplevel(root)
+        self.window.title("Pipeline Metrics")
+        self.window.geometry("820x320")
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, height=10)
+        self.tree.heading("#0", text="stage")
+        self.tree.column("#0", width=120)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=95, anchor="e")
+        self.tree.pack(fill="both", expand=True, padx=10, pady=(10, 0))
+
+        bottom = tk.Frame(self.window)
+        bottom.pack(fill="x", padx=10, pady=10)
+        self.rss_label = tk.Label(bottom, text="Peak RSS: -", font=("Arial", 12))
+        self.rss_label.pack(side="left")
+        tk.Button(bottom, text="Export JSON", command=lambda: self.recorder.dump_json(os.path.join(self.output_dir, "metrics.json"))).pack(side="right")
+        tk.Button(bottom, text="Export CSV", command=lambda: self.recorder.dump_csv(os.path.join(self.output_dir, "metrics.csv"))).pack(side="right", padx=10)
+
+        self.refresh()
+
+    def refresh(self):
+        if not self.window.winfo_exists():
+            return
+        data = self.recorder.summary()
+        self.tree.delete(*self.tree.get_children())
+        for name, stats in data["stages"].items():
+            self.tree.insert("", "end", text=name, values=[stats[column] for column in self.COLUMNS])
+        peak = data["peak_rss_mb"]
+        self.rss_label.configure(text=f"Peak RSS: {peak:.1f} MB" if peak is not None else "Peak RSS: -")
+        self.window.after(1000, self.refresh)
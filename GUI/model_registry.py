@@ -0,0 +1,117 @@
+# model_registry.py
+# 模型登錄表：在背景執行緒載入模型，最近用過的模型留在記憶體中
+# 切換回剛用過的 YOLO / 分類模型時不必重新從磁碟載入
+# 留在記憶體中的模型數與總大小有上限，超過時淘汰最久沒用的模型 (LRU)
+#
+# 用法：
+#     registry = ModelRegistry(max_bytes=3 * 1024**3, max_models=4)
+#     registry.request(key, loader)      # UI 執行緒：開始背景載入，立即返回
+#     model = registry.get(key, loader)  # 管線執行緒：還沒載入好才等待
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+def estimate_bytes(model, path=None):
+    """
+    估計模型佔用的記憶體：torch 模型為參數與 buffer 的大小，
+    其他 (ONNX Runtime / OpenVINO 等) 以權重檔大小估計
+    """
+    if isinstance(model, tuple):  # 載入函式回傳 (模型, 附帶資訊) 時只看模型
+        model = model[0]
+    for module in (model, getattr(model, "model", None)):
+        if hasattr(module, "parameters") and hasattr(module, "buffers"):
+            try:
+                size = sum(t.numel() * t.element_size() for t in list(module.parameters()) + list(module.buffers()))
+            except TypeError:
+                continue
+            if size:
+                return size
+    if path and os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return 0
+
+class ModelRegistry:
+    def __init__(self, max_bytes, max_models=4, workers=1):
+        self.max_bytes = max_bytes
+        self.max_models = max(1, max_models)
+        self._entries = OrderedDict()  # 鍵 -> {"future": Future, "bytes": 大小, "path": 權重路徑}，最近使用的在最後
+        self._lock = threading.Lock()
+        # 單一載入執行緒：模型依請求順序載入，不會同時載入好幾個大模型搶記憶體
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-loader")
+
+    def request(self, key, loader, path=None):
+        """
+        開始在背景載入 (已載入或載入中則只標記為最近使用)
+        loader：無參數的載入函式；path：權重路徑，用來估計非 torch 模型的大小
+        回傳 Future
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"future": None, "bytes": 0, "path": path}
+                entry["future"] = self._executor.submit(self._load, key, loader, entry)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            return entry["future"]
+
+    def _load(self, key, loader, entry):
+        try:
+            model = loader()
+        except Exception:
+            with self._lock:
+                # 載入失敗不留在登錄表中，下次請求時重試
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+        size = estimate_bytes(model, entry["path"])
+        with self._lock:
+            entry["bytes"] = size
+            self._evict(keep=key)
+        return model
+
+    def get(self, key, loader=None, path=None, timeout=None):
+        """取得模型；還沒載入好時等待 (必要時先發出載入請求)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            if loader is None:
+                raise KeyError(f"模型尚未登錄: {key}")
+            future = self.request(key, loader, path)
+        else:
+            future = entry["future"]
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        if not future.done():
+            print(f"🔍 等待模型載入: {key}")
+        return future.result(timeout=timeout)
+
+    def is_ready(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry["future"].done() and entry["future"].exception() is None
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._entries.values())
+
+    def _evict(self, keep=None):
+        # 依最後使用順序淘汰已載入完成的模型 (載入中的不淘汰)，直到數量與大小都在上限內
+        # 正在使用中的模型仍由呼叫端持有參照，淘汰只是讓登錄表不再保留它
+        total = sum(entry["bytes"] for entry in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_models and total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if key == keep or not entry["future"].done():
+                continue
+            del self._entries[key]
+            total -= entry["bytes"]
+            print(f"🔍 已從記憶體移除模型: {key}")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,245 @@
+# pipeline.py
+# 記憶體內的切片處理管線：超解析 → 亮度對比 → YOLO → 裁切
+# 各階段直接傳遞陣列與偵測結果，只有使用者要求匯出時才寫檔
+
+import os
+import cv2
+import numpy as np
+import image_utils
+from result_cache import file_fingerprint, make_key
+from metrics import metrics
+from image_utils import get_esrgan_engine, adjust_image, yolo_detect, yolo_detect_batch, draw_detections, detections_to_yolo_lines, crop_detections, classify_crops
+from tiling import tile_regions, grid_for_tile_size, merge_tile_detections
+from config import TILE_ROWS, TILE_COLS, TILE_OVERLAP, TILE_SIZE, CLASSIFIER_MODE, ESRGAN_WEIGHTS, ESRGAN_SCALE
+
+DETECT_CONF = 0.1  # YOLO 信心門檻
+DETECT_IOU = 0.1   # YOLO NMS IoU 門檻
+
+EXPORT_FOLDERS = {
+    "sr": "./image/ESRGAN",
+    "adjusted": "./image/light&contrast",
+    "annotated": "./image/YOLO",
+    "label": "./image/label",
+    "cropped": "./image/cropped",
+}
+
+def run_slice_pipeline(slice_img, sr_img=None, contrast=0, brightness=0, detections=None):
+    """
+    處理單張切片 (BGR 陣列)
+    sr_img：已經超解析好的結果 (例如整批超解析的快取)，None 時在這裡做
+    detections：已經整批偵測好的結果，None 時在這裡做
+    回傳 dict：sr / adjusted / detections / annotated / crops
+    """
+    if sr_img is None:
+        with metrics.stage("sr", items=1):
+            sr_img = get_esrgan_engine().enhance(slice_img)
+
+    with metrics.stage("adjust", items=1):
+        adjusted = adjust_image(sr_img, contrast, brightness)
+    if detections is None:
+        with metrics.stage("detect", items=1):
+            detections = yolo_detect(adjusted, conf=DETECT_CONF, iou=DETECT_IOU)
+    with metrics.stage("crop", items=len(detections["boxes"])):
+        annotated = draw_detections(adjusted, detections)
+        crops = crop_detections(adjusted, detections)
+
+    return {
+        "sr": sr_img,
+        "adjusted": adjusted,
+        "detections": detections,
+        "annotated": annotated,
+        "crops": crops,
+    }
+
+def sr_cache_key(digest):
+    """超解析結果的快取鍵：切片雜湊 + ESRGAN 權重 (不建立引擎，全部命中時不必載入模型)"""
+    return make_key("sr", digest, file_fingerprint(ESRGAN_WEIGHTS), ESRGAN_SCALE)
+
+def detect_cache_key(digest, contrast=0, brightness=0):
+    """偵測結果的快取鍵：超解析鍵 + YOLO 權重與後端 + 偵測與亮度參數"""
+    return make_key("detect", sr_cache_key(digest), file_fingerprint(image_utils.yolo_model_path), image_utils.yolo_backend,
+                    DETECT_CONF, DETECT_IOU, contrast, brightness)
+
+def classify_cache_key(digest, classifier_path, contrast=0, brightness=0, keep=None):
+    """
+    分類結果的快取鍵：偵測鍵 + 分類模型權重與加速模式
+    keep：只分類部分偵測框時 (重疊切片合併後屬於這張切片的框) 保留的索引
+    """
+    parts = ["classify", detect_cache_key(digest, contrast, brightness), file_fingerprint(classifier_path), CLASSIFIER_MODE]
+    if keep is not None:
+        parts.append([int(i) for i in keep])
+    return make_key(*parts)
+
+def enhance_slices(slices, cache=None, digests=None, progress=None):
+    """
+    整批超解析同一張原圖的切片
+    有快取時 (cache + 每張切片的 digests) 只把沒命中的切片送進引擎
+    progress：回呼 (已完成張數, 總張數)，快取命中的切片直接算完成
+    """
+    if cache is None or digests is None:
+        with metrics.stage("sr", items=len(slices)):
+            return get_esrgan_engine().enhance_batch(slices, progress=progress)
+
+    keys = [sr_cache_key(digest) for digest in digests]
+    sr_images = [None] * len(slices)
+    missing = []
+    for i, key in enumerate(keys):
+        hit = cache.get(key)
+        if hit is not None:
+            sr_images[i] = hit["sr"]
+        else:
+            missing.append(i)
+
+    hits = len(slices) - len(missing)
+    if progress is not None:
+        progress(hits, len(slices))
+    if missing:
+        engine = get_esrgan_engine()  # 只有沒命中的切片才需要載入模型
+        offset_progress = None if progress is None else (lambda done, total: progress(hits + done, len(slices)))
+        with metrics.stage("sr", items=len(missing)):
+            enhanced = engine.enhance_batch([slices[i] for i in missing], progress=offset_progress)
+        for i, sr_img in zip(missing, enhanced):
+            sr_images[i] = sr_img
+            cache.put(keys[i], {"sr": sr_img})
+    print(f"✅ 超解析快取命中 {len(slices) - len(missing)}/{len(slices)} 張")
+    return sr_images
+
+def detect_slices(sr_images, contrast=0, brightness=0, cache=None, digests=None, progress=None):
+    """
+    同一張原圖的所有切片一次調整亮度並整批 YOLO 偵測
+    有快取時只偵測沒命中的切片
+    progress：回呼 (已完成張數, 總張數)
+    回傳：每張切片的偵測結果 list (boxes / classes / confs)
+    """
+    if cache is None or digests is None:
+        with metrics.stage("adjust", items=len(sr_images)):
+            adjusted = [adjust_image(img, contrast, brightness) for img in sr_images]
+        with metrics.stage("detect", items=len(adjusted)):
+            return yolo_detect_batch(adjusted, conf=DETECT_CONF, iou=DETECT_IOU, progress=progress)
+
+    keys = [detect_cache_key(digest, contrast, brightness) for digest in digests]
+    detections = [cache.get(key) for key in keys]
+    missing = [i for i, hit in enumerate(detections) if hit is None]
+
+    hits = len(sr_images) - len(missing)
+    if progress is not None:
+        progress(hits, len(sr_images))
+    if missing:
+        with metrics.stage("adjust", items=len(missing)):
+            adjusted = [adjust_image(sr_images[i], contrast, brightness) for i in missing]
+        offset_progress = None if progress is None else (lambda done, total: progress(hits + done, len(sr_images)))
+        with metrics.stage("detect", items=len(missing)):
+            batch_detections = yolo_detect_batch(adjusted, conf=DETECT_CONF, iou=DETECT_IOU, progress=offset_progress)
+        for i, slice_detections in zip(missing, batch_detections):
+            detections[i] = slice_detections
+            cache.put(keys[i], slice_detections)
+    return detections
+
+def classify_slice_crops(classifier, crops, normalization, device, batch_size=32, cache=None, key=None, progress=None):
+    """
+    批次分類一張切片的所有細胞，有快取鍵時直接取回上次的結果
+    progress：回呼 (已完成張數, 總張數)
+    回傳：(預測類別, 信心值)
+    """
+    if cache is not None and key is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            if progress is not None:
+                progress(len(crops), len(crops))
+            return hit["classes"], hit["confs"]
+
+    mean, std = normalization
+    with metrics.stage("classify", items=len(crops)):
+        preds, confs = classify_crops(classifier, crops, mean, std, device, batch_size=batch_size, progress=progress)
+    if cache is not None and key is not None:
+        cache.put(key, {"classes": preds, "confs": confs})
+    return preds, confs
+
+def run_origin_pipeline(img, classifier, normalization, device, contrast=0, brightness=0, classify_batch_size=32, slice_batch=None,
+                        rows=TILE_ROWS, cols=TILE_COLS, overlap=TILE_OVERLAP, tile_size=TILE_SIZE):
+    """
+    處理一整張原圖：重疊切片 → 整批超解析 → 亮度對比 → 整批 YOLO → 裁切 → 全域 NMS 合併 → 批次分類
+    img：BGR 陣列或 TiledImage (大圖只在處理到某塊切片時才從檔案讀出)
+    slice_batch：每次讀入並整批處理的切片數，None 時全部切片一起處理
+    rows / cols / overlap：切片格數與相鄰切片重疊的像素數；有 tile_size 時依原圖大小自動決定格數
+    回傳 dict：
+        regions：每張切片在原圖中的 (x1, y1, x2, y2)
+        detections：合併後的偵測結果 (原圖座標，格式見 tiling.merge_tile_detections)
+        num_raw：合併前各切片的偵測總數
+        crops / classes / class_confs：保留下來的細胞裁切圖、預測類別 (從 0 開始) 與分類信心值
+    """
+    height, width = img.shape[:2]
+    if tile_size:
+        rows, cols = grid_for_tile_size(height, width, tile_size, overlap)
+    regions = tile_regions(height, width, rows, cols, overlap)
+    slice_batch = slice_batch or len(regions)
+
+    tile_detections, scales, tile_crops = [], [], []
+    for start in range(0, len(regions), slice_batch):
+        group = regions[start:start + slice_batch]
+        with metrics.stage("split", items=len(group)):
+            slices = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in group]
+        sr_images = enhance_slices(slices)
+        with metrics.stage("adjust", items=len(sr_images)):
+            adjusted = [adjust_image(sr_img, contrast, brightness) for sr_img in sr_images]
+        with metrics.stage("detect", items=len(adjusted)):
+            detections = yolo_detect_batch(adjusted, conf=DETECT_CONF, iou=DETECT_IOU)
+        with metrics.stage("crop", items=sum(len(d["boxes"]) for d in detections)):
+            for slice_img, adjusted_img, slice_detections in zip(slices, adjusted, detections):
+                # 裁切圖複製出來，這批切片的超解析結果就可以釋放
+                tile_crops.append([crop.copy() for crop in crop_detections(adjusted_img, slice_detections)])
+                tile_detections.append(slice_detections)
+                scales.append((adjusted_img.shape[1] / slice_img.shape[1], adjusted_img.shape[0] / slice_img.shape[0]))
+
+    with metrics.stage("merge", items=sum(len(d["boxes"]) for d in tile_detections)):
+        merged = merge_tile_detections(tile_detections, regions, scales, iou=DETECT_IOU)
+    crops = [tile_crops[tile][index] for tile, index in zip(merged["tiles"], merged["indices"])]
+    classes, class_confs = classify_slice_crops(classifier, crops, normalization, device, batch_size=classify_batch_size)
+    return {
+        "regions": regions,
+        "detections": merged,
+        "num_raw": sum(len(d["boxes"]) for d in tile_detections),
+        "crops": crops,
+        "classes": classes,
+        "class_confs": class_confs,
+    }
+
+def merge_split_detections(regions, sr_shapes, detections):
+    """
+    把 split_image_tiles 切出的重疊切片各自的偵測結果合併成整張原圖的結果
+    regions：每張切片在原圖中的 (x1, y1, x2, y2)
+    sr_shapes：每張切片超解析後的 (高, 寬)
+    detections：每張切片的偵測結果 (超解析後的座標)
+    回傳：合併後的偵測結果 (原圖座標，格式見 tiling.merge_tile_detections)；
+          tiles / indices 指出每個細胞由哪張切片的哪個框代表，重疊區域的細胞只屬於一張切片
+    """
+    scales = [(sr[1] / (x2 - x1), sr[0] / (y2 - y1)) for sr, (x1, y1, x2, y2) in zip(sr_shapes, regions)]
+    return merge_tile_detections(detections, regions, scales, iou=DETECT_IOU)
+
+def select_detections(detections, indices):
+    """只保留指定索引的偵測框 (例如合併後屬於這張切片的細胞)"""
+    indices = np.asarray(indices, dtype=np.int64)
+    return {key: np.asarray(value)[indices] for key, value in detections.items()}
+
+def export_slice_result(result, slice_name, folders=EXPORT_FOLDERS):
+    """
+    把記憶體內的切片結果寫成舊版管線的檔案結構
+    (ESRGAN / light&contrast / YOLO / label / cropped)
+    """
+    base_name = os.path.splitext(slice_name)[0]
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+
+    cv2.imwrite(os.path.join(folders["sr"], slice_name), result["sr"])
+    cv2.imwrite(os.path.join(folders["adjusted"], slice_name), result["adjusted"])
+    cv2.imwrite(os.path.join(folders["annotated"], slice_name), result["annotated"])
+
+    height, width = result["adjusted"].shape[:2]
+    with open(os.path.join(folders["label"], f"{base_name}.txt"), "w") as f:
+        for line in detections_to_yolo_lines(result["detections"], width, height):
+            f.write(line + "\n")
+
+    for idx, crop in enumerate(result["crops"]):
+        cv2.imwrite(os.path.join(folders["cropped"], f"{base_name}_{idx}.jpg"), crop)
+
+    print(f"✅ 已匯出切片結果: {slice_name}")
@@ -0,0 +1,171 @@
+# preprocess.py
+# 影像前處理引擎：把宣告好的處理步驟編譯成融合的 uint8 查表 (LUT) 與就地 OpenCV 運算
+# 逐點運算 (對比亮度、線性轉換、Gamma) 相鄰時合併成一張 256 項的查表，只掃一次影像
+# MinMax 正規化直接呼叫 cv.normalize (其單精度運算在 .5 附近的取整與雙精度查表不同)，後面緊接的查表在同一個緩衝區上套用
+# 鄰域運算 (CLAHE、TopHat、銳化、模糊) 在每個執行緒各自重複使用的緩衝區上進行，不另外配置暫存陣列
+# 只依賴 cv2 與 numpy，GUI 管線與 cell_demo 的批次腳本都可以使用
+#
+# 用法：
+#     chain = PreprocessChain([("extract", 1), ("normalize",), ("clahe", 5.0, (16, 16)), ("merge", 1)])
+#     result = chain.apply(image)
+#
+# 支援的步驟：
+#     ("extract", 通道)                         取出單一通道 (BGR 索引)
+#     ("contrast", 對比, 亮度)                  與舊版 adjust_image 相同：x * (對比/127 + 1) - 對比 + 亮度，截斷取整
+#     ("linear", alpha, beta)                   x * alpha + beta，四捨五入 (與 cv.convertScaleAbs 相同)
+#     ("gamma", gamma)                          (x / 255) ** gamma * 255
+#     ("normalize",)                            MinMax 正規化到 0~255 (與 cv.normalize 結果完全相同)
+#     ("clahe", clip_limit, (tile_w, tile_h))
+#     ("tophat_fuse", kernel 大小, 原圖權重, tophat 權重)   addWeighted(x, w1, tophat(x), w2)
+#     ("unsharp", kernel 大小, 原圖權重, 模糊權重)          addWeighted(x, w1, GaussianBlur(x), w2)
+#     ("blur", kernel 大小)                     GaussianBlur
+#     ("merge", 通道)                           放回三通道影像的指定通道，其餘通道為 0
+
+import threading
+from functools import lru_cache
+import cv2
+import numpy as np
+
+_LEVELS = np.arange(256, dtype=np.float64)
+_POINTWISE = ("contrast", "linear", "gamma")
+
+def contrast_lut(contrast, brightness):
+    """舊版 adjust_image 的查表：先截到 0~255 再捨去小數"""
+    return np.uint8(np.clip(_LEVELS * (contrast / 127 + 1) - contrast + brightness, 0, 255))
+
+def linear_lut(alpha, beta):
+    return np.uint8(np.clip(np.rint(_LEVELS * alpha + beta), 0, 255))
+
+def gamma_lut(gamma):
+    table = np.empty(256, np.uint8)
+    table[:] = np.clip(np.power(_LEVELS / 255.0, gamma) * 255.0, 0, 255)  # 與 cell_demo 原本的 Gamma 查表相同 (捨去小數)
+    return table
+
+def _pointwise_lut(step):
+    name, *params = step
+    if name == "contrast":
+        return contrast_lut(*params)
+    if name == "linear":
+        return linear_lut(*params)
+    return gamma_lut(*params)
+
+class PreprocessChain:
+    def __init__(self, steps):
+        self.steps = [tuple(step) for step in steps]
+        self.program = self._compile(self.steps)
+        self._local = threading.local()  # 每個執行緒各自的緩衝區與 CLAHE 物件
+
+    @staticmethod
+    def _compile(steps):
+        # 相鄰的逐點步驟合成一張查表；正規化後面緊接的查表併入正規化步驟
+        program = []
+        for step in steps:
+            name = step[0]
+            if name in _POINTWISE:
+                table = _pointwise_lut(step)
+                if program and program[-1][0] == "lut":
+                    program[-1] = ("lut", table[program[-1][1]])  # 先套前一張再套這一張
+                elif program and program[-1][0] == "normalize" and program[-1][1] is None:
+                    program[-1] = ("normalize", table)
+                else:
+                    program.append(("lut", table))
+            elif name == "normalize":
+                program.append(("normalize", None))
+            elif name == "tophat_fuse":
+                program.append((name, np.ones((step[1], step[1]), np.uint8), step[2], step[3]))
+            elif name in ("extract", "clahe", "unsharp", "blur", "merge"):
+                program.append(step)
+            else:
+                raise ValueError(f"未知的前處理步驟: {name}")
+        for i, step in enumerate(program):
+            if step[0] == "extract" and i != 0:
+                raise ValueError("extract 只能是第一個步驟")
+            if step[0] == "merge" and i != len(program) - 1:
+                raise ValueError("merge 只能是最後一個步驟")
+        return program
+
+    def _buffers(self, shape):
+        # 同一個執行緒處理相同大小的影像時重複使用同一組緩衝區
+        local = self._local
+        if getattr(local, "shape", None) != shape:
+            local.shape = shape
+            local.work = np.empty(shape, np.uint8)
+            local.temp = np.empty(shape, np.uint8)
+        return local.work, local.temp
+
+    def _clahe(self, clip_limit, tile_grid):
+        cache = getattr(self._local, "clahe", None)
+        if cache is None:
+            cache = self._local.clahe = {}
+        key = (clip_limit, tuple(tile_grid))
+        if key not in cache:
+            cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid))
+        return cache[key]
+
+    def apply(self, img, out=None):
+        """
+        依序執行整條處理鏈，不修改輸入
+        out：輸出陣列 (可重複使用)，None 時配置新的陣列
+        回傳：處理後的 uint8 陣列
+        """
+        program = self.program
+        if len(program) == 1 and program[0][0] == "lut":
+            # 只有逐點運算：查表一次直接寫到輸出
+            return cv2.LUT(img, program[0][1]) if out is None else cv2.LUT(img, program[0][1], dst=out)
+
+        first = program[0] if program else None
+        if first is not None and first[0] == "extract":
+            work, temp = self._buffers(img.shape[:2])
+            cv2.extractChannel(img, first[1], dst=work)
+            program = program[1:]
+        elif first is not None and first[0] == "lut":
+            work, temp = self._buffers(img.shape)
+            cv2.LUT(img, first[1], dst=work)  # 複製與第一次查表合併
+            program = program[1:]
+        else:
+            work, temp = self._buffers(img.shape)
+            np.copyto(work, img)
+
+        merge_channel = None
+        if program and program[-1][0] == "merge":
+            merge_channel = program[-1][1]
+            program = program[:-1]
+
+        for step in program:
+            name = step[0]
+            if name == "lut":
+                cv2.LUT(work, step[1], dst=work)
+            elif name == "normalize":
+                cv2.normalize(work, work, 0, 255, cv2.NORM_MINMAX)
+                if step[1] is not None:
+                    cv2.LUT(work, step[1], dst=work)
+            elif name == "clahe":
+                self._clahe(step[1], step[2]).apply(work, temp)
+                work, temp = temp, work
+            elif name == "tophat_fuse":
+                cv2.morphologyEx(work, cv2.MORPH_TOPHAT, step[1], dst=temp)
+                cv2.addWeighted(work, step[2], temp, step[3], 0, dst=work)
+            elif name == "unsharp":
+                cv2.GaussianBlur(work, (step[1], step[1]), 0, dst=temp)
+                cv2.addWeighted(work, step[2], temp, step[3], 0, dst=work)
+            elif name == "blur":
+                cv2.GaussianBlur(work, (step[1], step[1]), 0, dst=temp)
+                work, temp = temp, work
+        self._local.work, self._local.temp = work, temp  # 交換過的緩衝區記回去
+
+        if merge_channel is not None:
+            if out is None:
+                out = np.zeros(work.shape[:2] + (3,), np.uint8)
+            else:
+                out[...] = 0
+            out[:, :, merge_channel] = work
+            return out
+        if out is None:
+            return work.copy()
+        np.copyto(out, work)
+        return out
+
+@lru_cache(maxsize=32)
+def adjust_chain(contrast, brightness):
+    """GUI 亮度對比調整用的處理鏈 (同一組參數只編譯一次)"""
+    return PreprocessChain([("contrast", contrast, brightness)])
@@ -0,0 +1,55 @@
+# progress.py
+# 管線進度事件匯流排
+# 背景執行緒只負責把事件放進佇列，Tk 主執行緒定時取出並更新畫面，不跨執行緒操作 widget
+
+import queue
+
+# 各階段在進度條上佔的區間 (起點, 終點)，依實際完成的工作量內插
+PIPELINE_STAGES = {
+    "sr": (0, 40),        # 超解析 (切片數)
+    "adjust": (40, 45),   # 亮度對比
+    "detect": (45, 70),   # YOLO 偵測 (切片數)
+    "crop": (70, 75),     # 裁切
+    "classify": (75, 100),  # 細胞分類 (小圖數)
+}
+
+class ProgressBus:
+    def __init__(self, token=None, events=None):
+        # token：排程器工作的 CancelToken，工作作廢後它送出的事件在 drain 時丟掉
+        self.events = queue.Queue() if events is None else events
+        self.token = token
+
+    def job(self, token):
+        """同一個佇列、但事件帶著工作 token 的匯流排 (交給排程器的工作使用)"""
+        return ProgressBus(token, self.events)
+
+    def post(self, kind, *payload):
+        """任意執行緒都可以呼叫，例如 post("image", 陣列)、post("summary")、post("done")"""
+        self.events.put((self.token, (kind,) + payload))
+
+    def report(self, stage, done, total):
+        """回報某階段完成了 done / total 單位的工作"""
+        self.post("progress", stage, done, total)
+
+    def reporter(self, stage):
+        """回傳只需要 (done, total) 的回呼，交給引擎的 progress 參數"""
+        return lambda done, total: self.report(stage, done, total)
+
+    def drain(self):
+        """取出目前佇列中所有事件 (只在 Tk 主執行緒呼叫)，略過已作廢工作的事件"""
+        events = []
+        while True:
+            try:
+                token, event = self.events.get_nowait()
+            except queue.Empty:
+                return events
+            if token is not None and token.cancelled:
+                continue  # 已被取代的工作送來的事件 (例如上一張切片的圖片)
+            events.append(event)
+
+def stage_percent(stage, done, total):
+    """把階段內的完成量換算成整體進度百分比"""
+    start, end = PIPELINE_STAGES.get(stage, (0, 100))
+    if total <= 0:
+        return end
+    return start + (end - start) * min(done, total) / total
@@ -0,0 +1,138 @@
+# result_cache.py
+# 以內容雜湊為鍵的階段結果快取
+# 鍵 = 切片像素的雜湊 + 使用中的權重檔雜湊 + 參數，值 = 一組 numpy 陣列
+# 最近用過的結果留在記憶體，其餘存成 .npz，超過容量上限時依最後使用時間 (LRU) 淘汰
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+_fingerprints = {}  # (路徑, 大小, 修改時間) -> 檔案內容雜湊
+
+def file_fingerprint(path):
+    """權重檔的內容雜湊，同一個檔案沒變動時只算一次"""
+    if not path or not os.path.exists(path):
+        return "missing"
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if cache_key not in _fingerprints:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _fingerprints[cache_key] = digest.hexdigest()
+    return _fingerprints[cache_key]
+
+def array_digest(arr):
+    """陣列內容 (含形狀與型別) 的雜湊"""
+    arr = np.ascontiguousarray(arr)
+    digest = hashlib.sha1()
+    digest.update(f"{arr.shape}{arr.dtype}".encode())
+    digest.update(arr.data)
+    return digest.hexdigest()
+
+def make_key(*parts):
+    """把字串、數值、陣列組合成一個快取鍵"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(array_digest(part).encode())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes, memory_items=32):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory = OrderedDict()  # 鍵 -> {名稱: 陣列}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 掃描既有的快取檔 (上一次開啟程式留下的)
+        self._entries = {}  # 路徑 -> (大小, 最後使用時間)
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".npz"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    self._entries[path] = (stat.st_size, stat.st_mtime)
+        self._total_bytes = sum(size for size, _ in self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npz")
+
+    def _remember(self, key, arrays):
+        self._memory[key] = arrays
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """回傳 {名稱: 陣列}，沒有快取時回傳 None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            path = self._path(key)
+            if path not in self._entries:
+                return None
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    arrays = {name: data[name] for name in data.files}
+                os.utime(path, None)  # 更新最後使用時間，作為 LRU 依據
+                size, _ = self._entries[path]
+                self._entries[path] = (size, os.stat(path).st_mtime)
+            except Exception as e:
+                print(f"⚠️ 讀取快取失敗，改為重新計算: {path} - {e}")
+                self._discard(path)
+                return None
+
+            self._remember(key, arrays)
+            return arrays
+
+    def put(self, key, arrays):
+        """存入 {名稱: 陣列}，超過容量上限時淘汰最久沒用的項目"""
+        with self._lock:
+            self._remember(key, arrays)
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path)  # 寫完才換上，避免留下寫一半的快取
+            except Exception as e:
+                print(f"⚠️ 寫入快取失敗: {path} - {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+
+            if path in self._entries:
+                self._total_bytes -= self._entries[path][0]
+            stat = os.stat(path)
+            self._entries[path] = (stat.st_size, stat.st_mtime)
+            self._total_bytes += stat.st_size
+            self._evict()
+
+    def _discard(self, path):
+        size, _ = self._entries.pop(path, (0, 0))
+        self._total_bytes -= size
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._discard(path)
+            key = os.path.splitext(os.path.basename(path))[0]
+            self._memory.pop(key, None)
@@ -0,0 +1,209 @@
+# result_sink.py
+# 批次工具共用的結果輸出層：結果一產生就寫出，不在記憶體中累積整份報表
+# 格式依副檔名決定：.csv / .parquet / .xlsx
+# 每個表格累積 flush_rows 列或超過 flush_seconds 秒就寫出一次，程式中途當掉時已寫出的結果仍然保留
+#   CSV：每個表格一個檔案，每次 flush 直接寫進檔案
+#   Parquet：每個表格一個檔案，每次 flush 寫成一個 row group (需要 pyarrow)
+#            欄位型別由 table(..., types=[...]) 指定 ("str" / "int" / "float" / "bool")；
+#            沒有指定時數值欄一律用 float64、其餘用字串，避免第一批資料 (例如全是 None) 決定出錯的型別
+#   XLSX：openpyxl write-only 模式，每個表格一個工作表；xlsx 要到結束時才能存成完整檔案，
+#         所以同時把每次 flush 的資料列寫進 <檔名>.partial/<表格>.csv，正常結束後刪除
+# 有多個表格時，CSV / Parquet 的第一個表格寫到 path，其餘寫到 <path 主檔名>_<表格名稱><副檔名>
+#
+# 用法：
+#     with open_sink("results.xlsx") as sink:
+#         table = sink.table("DoG_Result", ["檔名", "灰階平均值"], types=["str", "float"])
+#         table.write([filename, mean_gray])
+
+import os
+import csv
+import time
+import shutil
+
+FORMATS = (".csv", ".parquet", ".xlsx")
+TYPES = ("str", "int", "float", "bool")
+
+class _Table:
+    def __init__(self, sink, name, columns, types=None):
+        self.sink = sink
+        self.name = name
+        self.columns = list(columns)
+        if types is not None:
+            types = list(types)
+            if len(types) != len(self.columns) or set(types) - set(TYPES):
+                raise ValueError(f"{name} 的欄位型別必須是每欄一個 {', '.join(TYPES)}: {types}")
+        self.types = types
+        self.pending = []
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, row):
+        self.pending.append(list(row))
+        if len(self.pending) >= self.sink.flush_rows or time.monotonic() - self.last_flush >= self.sink.flush_seconds:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self.pending:
+            self._write_rows(self.pending)
+            self.rows_written += len(self.pending)
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+class _CsvTable(_Table):
+    def __init__(self, sink, name, columns, path, types=None):
+        super().__init__(sink, name, columns, types)
+        self.path = path
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+        self.file.flush()
+
+    def _write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+class _ParquetTable(_Table):
+    _CONVERT = {"str": str, "int": int, "float": float, "bool": bool}
+
+    def __init__(self, sink, name, columns, path, types=None):
+        super().__init__(sink, name, columns, types)
+        self.path = path
+        self.writer = None
+        self.schema = None
+
+    @staticmethod
+    def _infer_type(values):
+        # 沒有指定型別時：布林欄維持布林，數值欄 (含整數) 用 float64，其餘 (含全是 None) 用字串
+        values = [v for v in values if v is not None]
+        if values and all(isinstance(v, bool) for v in values):
+            return "bool"
+        if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return "float"
+        return "str"
+
+    def _schema(self, rows):
+        pa, _ = self.sink.pyarrow
+        types = self.types or [self._infer_type(row[i] if i < len(row) else None for row in rows)
+                               for i in range(len(self.columns))]
+        self.types = types  # 之後的資料列沿用同一組型別
+        arrow_types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_()}
+        return pa.schema([(column, arrow_types[t]) for column, t in zip(self.columns, types)])
+
+    def _write_rows(self, rows):
+        pa, pq = self.sink.pyarrow
+        if self.writer is None:
+            self.schema = self._schema(rows)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        arrays = []
+        for i, t in enumerate(self.types):
+            convert = self._CONVERT[t]
+            values = [row[i] if i < len(row) else None for row in rows]
+            arrays.append(pa.array([None if v is None else convert(v) for v in values], type=self.schema.field(i).type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _close(self):
+        if self.writer is None:
+            # 沒有任何資料列時仍輸出只有欄位的空檔案
+            _, pq = self.sink.pyarrow
+            pq.write_table(self._schema([]).empty_table(), self.path)
+        else:
+            self.writer.close()
+
+class _XlsxTable(_Table):
+    def __init__(self, sink, name, columns, journal_path, types=None):
+        super().__init__(sink, name, columns, types)
+        self.sheet = sink.workbook.create_sheet(name)
+        self.sheet.append(self.columns)
+        self.journal = _CsvTable(sink, name, columns, journal_path)
+
+    def _write_rows(self, rows):
+        for row in rows:
+            self.sheet.append(row)
+        self.journal._write_rows(rows)
+
+    def _close(self):
+        self.journal._close()
+
+class ResultSink:
+    def __init__(self, path, flush_rows=100, flush_seconds=5.0):
+        self.path = path
+        self.base, self.format = os.path.splitext(path)
+        self.format = self.format.lower()
+        if self.format not in FORMATS:
+            raise ValueError(f"不支援的輸出格式: {path} (可用 {', '.join(FORMATS)})")
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.tables = {}
+        self.closed = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        if self.format == ".parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("輸出 Parquet 需要安裝 pyarrow (pip install pyarrow)")
+            self.pyarrow = (pa, pq)
+        elif self.format == ".xlsx":
+            from openpyxl import Workbook
+            self.workbook = Workbook(write_only=True)
+            self.journal_dir = path + ".partial"
+            os.makedirs(self.journal_dir, exist_ok=True)
+
+    def table(self, name, columns, types=None):
+        """
+        建立 (或取回) 一個表格，回傳可呼叫 write / write_many 的物件
+        types：每欄的型別 ("str" / "int" / "float" / "bool")，決定 Parquet 的欄位型別
+        """
+        if name in self.tables:
+            return self.tables[name]
+        if self.format == ".xlsx":
+            table = _XlsxTable(self, name, columns, os.path.join(self.journal_dir, f"{name}.csv"), types)
+        else:
+            path = self.path if not self.tables else f"{self.base}_{name}{self.format}"
+            table_class = _CsvTable if self.format == ".csv" else _ParquetTable
+            table = table_class(self, name, columns, path, types)
+        self.tables[name] = table
+        return table
+
+    def flush(self):
+        for table in self.tables.values():
+            table.flush()
+
+    def close(self):
+        """寫出剩下的資料列並關閉檔案；xlsx 在這裡存檔並刪除暫存紀錄"""
+        if self.closed:
+            return
+        self.closed = True
+        for table in self.tables.values():
+            table.close()
+        if self.format == ".xlsx":
+            if not self.tables:
+                self.workbook.create_sheet()  # openpyxl 不能存沒有工作表的活頁簿
+            # 先存暫存檔再取代，避免存到一半留下壞掉的 xlsx
+            tmp_path = self.base + ".tmp.xlsx"
+            self.workbook.save(tmp_path)
+            os.replace(tmp_path, self.path)
+            shutil.rmtree(self.journal_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 發生例外時也存下已產生的結果
+        self.close()
+        return False
+
+def open_sink(path, flush_rows=100, flush_seconds=5.0):
+    return ResultSink(path, flush_rows=flush_rows, flush_seconds=flush_seconds)
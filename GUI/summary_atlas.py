@@ -0,0 +1,200 @@
+# summary_atlas.py
+# 總覽圖的縮圖畫布：六個類別各一塊 MAX_ROWS x MAX_PER_ROW 的格子
+# 畫布只配置一次並直接以 SCALING_FACTOR 的尺寸繪製，更新時只重畫內容有變的格子
+# 同一張切片開著的期間格子位置固定：移走的細胞留下空格，新的細胞接在最後面，不會重新排序
+
+import os
+import threading
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from config import FONT_PATH, ROW_LABELS, COL_LABELS, CELL_SIZE, MAX_PER_ROW, MAX_ROWS, NUM_CLASSES, SCALING_FACTOR
+
+class SummaryAtlas:
+    def __init__(self, scale=SCALING_FACTOR):
+        self.scale = scale
+        self.cell = max(1, int(round(CELL_SIZE * scale)))  # 單格尺寸
+        self.pad_x = int(round(80 * scale))  # 左側留給列標籤的寬度
+        self.pad_y = int(round(60 * scale))  # 上方留給欄標籤的高度
+        self.grid_w = MAX_PER_ROW * self.cell
+        self.grid_h = MAX_ROWS * self.cell
+        self.capacity = MAX_PER_ROW * MAX_ROWS
+        self.border = max(1, int(round(4 * scale)))
+
+        self._lock = threading.Lock()
+        self._thumbnails = {}  # 檔名 -> 縮圖 (RGB)
+        self._blank = np.zeros((self.cell, self.cell, 3), dtype=np.uint8)
+
+        # 背景 (標籤與邊框) 只畫一次，之後清空時直接複製
+        self._background = self._draw_background()
+        self.canvas = self._background.copy()
+        self.slots = {cid: [None] * self.capacity for cid in range(1, NUM_CLASSES + 1)}  # 每格目前放的檔名
+        self.paths = {cid: [] for cid in range(1, NUM_CLASSES + 1)}  # 每個類別的完整路徑 (依加入順序，移走的為 None)
+        self.counts = {cid: 0 for cid in range(1, NUM_CLASSES + 1)}  # 每個類別的細胞數
+        self.pending = {}  # 還在背景搬移中的檔案：檔名 -> (新類別, 新路徑)，sync 時以新類別為準
+
+    def _draw_background(self):
+        height = self.grid_h * 3 + self.pad_y
+        width = self.grid_w * 2 + self.pad_x
+        canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+        for cid in range(1, NUM_CLASSES + 1):
+            x, y = self.grid_origin(cid)
+            canvas[y:y + self.grid_h, x:x + self.grid_w] = 0
+
+        pil = Image.fromarray(canvas)
+        draw = ImageDraw.Draw(pil)
+        try:
+            font = ImageFont.truetype(FONT_PATH, max(1, int(27 * self.scale)))  # 設置字體
+        except OSError:
+            font = ImageFont.load_default()
+        for i, label in enumerate(COL_LABELS):  # 添加列標籤
+            x = self.pad_x + i * self.grid_w + self.grid_w // 2 - int(30 * self.scale)
+            draw.text((x, 0), label, fill="black", font=font)
+        for i, label in enumerate(ROW_LABELS):  # 添加行標籤
+            y = self.pad_y + i * self.grid_h + self.grid_h // 2 - int(20 * self.scale)
+            draw.text((0, y), label, fill="black", font=font)
+
+        canvas = np.array(pil)
+        for cid in range(1, NUM_CLASSES + 1):
+            self._draw_border(canvas, cid)
+        return canvas
+
+    def grid_origin(self, class_id):
+        # 類別格子左上角座標：3 列 x 2 欄，類別 1..6 由左到右、由上到下
+        r, c = divmod(class_id - 1, 2)
+        return self.pad_x + c * self.grid_w, self.pad_y + r * self.grid_h
+
+    def _draw_border(self, canvas, class_id):
+        x, y = self.grid_origin(class_id)
+        cv2.rectangle(canvas, (x, y), (x + self.grid_w, y + self.grid_h), (0, 0, 0), self.border)
+
+    def _write_slot(self, class_id, index, thumbnail):
+        x, y = self.grid_origin(class_id)
+        r, c = divmod(index, MAX_PER_ROW)
+        y0, x0 = y + r * self.cell, x + c * self.cell
+        self.canvas[y0:y0 + self.cell, x0:x0 + self.cell] = self._blank if thumbnail is None else thumbnail
+        # 邊緣格子會蓋到邊框，重畫這一格所在格子的邊框
+        if r in (0, MAX_ROWS - 1) or c in (0, MAX_PER_ROW - 1):
+            self._draw_border(self.canvas, class_id)
+
+    def remember(self, filename, img_bgr):
+        """先把分類時已在記憶體中的小圖縮好，之後 sync 不必再讀檔"""
+        thumbnail = cv2.cvtColor(cv2.resize(img_bgr, (self.cell, self.cell), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        with self._lock:
+            self._thumbnails[filename] = thumbnail
+
+    def _thumbnail(self, path):
+        filename = os.path.basename(path)
+        thumbnail = self._thumbnails.get(filename)
+        if thumbnail is None:
+            img = cv2.imread(path)
+            if img is None:
+                return None
+            thumbnail = cv2.cvtColor(cv2.resize(img, (self.cell, self.cell), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+            self._thumbnails[filename] = thumbnail
+        return thumbnail
+
+    def reset(self):
+        """換切片時清空畫布與縮圖快取"""
+        with self._lock:
+            self._thumbnails.clear()
+            self.canvas[...] = self._background
+            self.slots = {cid: [None] * self.capacity for cid in range(1, NUM_CLASSES + 1)}
+            self.paths = {cid: [] for cid in range(1, NUM_CLASSES + 1)}
+            self.counts = {cid: 0 for cid in range(1, NUM_CLASSES + 1)}
+
+    def sync(self, cluster_folder, prefix):
+        """
+        依 cluster_folder/<類別> 目前的內容 (加上還在搬移中的檔案) 更新畫布，只重畫有變動的格子
+        已經在畫布上的細胞位置不變，不見的留下空格，新出現的依修改時間接在最後面
+        回傳：{類別: 數量}
+        """
+        counts = {}
+        with self._lock:
+            current = {}  # 檔名 -> (類別, 修改時間, 路徑)
+            for class_id in range(1, NUM_CLASSES + 1):
+                class_path = os.path.join(cluster_folder, str(class_id))
+                if os.path.exists(class_path):
+                    for f in os.listdir(class_path):
+                        if f.startswith(prefix):
+                            path = os.path.join(class_path, f)
+                            current[f] = (class_id, os.path.getmtime(path), path)
+            for filename, (class_id, path) in self.pending.items():
+                if filename.startswith(prefix):
+                    current[filename] = (class_id, current.get(filename, (None, float("inf")))[1], path)
+
+            for class_id in range(1, NUM_CLASSES + 1):
+                paths = self.paths[class_id]
+                placed = set()
+                for index, path in enumerate(paths):
+                    if path is None:
+                        continue
+                    entry = current.get(os.path.basename(path))
+                    if entry is None or entry[0] != class_id:
+                        paths[index] = None  # 已不在這個類別：留空位，其他細胞不往前補
+                    else:
+                        paths[index] = entry[2]
+                        placed.add(os.path.basename(path))
+                new_entries = sorted((mtime, f, path) for f, (cid, mtime, path) in current.items()
+                                     if cid == class_id and f not in placed)
+                paths.extend(path for _, _, path in new_entries)
+                counts[class_id] = len(placed) + len(new_entries)
+                self.counts[class_id] = counts[class_id]
+
+                slots = self.slots[class_id]
+                for index in range(self.capacity):
+                    path = paths[index] if index < len(paths) else None
+                    filename = os.path.basename(path) if path is not None else None
+                    if slots[index] == filename:
+                        continue
+                    thumbnail = self._thumbnail(path) if filename else None
+                    self._write_slot(class_id, index, thumbnail)
+                    slots[index] = filename if thumbnail is not None else None  # 還讀不到的縮圖下次 sync 再補
+        return counts
+
+    def move(self, class_id, index, new_class_id, new_path):
+        """
+        把一個細胞從 class_id 的第 index 格移到 new_class_id 的最後面
+        只重畫原本那一格 (清空) 與新類別的下一格，其餘格子位置不變
+        回傳：新類別中的格子索引
+        """
+        with self._lock:
+            filename = os.path.basename(new_path)
+            self.pending[filename] = (new_class_id, new_path)  # 檔案搬完前 sync 以新類別為準
+            self.paths[class_id][index] = None  # 留空位，其他細胞不往前補
+            if index < self.capacity:
+                self._write_slot(class_id, index, None)
+                self.slots[class_id][index] = None
+
+            new_paths = self.paths[new_class_id]
+            new_paths.append(new_path)
+            new_index = len(new_paths) - 1
+            if new_index < self.capacity:
+                self._write_slot(new_class_id, new_index, self._thumbnail(new_path) if filename in self._thumbnails else None)
+                self.slots[new_class_id][new_index] = filename
+
+            self.counts[class_id] -= 1
+            self.counts[new_class_id] += 1
+            return new_index
+
+    def finish_move(self, new_path):
+        """背景執行緒搬完 (或搬移失敗) 後呼叫，之後 sync 直接以磁碟內容為準"""
+        with self._lock:
+            filename = os.path.basename(new_path)
+            if self.pending.get(filename, (None, None))[1] == new_path:
+                del self.pending[filename]
+
+    def hit_test(self, x, y):
+        """畫布座標 -> (類別, 格子索引)，點在格子外時回傳 None"""
+        col = (x - self.pad_x) // self.grid_w
+        row = (y - self.pad_y) // self.grid_h
+        if not (0 <= col <= 1 and 0 <= row <= 2):
+            return None
+        class_id = row * 2 + col + 1
+        grid_c = (x - self.pad_x - col * self.grid_w) // self.cell
+        grid_r = (y - self.pad_y - row * self.grid_h) // self.cell
+        return class_id, grid_r * MAX_PER_ROW + grid_c
+
+    def to_pil(self):
+        with self._lock:
+            return Image.fromarray(self.canvas.copy())
@@ -0,0 +1,188 @@
+# tiled_reader.py
+# 超大原圖 (拼接後的整孔 TIFF) 的分塊讀取：只在需要某個區域時才從檔案讀出那一塊
+# 未壓縮、連續儲存的 TIFF 直接以記憶體映射 (np.memmap) 開啟，不解碼整張圖
+#   1. 有安裝 tifffile 時用 tifffile.memmap (支援 BigTIFF、OME-TIFF 等)
+#   2. 否則自行解析 TIFF 標頭 (一般 TIFF 與 BigTIFF、未壓縮、strip 連續)
+#   3. 其他格式 (JPG / PNG / 壓縮過的 TIFF) 無法映射，退回 cv2.imread 整張讀入
+# 讀出的區域與 cv2.imread 彩色模式相同：BGR、uint8
+#
+# 用法：
+#     with TiledImage(path) as image:
+#         h, w = image.shape[:2]
+#         tile = image[0:1024, 0:1024]          # 或 image.read_region(x1, y1, x2, y2)
+
+import os
+import struct
+import cv2
+import numpy as np
+from tiling import tile_regions
+
+# 用到的 TIFF 標籤
+_TAG_WIDTH = 256
+_TAG_HEIGHT = 257
+_TAG_BITS = 258
+_TAG_COMPRESSION = 259
+_TAG_PHOTOMETRIC = 262
+_TAG_STRIP_OFFSETS = 273
+_TAG_SAMPLES = 277
+_TAG_STRIP_COUNTS = 279
+_TAG_PLANAR = 284
+_TAG_TILE_WIDTH = 322
+_TAG_SAMPLE_FORMAT = 339
+
+# TIFF 欄位型別 -> struct 格式
+_FIELD_FORMATS = {1: "B", 3: "H", 4: "I", 16: "Q"}
+
+def _parse_tiff(path):
+    """
+    讀第一個 IFD，可以直接映射時回傳 (高, 寬, 通道數, dtype, 資料起點, photometric)，否則回傳 None
+    只接受未壓縮、每像素交錯儲存 (chunky)、strip 連續、無號整數 8/16 位元的影像
+    """
+    with open(path, "rb") as f:
+        header = f.read(16)
+        if header[:2] == b"II":
+            order = "<"
+        elif header[:2] == b"MM":
+            order = ">"
+        else:
+            return None
+        version = struct.unpack(order + "H", header[2:4])[0]
+        if version == 42:
+            ifd_offset = struct.unpack(order + "I", header[4:8])[0]
+            entries_format, count_format, offset_format, entry_size = "H", "I", "I", 12
+        elif version == 43:  # BigTIFF
+            ifd_offset = struct.unpack(order + "Q", header[8:16])[0]
+            entries_format, count_format, offset_format, entry_size = "Q", "Q", "Q", 20
+        else:
+            return None
+
+        f.seek(ifd_offset)
+        num_entries = struct.unpack(order + entries_format, f.read(struct.calcsize(entries_format)))[0]
+        count_size = struct.calcsize(count_format)
+        value_size = struct.calcsize(offset_format)
+        entries = f.read(num_entries * entry_size)
+
+        tags = {}
+        for i in range(num_entries):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            tag, field_type = struct.unpack(order + "HH", entry[:4])
+            count = struct.unpack(order + count_format, entry[4:4 + count_size])[0]
+            if field_type not in _FIELD_FORMATS:
+                continue
+            item_format = _FIELD_FORMATS[field_type]
+            size = struct.calcsize(item_format) * count
+            raw = entry[4 + count_size:]
+            if size > value_size:
+                # 值放不下時欄位存的是位移
+                f.seek(struct.unpack(order + offset_format, raw)[0])
+                raw = f.read(size)
+            tags[tag] = struct.unpack(order + item_format * count, raw[:size])
+
+    if _TAG_TILE_WIDTH in tags or tags.get(_TAG_COMPRESSION, (1,))[0] != 1 or tags.get(_TAG_PLANAR, (1,))[0] != 1:
+        return None
+    if tags.get(_TAG_SAMPLE_FORMAT, (1,))[0] != 1:
+        return None
+    bits = set(tags.get(_TAG_BITS, (1,)))
+    if len(bits) != 1 or bits.pop() not in (8, 16):
+        return None
+    width, height = tags[_TAG_WIDTH][0], tags[_TAG_HEIGHT][0]
+    samples = tags.get(_TAG_SAMPLES, (1,))[0]
+    photometric = tags.get(_TAG_PHOTOMETRIC, (1,))[0]
+    if photometric not in (1, 2) or samples not in (1, 3, 4):
+        return None
+
+    dtype = np.dtype(order + ("u1" if tags[_TAG_BITS][0] == 8 else "u2"))
+    offsets, counts = tags[_TAG_STRIP_OFFSETS], tags[_TAG_STRIP_COUNTS]
+    for i in range(len(offsets) - 1):
+        if offsets[i] + counts[i] != offsets[i + 1]:
+            return None  # strip 不連續
+    if sum(counts) < width * height * samples * dtype.itemsize:
+        return None
+    return height, width, samples, dtype, offsets[0], photometric
+
+def _to_bgr(region, rgb):
+    # 與 cv2.imread 彩色模式相同的轉換
+    if region.dtype != np.uint8:
+        # 16 位元：灰階取高 8 位元，彩色為 x * 255 / 65535 四捨五入 (兩者都與 cv2.imread 相同)
+        region = (region >> 8).astype(np.uint8) if region.ndim == 2 else cv2.convertScaleAbs(region, alpha=255 / 65535)
+    if region.ndim == 2:
+        return cv2.cvtColor(region, cv2.COLOR_GRAY2BGR)
+    if region.shape[2] == 4:
+        return cv2.cvtColor(region, cv2.COLOR_RGBA2BGR if rgb else cv2.COLOR_BGRA2BGR)
+    return cv2.cvtColor(region, cv2.COLOR_RGB2BGR) if rgb else np.ascontiguousarray(region)
+
+class TiledImage:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cannot load image: {path}")
+        self.path = path
+        self.data = None
+        self.rgb = True  # TIFF 內的彩色資料是 RGB 順序
+        if path.lower().endswith((".tif", ".tiff")):
+            self.data = self._memmap_tifffile(path)
+            if self.data is None:
+                self.data = self._memmap_raw(path)
+        self.is_memmap = self.data is not None
+        if self.data is None:
+            # 無法映射的格式：整張讀入後同樣以區域方式提供
+            self.data = cv2.imread(path)
+            self.rgb = False
+            if self.data is None:
+                raise FileNotFoundError(f"Cannot load image: {path}")
+        self.shape = self.data.shape[:2] + (3,)
+
+    @staticmethod
+    def _memmap_tifffile(path):
+        try:
+            import tifffile
+        except ImportError:
+            return None
+        try:
+            data = tifffile.memmap(path, mode="r")
+        except (ValueError, OSError):
+            return None
+        if data.dtype not in (np.uint8, np.uint16) or not (data.ndim == 2 or (data.ndim == 3 and data.shape[2] in (3, 4))):
+            return None
+        return data
+
+    @staticmethod
+    def _memmap_raw(path):
+        try:
+            layout = _parse_tiff(path)
+        except (OSError, struct.error, KeyError, IndexError):
+            return None
+        if layout is None:
+            return None
+        height, width, samples, dtype, offset, _ = layout
+        shape = (height, width) if samples == 1 else (height, width, samples)
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def read_region(self, x1, y1, x2, y2):
+        """讀出 [y1:y2, x1:x2] 的 BGR uint8 陣列 (只讀這個區域涵蓋的資料)"""
+        h, w = self.shape[:2]
+        x1, x2 = max(0, x1), min(w, x2)
+        y1, y2 = max(0, y1), min(h, y2)
+        return _to_bgr(np.asarray(self.data[y1:y2, x1:x2]), self.rgb)
+
+    def __getitem__(self, key):
+        rows, cols = key[:2] if isinstance(key, tuple) else (key, slice(None))
+        h, w = self.shape[:2]
+        y1, y2, _ = rows.indices(h)
+        x1, x2, _ = cols.indices(w)
+        return self.read_region(x1, y1, x2, y2)
+
+    def regions(self, rows=3, cols=3, overlap=0):
+        """依序讀出 rows x cols 的每一塊 (一次只在記憶體中保留一塊)，overlap 為相鄰塊重疊的像素數"""
+        for x1, y1, x2, y2 in tile_regions(self.shape[0], self.shape[1], rows, cols, overlap):
+            yield self.read_region(x1, y1, x2, y2)
+
+    def close(self):
+        # 放掉映射的參照，讓檔案可以被刪除或覆寫 (Windows 上映射中的檔案會被鎖住)
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
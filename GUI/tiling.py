@@ -0,0 +1,121 @@
+# tiling.py
+# 原圖切片的幾何計算與跨切片合併
+# 切片邊界平均分配，餘數像素分到各塊，不會被捨去；相鄰切片可以重疊，
+# 切在邊界上的細胞至少會完整出現在其中一張切片裡
+# 各切片的偵測框換回原圖座標後，用一次全域 NMS 去掉重疊區域中的重複偵測
+
+import math
+import numpy as np
+
+def tile_regions(height, width, rows=3, cols=3, overlap=0):
+    """
+    rows x cols 的切片區域
+    overlap：相鄰切片共用的像素寬度 (原圖座標)
+    回傳：[(x1, y1, x2, y2)]，順序為由左到右、由上到下
+    """
+    ys = [round(i * height / rows) for i in range(rows + 1)]
+    xs = [round(i * width / cols) for i in range(cols + 1)]
+    before, after = overlap // 2, overlap - overlap // 2
+    regions = []
+    for row in range(rows):
+        for col in range(cols):
+            regions.append((max(0, xs[col] - before), max(0, ys[row] - before),
+                            min(width, xs[col + 1] + after), min(height, ys[row + 1] + after)))
+    return regions
+
+def split_regions(height, width, rows=3, cols=3):
+    """不重疊的 rows x cols 等分 (split_image_arrays / split_image_to_nine 使用)"""
+    return tile_regions(height, width, rows, cols, 0)
+
+def grid_for_tile_size(height, width, tile_size, overlap=0):
+    """依原圖大小決定列數與行數，讓每塊 (含重疊) 不超過 tile_size 像素"""
+    step = max(1, tile_size - overlap)
+    rows = max(1, math.ceil(height / step))
+    cols = max(1, math.ceil(width / step))
+    return rows, cols
+
+MERGE_IOS = 0.6   # 不同切片的兩個框，交集佔較小框的比例超過這個值就視為同一個細胞
+EDGE_MARGIN = 2   # 框離切片內側邊界幾個像素內視為被切斷
+
+def box_overlaps_xyxy(boxes1, boxes2):
+    """(N,4) 與 (M,4) xyxy 框的 IoU 與 IoS (交集 / 較小框面積) 矩陣，皆為 (N,M)"""
+    x1 = np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    y1 = np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    x2 = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    y2 = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - inter
+    smaller = np.minimum(area1[:, None], area2[None, :])
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    ios = np.divide(inter, smaller, out=np.zeros_like(inter), where=smaller > 0)
+    return iou, ios
+
+def greedy_suppress(suppress):
+    """
+    suppress：(N,N) 布林矩陣，列與行已依優先順序排好，suppress[i, j] 表示 i 保留時要去掉 j
+    回傳：保留的位置 (遞增)
+    """
+    removed = np.zeros(len(suppress), dtype=bool)
+    keep = []
+    for i in range(len(suppress)):
+        if removed[i]:
+            continue
+        keep.append(i)
+        removed[i + 1:] |= suppress[i, i + 1:]
+    return np.asarray(keep, dtype=np.int64)
+
+def merge_tile_detections(tile_detections, regions, scales, iou=0.5, ios=MERGE_IOS):
+    """
+    把每張切片的偵測結果換回原圖座標並做一次全域 NMS
+    tile_detections：每張切片一個 dict (boxes xyxy / classes / confs)，座標為該切片 (可能已超解析) 的像素
+    regions：每張切片在原圖中的 (x1, y1, x2, y2)
+    scales：每張切片的 (x 放大倍率, y 放大倍率)，超解析 x4 時為 (4, 4)
+    同一張切片的框之間用 IoU > iou 判斷重複 (與 YOLO 相同)；不同切片的框另外用 IoS > ios 判斷，
+    被切片邊界切斷的細胞只剩一小塊時也能和完整的框合併；完整的框優先保留，其次看信心值
+    回傳 dict：boxes (原圖座標) / classes / confs / tiles (來源切片) / indices (在來源切片中的索引)，依信心值由高到低
+    """
+    boxes, classes, confs, tiles, indices = [], [], [], [], []
+    for tile, (detections, (x1, y1, _, _), (sx, sy)) in enumerate(zip(tile_detections, regions, scales)):
+        tile_boxes = np.asarray(detections["boxes"], dtype=np.float32).reshape(-1, 4) / np.array([sx, sy, sx, sy], dtype=np.float32)
+        boxes.append(tile_boxes + np.array([x1, y1, x1, y1], dtype=np.float32))
+        classes.append(np.asarray(detections["classes"], dtype=np.int64))
+        confs.append(np.asarray(detections["confs"], dtype=np.float32))
+        tiles.append(np.full(len(tile_boxes), tile, dtype=np.int64))
+        indices.append(np.arange(len(tile_boxes), dtype=np.int64))
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4), np.float32)
+    classes = np.concatenate(classes) if classes else np.zeros(0, np.int64)
+    confs = np.concatenate(confs) if confs else np.zeros(0, np.float32)
+    tiles = np.concatenate(tiles) if tiles else np.zeros(0, np.int64)
+    indices = np.concatenate(indices) if indices else np.zeros(0, np.int64)
+
+    region_array = np.asarray(regions, dtype=np.float32).reshape(-1, 4)
+    # 只有碰到其他切片範圍的框可能重複，其餘的框 (同一張切片內已經過 YOLO 的 NMS) 直接保留
+    touches = ((boxes[:, None, 0] < region_array[None, :, 2]) & (boxes[:, None, 2] > region_array[None, :, 0]) &
+               (boxes[:, None, 1] < region_array[None, :, 3]) & (boxes[:, None, 3] > region_array[None, :, 1]))
+    shared = np.flatnonzero(touches.sum(axis=1) > 1)
+
+    # 框貼著自己切片的內側邊界 (不是原圖邊界) 時視為被切斷
+    own = region_array[tiles[shared]]
+    image_min = region_array[:, :2].min(axis=0)
+    image_max = region_array[:, 2:].max(axis=0)
+    b = boxes[shared]
+    truncated = (((b[:, 0] - own[:, 0] < EDGE_MARGIN) & (own[:, 0] > image_min[0])) |
+                 ((b[:, 1] - own[:, 1] < EDGE_MARGIN) & (own[:, 1] > image_min[1])) |
+                 ((own[:, 2] - b[:, 2] < EDGE_MARGIN) & (own[:, 2] < image_max[0])) |
+                 ((own[:, 3] - b[:, 3] < EDGE_MARGIN) & (own[:, 3] < image_max[1])))
+
+    order = shared[np.lexsort((-confs[shared], truncated))]  # 完整的框在前，同類再依信心值
+    ious, ioss = box_overlaps_xyxy(boxes[order], boxes[order])
+    same_class = classes[order][:, None] == classes[order][None, :]
+    cross_tile = tiles[order][:, None] != tiles[order][None, :]
+    suppress = same_class & ((ious > iou) | (cross_tile & (ioss > ios)))
+
+    keep_mask = np.ones(len(boxes), dtype=bool)
+    keep_mask[shared] = False
+    keep_mask[order[greedy_suppress(suppress)]] = True
+
+    keep = np.flatnonzero(keep_mask)
+    keep = keep[np.argsort(-confs[keep], kind="stable")]
+    return {"boxes": boxes[keep], "classes": classes[keep], "confs": confs[keep], "tiles": tiles[keep], "indices": indices[keep]}
@@ -0,0 +1,172 @@
+# yolo_backend.py
+# YOLO 偵測的 CPU 加速後端 (ONNX Runtime / OpenVINO)
+# 每個 .pt 只匯出一次，匯出結果放在權重旁邊，檔名帶權重雜湊：
+#     weights/YOLO/YOLOv11_green_best.<雜湊>.onnx
+#     weights/YOLO/YOLOv11_green_best.<雜湊>_openvino_model/
+# 權重檔更新後雜湊改變，會重新匯出並刪除舊的匯出結果
+# 匯出後仍由 Ultralytics 載入 (YOLO(匯出路徑))，predict 的輸出格式與 PyTorch 相同
+# ultralytics 在第一次載入模型時才匯入
+#
+# 檢查新後端與 PyTorch 的偵測是否一致並量測速度：
+#     python yolo_backend.py --backend onnx --images ./image/split
+#     python yolo_backend.py --backend openvino --images ./image/split --runs 10
+
+import os
+import glob
+import time
+import shutil
+import argparse
+import cv2
+import numpy as np
+from result_cache import file_fingerprint
+from tiling import box_overlaps_xyxy
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+EXPORT_IMGSZ = 640
+PARITY_IOU = 0.9         # 兩個後端的框 IoU 超過這個值 (且類別相同) 視為同一個偵測
+PARITY_TOLERANCE = 0.98  # 對得上的偵測比例至少要這麼多才算一致
+
+def _artifact_suffix(backend):
+    return ".onnx" if backend == "onnx" else "_openvino_model"
+
+def exported_path(model_path, backend):
+    """某個 .pt 在指定後端的匯出路徑 (檔名帶權重雜湊)"""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}.{file_fingerprint(model_path)[:12]}{_artifact_suffix(backend)}"
+
+def export_yolo(model_path, backend, imgsz=EXPORT_IMGSZ):
+    """
+    匯出 (或取回已匯出的) ONNX / OpenVINO 模型
+    回傳：可以直接交給 YOLO() 的路徑
+    """
+    target = exported_path(model_path, backend)
+    if os.path.exists(target):
+        return target
+
+    # 刪掉同一個權重舊版本的匯出結果
+    stem = os.path.splitext(model_path)[0]
+    for stale in glob.glob(f"{glob.escape(stem)}.{'[0-9a-f]' * 12}{_artifact_suffix(backend)}"):
+        shutil.rmtree(stale) if os.path.isdir(stale) else os.remove(stale)
+        print(f"🔍 已刪除過期的匯出模型: {stale}")
+
+    from ultralytics import YOLO
+
+    print(f"🔍 匯出 {os.path.basename(model_path)} 為 {backend} (只需一次)...")
+    # dynamic=True：批次大小可變，yolo_detect_batch 一次送多張切片
+    output = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True, verbose=False)
+    os.replace(output, target)
+    print(f"✅ 已匯出: {target}")
+    return target
+
+def load_backend_model(model_path, backend="pytorch"):
+    """
+    依後端載入 YOLO；匯出失敗 (例如沒有安裝 onnxruntime / openvino) 時退回 PyTorch
+    回傳：(模型, 實際使用的後端)
+    """
+    from ultralytics import YOLO
+
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的 YOLO 後端: {backend} (可用 {', '.join(BACKENDS)})")
+    if backend != "pytorch":
+        try:
+            return YOLO(export_yolo(model_path, backend), task="detect"), backend
+        except Exception as e:
+            print(f"⚠️ 無法使用 {backend} 後端，改用 PyTorch: {e}")
+    return YOLO(model_path), "pytorch"
+
+def _detect(model, img, conf, iou, imgsz):
+    result = model.predict(source=img, save=False, imgsz=imgsz, conf=conf, iou=iou, verbose=False)[0]
+    return (result.boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4),
+            result.boxes.cls.cpu().numpy().astype(np.int64),
+            result.boxes.conf.cpu().numpy().astype(np.float32))
+
+def _match_count(reference, candidate):
+    # 依信心值由高到低，每個參考框配對一個 IoU 最高且類別相同、還沒配對過的候選框
+    ref_boxes, ref_classes, ref_confs = reference
+    boxes, classes, _ = candidate
+    if len(ref_boxes) == 0 or len(boxes) == 0:
+        return 0
+    ious, _ = box_overlaps_xyxy(ref_boxes, boxes)
+    ious[ref_classes[:, None] != classes[None, :]] = 0
+    used = np.zeros(len(boxes), dtype=bool)
+    matched = 0
+    for i in np.argsort(-ref_confs, kind="stable"):
+        row = np.where(used, 0, ious[i])
+        j = int(row.argmax())
+        if row[j] >= PARITY_IOU:
+            used[j] = True
+            matched += 1
+    return matched
+
+def check_backend(model_path, backend, images, conf=0.1, iou=0.1, imgsz=EXPORT_IMGSZ, runs=5):
+    """
+    比較 backend 與 PyTorch 在 images 上的偵測結果與速度
+    回傳 dict：偵測數、對得上的比例 (recall / precision)、每張平均毫秒數與加速倍率
+    """
+    from ultralytics import YOLO
+
+    reference_model = YOLO(model_path)
+    model, used = load_backend_model(model_path, backend)
+    if used != backend:
+        raise RuntimeError(f"{backend} 後端無法使用")
+
+    totals = {"reference": 0, "candidate": 0, "matched": 0}
+    for img in images:
+        reference = _detect(reference_model, img, conf, iou, imgsz)
+        candidate = _detect(model, img, conf, iou, imgsz)
+        totals["reference"] += len(reference[0])
+        totals["candidate"] += len(candidate[0])
+        totals["matched"] += _match_count(reference, candidate)
+
+    timings = {}
+    for name, m in (("pytorch", reference_model), (backend, model)):
+        _detect(m, images[0], conf, iou, imgsz)  # 暖機
+        start = time.perf_counter()
+        for _ in range(runs):
+            for img in images:
+                _detect(m, img, conf, iou, imgsz)
+        timings[name] = (time.perf_counter() - start) * 1000 / (runs * len(images))
+
+    recall = totals["matched"] / totals["reference"] if totals["reference"] else 1.0
+    precision = totals["matched"] / totals["candidate"] if totals["candidate"] else 1.0
+    return {
+        "model": os.path.basename(model_path),
+        "backend": backend,
+        "detections": totals["reference"],
+        "backend_detections": totals["candidate"],
+        "recall": recall,
+        "precision": precision,
+        "parity": recall >= PARITY_TOLERANCE and precision >= PARITY_TOLERANCE,
+        "pytorch_ms": timings["pytorch"],
+        "backend_ms": timings[backend],
+        "speedup": timings["pytorch"] / timings[backend],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="匯出 YOLO 權重為 ONNX / OpenVINO，並檢查與 PyTorch 的一致性與速度")
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx")
+    parser.add_argument("--weights", default=os.path.join("./weights", "YOLO"), help=".pt 所在資料夾")
+    parser.add_argument("--images", default="./image/split", help="用來比對的圖片資料夾")
+    parser.add_argument("--limit", type=int, default=20, help="最多使用幾張圖片")
+    parser.add_argument("--runs", type=int, default=5, help="量測速度時重複次數")
+    args = parser.parse_args()
+
+    image_files = sorted(f for f in os.listdir(args.images) if f.lower().endswith((".jpg", ".png", ".bmp", ".tif", ".tiff")))[:args.limit]
+    images = [img for img in (cv2.imread(os.path.join(args.images, f)) for f in image_files) if img is not None]
+    if not images:
+        print(f"❌ {args.images} 中沒有可用的圖片")
+        return
+
+    for model_path in sorted(glob.glob(os.path.join(args.weights, "*.pt"))):
+        try:
+            report = check_backend(model_path, args.backend, images, runs=args.runs)
+        except Exception as e:
+            print(f"❌ {os.path.basename(model_path)}: {e}")
+            continue
+        status = "✅" if report["parity"] else "⚠️"
+        print(f"{status} {report['model']} [{args.backend}] 偵測數 {report['detections']} / {report['backend_detections']}，"
+              f"recall {report['recall']:.3f}，precision {report['precision']:.3f}")
+        print(f"📊 PyTorch {report['pytorch_ms']:.1f} ms/張 → {args.backend} {report['backend_ms']:.1f} ms/張 (x{report['speedup']:.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -5,28 +5,35 @@ import os
 input_folder = "testimages"
 output_folder = "images/results/bilateral_filtered"
 
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
+def bilateral(img):
+    """
+    單張雙邊濾波 (Bilateral Filter)，img 為彩色 BGR
+    d: 鄰域直徑 (越大越平滑)，通常 5~15
+    sigmaColor: 顏色空間的標準差，越大越模糊 (建議 50~150)
+    sigmaSpace: 座標空間的標準差，越大影響越遠 (建議 50~150)
+    回傳：[(輸出檔名前綴, 結果)]
+    """
+    filtered = cv2.bilateralFilter(img, d=9, sigmaColor=75, sigmaSpace=75)
+    return [("bilateral_", filtered)]
 
-# 讀取資料夾內所有圖片
-for filename in os.listdir(input_folder):
-    if filename.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".bmp")):
-        img_path = os.path.join(input_folder, filename)
-        img = cv2.imread(img_path)
+if __name__ == "__main__":
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
 
-        if img is None:
-            print(f"讀取失敗: {filename}")
-            continue
+    # 讀取資料夾內所有圖片
+    for filename in os.listdir(input_folder):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".bmp")):
+            img_path = os.path.join(input_folder, filename)
+            img = cv2.imread(img_path)
 
-        # 雙邊濾波 (Bilateral Filter)
-        # d: 鄰域直徑 (越大越平滑)，通常 5~15
-        # sigmaColor: 顏色空間的標準差，越大越模糊 (建議 50~150)
-        # sigmaSpace: 座標空間的標準差，越大影響越遠 (建議 50~150)
-        filtered = cv2.bilateralFilter(img, d=9, sigmaColor=75, sigmaSpace=75)
+            if img is None:
+                print(f"讀取失敗: {filename}")
+                continue
 
-        # 儲存結果
-        save_path = os.path.join(output_folder, f"bilateral_{filename}")
-        cv2.imwrite(save_path, filtered)
-        print(f"處理完成: {filename} -> {save_path}")
+            # 儲存結果
+            for prefix, filtered in bilateral(img):
+                save_path = os.path.join(output_folder, f"{prefix}{filename}")
+                cv2.imwrite(save_path, filtered)
+                print(f"處理完成: {filename} -> {save_path}")
 
-print("全部圖片處理完成 ✅")
+    print("全部圖片處理完成 ✅")
@@ -5,20 +5,12 @@ import os
 # ====== 參數設定 ======
 IMAGE_DIR = "testimages"  # 原圖資料夾
 RESULT_DIR = "images/results"
-os.makedirs(RESULT_DIR, exist_ok=True)
 
-# 批次處理資料夾裡所有圖片
-for filename in os.listdir(IMAGE_DIR):
-    if not (filename.endswith(".tif") or filename.endswith(".png") or filename.endswith(".jpg")):
-        continue
-
-    img_path = os.path.join(IMAGE_DIR, filename)
-    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        print(f"❌ 無法讀取: {filename}")
-        continue
-
-    # 霍夫圓檢測
+def hough_circles(img):
+    """
+    單張霍夫圓檢測並畫圓，img 為灰階
+    回傳：[(輸出檔名前綴, 結果)]
+    """
     circles = cv2.HoughCircles(img,
                                cv2.HOUGH_GRADIENT,
                                dp=0.9,
@@ -37,10 +29,26 @@ for filename in os.listdir(IMAGE_DIR):
             radius = i[2]
             cv2.circle(output, center, 2, (0, 0, 255), 3)   # 圓心
             cv2.circle(output, center, radius, (0, 255, 0), 2)  # 圓周
+    return [("hough_", output)]
+
+if __name__ == "__main__":
+    os.makedirs(RESULT_DIR, exist_ok=True)
+
+    # 批次處理資料夾裡所有圖片
+    for filename in os.listdir(IMAGE_DIR):
+        if not (filename.endswith(".tif") or filename.endswith(".png") or filename.endswith(".jpg")):
+            continue
+
+        img_path = os.path.join(IMAGE_DIR, filename)
+        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            print(f"❌ 無法讀取: {filename}")
+            continue
 
-    # 存檔
-    result_path = os.path.join(RESULT_DIR, f"hough_{filename}")
-    cv2.imwrite(result_path, output)
-    print(f"✅ 已存: {result_path}")
+        # 存檔
+        for prefix, output in hough_circles(img):
+            result_path = os.path.join(RESULT_DIR, f"{prefix}{filename}")
+            cv2.imwrite(result_path, output)
+            print(f"✅ 已存: {result_path}")
 
-print("🎉 所有圖片處理完成！")
+    print("🎉 所有圖片處理完成！")
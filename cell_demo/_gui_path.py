@@ -0,0 +1,10 @@
+# _gui_path.py
+# 讓 cell_demo 的腳本可以匯入 GUI 資料夾中的共用模組 (preprocess、progress、result_cache、result_sink)
+# 用法：在匯入這些模組之前先 import _gui_path
+
+import os
+import sys
+
+GUI_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GUI"))
+if GUI_DIR not in sys.path:
+    sys.path.insert(0, GUI_DIR)
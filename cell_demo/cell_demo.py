@@ -1,18 +1,26 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from ultralytics import YOLO
-from openpyxl import Workbook
 from datetime import datetime
 import cv2
 
+import _gui_path  # 共用 GUI/progress.py、result_sink.py
+from progress import ProgressBus
+from result_sink import open_sink
+
 # ====== 專案資料夾 ======
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(PROJECT_DIR, "models")
 IMAGE_DIR = os.path.join(PROJECT_DIR, "testimages")
 RESULT_DIR = os.path.join(PROJECT_DIR, "images/results/yolo")
+COUNTS_PATH = os.path.join(PROJECT_DIR, "cell_counts.xlsx")  # 副檔名可換成 .csv / .parquet
 os.makedirs(RESULT_DIR, exist_ok=True)
 
+PREDICT_BATCH_SIZE = 8  # 每次送進 YOLO 的張數，同時也是記憶體中最多保留的原圖數
+
 # ====== ESRGAN (已註解掉) ======
 """
 class ESRGAN:
@@ -26,50 +34,126 @@ class ESRGAN:
         ...
 """
 
+# ====== YOLO 模型快取 ======
+_model_cache = {}  # (權重路徑, 修改時間) -> YOLO 模型
+_model_lock = threading.Lock()
+
+def get_model(model_file):
+    """同一個權重檔只載入一次；檔案被更新 (修改時間改變) 時重新載入"""
+    model_path = os.path.join(MODEL_DIR, model_file)
+    key = (os.path.abspath(model_path), os.path.getmtime(model_path))
+    with _model_lock:
+        if key not in _model_cache:
+            for old_key in [k for k in _model_cache if k[0] == key[0]]:
+                del _model_cache[old_key]  # 舊版本的權重
+            _model_cache[key] = YOLO(model_path)
+            print(f"✅ 已載入模型: {model_file}")
+        return _model_cache[key]
+
+# ====== 標註圖片寫檔 (背景執行緒) ======
+class AnnotatedWriter:
+    """畫框與寫檔交給背景執行緒；佇列有上限，寫檔跟不上時推論端會等待，記憶體不會一直增加"""
+    def __init__(self, max_pending=PREDICT_BATCH_SIZE * 2):
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, img, boxes, save_path):
+        self.jobs.put((img, boxes, save_path))
+
+    def _loop(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            img, boxes, save_path = job
+            try:
+                for (x1, y1, x2, y2) in boxes:
+                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.imwrite(save_path, img)
+                print(f"✅ 已存標註圖片: {save_path}")
+            except Exception as e:
+                print(f"❌ 標註圖片寫檔失敗: {save_path} - {e}")
+
+    def close(self):
+        # 等佇列中的圖片都寫完
+        self.jobs.put(None)
+        self.thread.join()
+
 # ====== YOLO 偵測 ======
+def count_frames(model_file, image_files, batch_size=PREDICT_BATCH_SIZE, writer=None):
+    """
+    依序對 image_files 分批推論，逐張產生 (檔名, 細胞數)
+    每批讀檔一次，同一份影像同時用於推論與標註；writer 為 None 時不存標註圖片
+    """
+    model = get_model(model_file)
+    for start in range(0, len(image_files), batch_size):
+        names, images = [], []
+        for image_file in image_files[start:start + batch_size]:
+            img = cv2.imread(os.path.join(IMAGE_DIR, image_file))
+            if img is None:
+                print(f"⚠️ 無法讀取圖片: {image_file}")
+                continue
+            names.append(image_file)
+            images.append(img)
+        if not images:
+            continue
+
+        results = model.predict(images, verbose=False)
+        for image_file, img, result in zip(names, images, results):
+            boxes = result.boxes.xyxy.cpu().numpy().astype(int)
+            print(f"✅ {image_file} 偵測完成，共 {len(boxes)} 個物件")
+            if writer is not None:
+                writer.submit(img, boxes, os.path.join(RESULT_DIR, f"result_{image_file}"))
+            yield image_file, len(boxes)
+
 def run_yolo(model_file, image_file, save_annotated=True):
-    model_path = os.path.join(MODEL_DIR, model_file)
-    img_path = os.path.join(IMAGE_DIR, image_file)
-    
-    model = YOLO(model_path)
-    results = model(img_path)
-    boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-    print(f"✅ {image_file} 偵測完成，共 {len(boxes)} 個物件")
-
-    # 標註圖片並存檔
-    if save_annotated:
-        img = cv2.imread(img_path)
-        for (x1, y1, x2, y2) in boxes:
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        save_path = os.path.join(RESULT_DIR, f"result_{image_file}")
-        cv2.imwrite(save_path, img)
-        print(f"✅ 已存標註圖片: {save_path}")
-
-    return len(boxes)
+    writer = AnnotatedWriter() if save_annotated else None
+    try:
+        counts = [count for _, count in count_frames(model_file, [image_file], batch_size=1, writer=writer)]
+    finally:
+        if writer is not None:
+            writer.close()
+    return counts[0] if counts else 0
 
 # ====== Excel 匯出 ======
-def export_counts_to_excel(model_file):
+def frame_time(image_file):
+    # 檔名格式：YYYYmmdd_HHMMSS_G.tif
+    return datetime.strptime(image_file.split("_")[0] + "_" + image_file.split("_")[1], "%Y%m%d_%H%M%S")
+
+def export_counts_to_excel(model_file, progress=None, cancel_event=None, save_path=COUNTS_PATH):
+    """
+    逐張計數並即時寫進結果檔 (資料列定時寫出，不會全部留在記憶體)
+    progress：回呼 (done, total)；cancel_event：threading.Event，設定後在下一張前停止
+    回傳：(存檔路徑, 已完成張數, 總張數)，取消時仍會存下已完成的部分
+    """
     image_files_sorted = sorted(
         [f for f in os.listdir(IMAGE_DIR) if f.endswith("_G.tif")],
-        key=lambda f: datetime.strptime(f.split("_")[0] + "_" + f.split("_")[1], "%Y%m%d_%H%M%S")
+        key=frame_time
     )
+    total = len(image_files_sorted)
+
+    # 所有時間點一次分批推論，標註圖片在背景寫出
+    done = 0
+    writer = AnnotatedWriter()
+    frames = count_frames(model_file, image_files_sorted, writer=writer)
+    try:
+        with open_sink(save_path) as sink:
+            table = sink.table("Cell Count", ["Time", "Cell Count"], types=["str", "int"])
+            for img_file, cell_count in frames:
+                table.write([frame_time(img_file).strftime("%Y-%m-%d %H:%M:%S"), cell_count])
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"⚠️ 已取消，完成 {done}/{total} 張")
+                    break
+    finally:
+        frames.close()
+        writer.close()
 
-    counts, times = [], []
-    for img_file in image_files_sorted:
-        cell_count = run_yolo(model_file, img_file)
-        counts.append(cell_count)
-        times.append(datetime.strptime(img_file.split("_")[0] + "_" + img_file.split("_")[1], "%Y%m%d_%H%M%S"))
-
-    # 匯出 Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cell Count"
-    ws.append(["Time", "Cell Count"])
-    for t, c in zip(times, counts):
-        ws.append([t.strftime("%Y-%m-%d %H:%M:%S"), c])
-    save_path = os.path.join(PROJECT_DIR, "cell_counts.xlsx")
-    wb.save(save_path)
-    messagebox.showinfo("完成", f"✅ 已輸出 Excel 檔案：\n{save_path}")
+    print(f"✅ 已輸出結果檔案：{save_path}")
+    return save_path, done, total
 
 # ====== GUI ======
 class CellCounterApp:
@@ -90,12 +174,69 @@ class CellCounterApp:
                                     bg="blue", fg="white", command=self.run_export)
         self.run_button.pack(pady=20, fill="x")
 
+        self.progress = ttk.Progressbar(root, orient="horizontal", mode="determinate", maximum=100)
+        self.progress.pack(pady=5, fill="x", padx=20)
+        self.status_label = tk.Label(root, text="", font=("Arial", 12))
+        self.status_label.pack(pady=5)
+        self.cancel_button = tk.Button(root, text="取消", font=("Arial", 12),
+                                       state="disabled", command=self.cancel_export)
+        self.cancel_button.pack(pady=5)
+
+        # 背景匯出只透過 progress_bus 通知畫面，由主執行緒定時處理
+        self.progress_bus = ProgressBus()
+        self.cancel_event = None
+        self.root.after(50, self.poll_progress_events)
+
     def run_export(self):
         model_name = self.model_var.get()
         if not model_name:
             messagebox.showwarning("警告", "請先選擇模型！")
             return
-        export_counts_to_excel(model_name)
+
+        self.cancel_event = threading.Event()
+        self.run_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.progress["value"] = 0
+        self.status_label.configure(text="處理中...")
+
+        bus, cancel_event = self.progress_bus, self.cancel_event
+        def job():
+            try:
+                bus.post("done", *export_counts_to_excel(model_name, progress=bus.reporter("count"), cancel_event=cancel_event))
+            except Exception as e:
+                bus.post("error", str(e))
+        threading.Thread(target=job, daemon=True).start()
+
+    def cancel_export(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.configure(state="disabled")
+            self.status_label.configure(text="取消中...")
+
+    def poll_progress_events(self):
+        for event in self.progress_bus.drain():
+            kind = event[0]
+            if kind == "progress":  # ("progress", 階段, 完成量, 總量)
+                _, _, done, total = event
+                self.progress["value"] = 100 * done / total if total else 100
+                self.status_label.configure(text=f"{done} / {total}")
+            elif kind == "done":  # ("done", 存檔路徑, 完成量, 總量)
+                _, save_path, done, total = event
+                self.finish_export()
+                if done < total:
+                    messagebox.showinfo("已取消", f"⚠️ 已取消，完成 {done}/{total} 張，已輸出部分結果：\n{save_path}")
+                else:
+                    messagebox.showinfo("完成", f"✅ 已輸出結果檔案：\n{save_path}")
+            elif kind == "error":
+                self.finish_export()
+                messagebox.showerror("錯誤", f"❌ 匯出失敗：{event[1]}")
+        self.root.after(50, self.poll_progress_events)
+
+    def finish_export(self):
+        self.cancel_event = None
+        self.run_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="")
 
 if __name__ == "__main__":
     root = tk.Tk()
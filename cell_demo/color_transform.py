@@ -1,43 +1,26 @@
 import cv2 as cv
-import numpy as np
 import os
 
+import _gui_path  # 共用 GUI/preprocess.py
+from preprocess import PreprocessChain
+
 # 使用 CLAHE 方法增強圖像對比度
-clahe = cv.createCLAHE(clipLimit=20.0, tileGridSize=(16, 16))# 創建 CLAHE 物件 tileGridSize=(8, 8)表示將圖像分成8x8的區塊進行對比度限制
+# 取出 G 通道 → 通道強度正規化 → CLAHE (clipLimit=5.0，tileGridSize=(16, 16)表示將圖像分成16x16的區塊進行對比度限制) → 合併回綠螢光色圖像
+# 整條處理鏈編譯一次，中間結果都在重複使用的緩衝區上完成
+enhance_chain = PreprocessChain([
+    ("extract", 1),             # 取出 G 通道 (BGR 索引 1)
+    ("normalize",),             # 通道強度增強
+    ("clahe", 5.0, (16, 16)),   # 使用 CLAHE 增強對比度
+    ("merge", 1),               # 將增強後的通道放回 G，R/B 為 0
+])
+
 def enhance_contrast(input_path, output_path): 
     image = cv.imread(input_path) #讀取圖像
     if image is None:
         print(f"❌ 無法讀取圖像：{input_path}")
         return
-    
-    #img_gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)  # 將圖像轉為灰階 (測試先轉灰階在增強對比度 效果?)
-    img_rgb = cv.cvtColor(image, cv.COLOR_BGR2RGB)  # 將圖像轉為 RGB
-
-    img_channel = img_rgb[:,:,1]  # 取出 G 通道 (R =[:,:,0], G =[:,:,1], B =[:,:,2])
-    #img_gray_channel = img_gray  # 取出灰階通道 (灰階圖只有一個通道)
-
-    img_channel = cv.normalize(img_channel, None, 0, 255, cv.NORM_MINMAX)   #通道強度增強
-    #img_gray_channel = cv.normalize(img_gray_channel, None, 0, 255, cv.NORM_MINMAX)   #通道強度增強
-    # img_channel = cv.equalizeHist(img_channel)  # 使用直方圖均衡化增強對比度
-    
-    clahe.setClipLimit(5.0)  # 調整對比度限制
-
-    img_clahe = clahe.apply(img_channel)  # 使用 CLAHE 增強對比度
-    #img_clahe = clahe.apply(img_gray_channel)  # 使用 CLAHE 增強對比度
-
-    ## 將增強後的通道合併回三通道圖像
-    enchanted_img = cv.merge([
-        np.zeros_like(img_clahe), #R
-        img_clahe, #G
-        np.zeros_like(img_clahe)]  #B
-    )
 
-    ## 將灰階圖轉回綠螢光色RGB圖像
-    # enchanted_img = cv.merge([
-    #     np.zeros_like(img_clahe),  # R
-    #     img_clahe,  # G
-    #     np.zeros_like(img_clahe)   # B
-    #  ])
+    enchanted_img = enhance_chain.apply(image)
 
     # 確保輸出資料夾存在
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
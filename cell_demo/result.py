@@ -1,141 +1,384 @@
 import os
-import cv2
+import numpy as np
 from ultralytics import YOLO
-from openpyxl import Workbook
 
-IOU_THRESHOLD = 0.5
+import _gui_path  # 共用 GUI/result_cache.py、result_sink.py
+from result_cache import file_fingerprint
+from result_sink import open_sink
+
+IOU_THRESHOLD = 0.5  # 每張圖的 TP / FP / FN 使用的門檻
+IOU_THRESHOLDS = np.round(np.arange(0.5, 0.96, 0.05), 2)  # 多門檻指標與 mAP50-95 使用的門檻
+
+# ===== 偵測快取與門檻掃描 =====
+# 每個模型只推論一次：用很低的信心值與很寬鬆的 NMS 取得候選框，存在 labels_pred/raw_<模型雜湊>/
+# 之後的信心值 / NMS IoU 組合都在記憶體中從候選框重新篩選，修改標註後重新評估不需要再推論
+RAW_CONF = 0.001
+RAW_NMS_IOU = 0.9
+RAW_MAX_DET = 3000
+REPORT_CONF = 0.25     # 逐張報表與 labels_pred txt 使用的門檻 (YOLO predict 的預設值)
+REPORT_NMS_IOU = 0.7
+SWEEP_CONFS = np.round(np.arange(0.05, 0.951, 0.05), 2)
+SWEEP_NMS_IOUS = np.round(np.arange(0.1, 0.71, 0.1), 2)
 
 # ===== 資料夾路徑 =====
 IMAGE_DIR = 'testimages'
 GT_DIR = 'labels_gt'
 PRED_DIR = 'labels_pred'
 MODEL_PATH = 'models/YOLOv11_green_best1.pt'
+OUTPUT_PATH = 'YOLO_Batch_Evaluation.xlsx'  # 副檔名可換成 .csv / .parquet
 
 os.makedirs(PRED_DIR, exist_ok=True)
 
-# ===== 計算 IoU =====
-def compute_iou(box1, box2):
-    # box = [x_center, y_center, w, h] (像素)
-    x1_min = box1[0] - box1[2]/2
-    y1_min = box1[1] - box1[3]/2
-    x1_max = box1[0] + box1[2]/2
-    y1_max = box1[1] + box1[3]/2
-
-    x2_min = box2[0] - box2[2]/2
-    y2_min = box2[1] - box2[3]/2
-    x2_max = box2[0] + box2[2]/2
-    y2_max = box2[1] + box2[3]/2
-
-    inter_xmin = max(x1_min, x2_min)
-    inter_ymin = max(y1_min, y2_min)
-    inter_xmax = min(x1_max, x2_max)
-    inter_ymax = min(y1_max, y2_max)
-    inter_area = max(0, inter_xmax-inter_xmin) * max(0, inter_ymax-inter_ymin)
-
-    area1 = (x1_max-x1_min)*(y1_max-y1_min)
-    area2 = (x2_max-x2_min)*(y2_max-y2_min)
-    union_area = area1 + area2 - inter_area
-    if union_area == 0:
-        return 0
-    return inter_area / union_area
+# ===== 計算 IoU 矩陣 =====
+def iou_matrix(boxes1, boxes2):
+    # boxes = (N, 4) 的 [x_center, y_center, w, h] (像素)
+    # 回傳 (len(boxes1), len(boxes2)) 的 IoU，一次用 NumPy 廣播算完所有組合
+    boxes1 = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+    half1 = boxes1[:, 2:] / 2
+    half2 = boxes2[:, 2:] / 2
+    min1, max1 = boxes1[:, :2] - half1, boxes1[:, :2] + half1
+    min2, max2 = boxes2[:, :2] - half2, boxes2[:, :2] + half2
+
+    # 交集的寬與高，各自是一個 (N1, N2) 矩陣，後續運算都就地完成
+    inter_area = np.minimum(max1[:, None, 0], max2[None, :, 0]) - np.maximum(min1[:, None, 0], min2[None, :, 0])
+    np.maximum(inter_area, 0, out=inter_area)
+    inter_h = np.minimum(max1[:, None, 1], max2[None, :, 1]) - np.maximum(min1[:, None, 1], min2[None, :, 1])
+    np.maximum(inter_h, 0, out=inter_h)
+    inter_area *= inter_h
+
+    area1 = boxes1[:, 2] * boxes1[:, 3]
+    area2 = boxes2[:, 2] * boxes2[:, 3]
+    union_area = inter_h  # 重複使用緩衝區
+    np.add(area1[:, None], area2[None, :], out=union_area)
+    union_area -= inter_area
+    return np.divide(inter_area, union_area, out=np.zeros_like(inter_area), where=union_area > 0)
+
+# ===== 預測與標註配對 =====
+def match_predictions(ious, thresholds=IOU_THRESHOLDS):
+    """
+    ious：(P, G) 的 IoU 矩陣，預測已依信心值由高到低排序
+    每個預測依序找還沒配對的標註中 IoU 最高的一個，IoU 達門檻就算 TP (忽略 class)
+    所有門檻同時配對，每個預測只做一次 (T, G) 的陣列運算
+    回傳：(P, T) 的 TP 旗標
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64).reshape(-1)
+    num_pred, num_gt = ious.shape
+    tp = np.zeros((num_pred, len(thresholds)), dtype=bool)
+    if num_pred == 0 or num_gt == 0:
+        return tp
+
+    matched = np.zeros((len(thresholds), num_gt), dtype=bool)
+    rows = np.arange(len(thresholds))
+    pred_idx, gt_idx = np.nonzero(ious > 0)  # 每個預測只需要看有重疊的標註
+    bounds = np.searchsorted(pred_idx, np.arange(num_pred + 1))
+    for p in range(num_pred):
+        cols = gt_idx[bounds[p]:bounds[p + 1]]
+        if cols.size == 0:
+            continue
+        candidates = np.where(matched[:, cols], -1.0, ious[p, cols])  # 已配對的標註不再考慮
+        best = candidates.argmax(axis=1)
+        best_iou = candidates[rows, best]
+        hit = (best_iou > 0) & (best_iou >= thresholds)
+        tp[p] = hit
+        matched[rows[hit], cols[best[hit]]] = True
+    return tp
+
+def precision_recall_f1(tp, fp, fn):
+    tp, fp, fn = (np.asarray(v, dtype=np.float64) for v in (tp, fp, fn))
+    precision = np.divide(tp, tp + fp, out=np.zeros_like(tp), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros_like(tp), where=(tp + fn) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=(precision + recall) > 0)
+    return precision, recall, f1
+
+def average_precision(confs, tp_flags, num_gt):
+    """
+    以 COCO 的 101 點內插計算每個門檻的 AP
+    confs：(N,) 全部預測的信心值、tp_flags：(N, T)、num_gt：標註總數
+    回傳：(T,) 的 AP
+    """
+    num_thresholds = tp_flags.shape[1]
+    if num_gt == 0 or len(confs) == 0:
+        return np.zeros(num_thresholds)
+    order = np.argsort(-np.asarray(confs), kind="stable")
+    tp_cum = np.cumsum(tp_flags[order], axis=0)
+    fp_cum = np.cumsum(~tp_flags[order], axis=0)
+    recall = tp_cum / num_gt
+    precision = tp_cum / (tp_cum + fp_cum)
+    # 精確度改成「之後所有點的最大值」，使曲線單調遞減
+    precision = np.maximum.accumulate(precision[::-1], axis=0)[::-1]
+
+    recall_points = np.linspace(0, 1, 101)
+    ap = np.zeros(num_thresholds)
+    for t in range(num_thresholds):
+        idx = np.searchsorted(recall[:, t], recall_points, side="left")
+        valid = idx < len(order)
+        ap[t] = precision[idx[valid], t].sum() / len(recall_points)
+    return ap
+
+def match_image(pred_boxes, pred_confs, gt_boxes, thresholds=IOU_THRESHOLDS):
+    """單張圖各門檻的 TP 旗標 (P, T)，順序與 pred_boxes 相同"""
+    order = np.argsort(-np.asarray(pred_confs), kind="stable")  # 依信心值由高到低配對
+    flags = np.zeros((len(order), len(thresholds)), dtype=bool)
+    flags[order] = match_predictions(iou_matrix(np.asarray(pred_boxes)[order], gt_boxes), thresholds)
+    return flags
+
+def evaluate(samples, thresholds=IOU_THRESHOLDS, per_image_flags=None):
+    """
+    samples：每張圖一個 (預測框 (P,4) xywh, 預測信心值 (P,), 標註框 (G,4) xywh)
+    回傳 dict：
+        per_image：每張圖的 (P, T) TP 旗標、預測數、標註數
+        tp / fp / fn / precision / recall / f1 / ap：各門檻 (T,) 的整體結果
+    per_image_flags：已經用 match_image 算好的每張圖 TP 旗標 (省去重算)
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    per_image = []
+    all_confs, all_flags = [], []
+    total_gt = 0
+    for i, (pred_boxes, pred_confs, gt_boxes) in enumerate(samples):
+        flags = per_image_flags[i] if per_image_flags is not None else match_image(pred_boxes, pred_confs, gt_boxes, thresholds)
+        per_image.append({"tp_flags": flags, "num_pred": len(flags), "num_gt": len(gt_boxes)})
+        all_confs.append(np.asarray(pred_confs, dtype=np.float64))
+        all_flags.append(flags)
+        total_gt += len(gt_boxes)
+
+    confs = np.concatenate(all_confs) if all_confs else np.zeros(0)
+    flags = np.concatenate(all_flags) if all_flags else np.zeros((0, len(thresholds)), dtype=bool)
+    tp = flags.sum(axis=0)
+    fp = len(confs) - tp
+    fn = total_gt - tp
+    precision, recall, f1 = precision_recall_f1(tp, fp, fn)
+    return {
+        "thresholds": thresholds,
+        "per_image": per_image,
+        "tp": tp, "fp": fp, "fn": fn,
+        "precision": precision, "recall": recall, "f1": f1,
+        "ap": average_precision(confs, flags, total_gt),
+    }
+
+# ===== 偵測候選框快取 =====
+def raw_cache_path(model_hash, img_file):
+    return os.path.join(PRED_DIR, f"raw_{model_hash[:16]}", os.path.splitext(img_file)[0] + ".npz")
+
+def load_raw_predictions(get_model, model_hash, img_path):
+    """
+    讀取一張圖的候選框 (xywh 像素)、信心值、類別與圖片尺寸
+    快取不存在或圖片已變動時才呼叫 get_model() 推論並寫入快取
+    """
+    stat = os.stat(img_path)
+    source = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    cache_path = raw_cache_path(model_hash, os.path.basename(img_path))
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            if np.array_equal(data["source"], source):
+                return {name: data[name] for name in ("boxes", "confs", "classes", "size")}
+
+    results = get_model().predict(img_path, conf=RAW_CONF, iou=RAW_NMS_IOU, max_det=RAW_MAX_DET, save=False, verbose=False)
+    raw = {
+        "boxes": np.concatenate([r.boxes.xywh.cpu().numpy() for r in results]).reshape(-1, 4),
+        "confs": np.concatenate([r.boxes.conf.cpu().numpy() for r in results]),
+        "classes": np.concatenate([r.boxes.cls.cpu().numpy() for r in results]).astype(np.int64),
+        "size": np.array(results[0].orig_shape[::-1], dtype=np.int64),  # (寬, 高)
+    }
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    np.savez(cache_path, source=source, **raw)
+    return raw
+
+def nms_keep(ious, confs, classes, nms_iou):
+    """
+    依信心值由高到低的貪婪 NMS (同類別之間才互相抑制，與 YOLO 預設相同)
+    ious：候選框兩兩的 IoU 矩陣 (同一張圖掃描多個門檻時共用)
+    回傳：保留的索引 (信心值由高到低)
+    """
+    order = np.argsort(-confs, kind="stable")
+    suppressed = np.zeros(len(confs), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= (ious[i] > nms_iou) & (classes == classes[i])
+    return np.array(keep, dtype=np.int64)
+
+def filter_predictions(raw, conf, nms_iou, ious=None):
+    """從候選框取出某組信心值 / NMS IoU 下的預測：(boxes, confs, classes)"""
+    mask = raw["confs"] >= conf
+    boxes, confs, classes = raw["boxes"][mask], raw["confs"][mask], raw["classes"][mask]
+    ious = iou_matrix(boxes, boxes) if ious is None else ious[np.ix_(mask, mask)]
+    keep = nms_keep(ious, confs, classes, nms_iou)
+    return boxes[keep], confs[keep], classes[keep]
+
+def sweep_thresholds(raws, gt_list, confs=SWEEP_CONFS, nms_ious=SWEEP_NMS_IOUS):
+    """
+    掃描所有 (NMS IoU, 信心值) 組合，在 IoU_THRESHOLD 下計算 P/R/F1
+    預測依信心值由高到低貪婪配對，所以較高信心值門檻的配對結果就是完整配對的前段：
+    每個 NMS IoU 只需配對一次，所有信心值門檻用累計計數取得
+    回傳：(掃描結果列 list, 每個 NMS IoU 的 AP dict)
+    """
+    min_conf = float(np.min(confs))
+    candidates = []
+    for raw in raws:
+        mask = raw["confs"] >= min_conf
+        subset = {name: raw[name][mask] for name in ("boxes", "confs", "classes")}
+        candidates.append((subset, iou_matrix(subset["boxes"], subset["boxes"])))  # 每張圖只算一次
+
+    total_gt = sum(len(gt) for gt in gt_list)
+    rows, ap_by_nms = [], {}
+    for nms_iou in nms_ious:
+        samples = []
+        for (subset, ious), gt_boxes in zip(candidates, gt_list):
+            keep = nms_keep(ious, subset["confs"], subset["classes"], nms_iou)
+            samples.append((subset["boxes"][keep], subset["confs"][keep], gt_boxes))
+        result = evaluate(samples, [IOU_THRESHOLD])
+        ap_by_nms[float(nms_iou)] = float(result["ap"][0])
+
+        all_confs = np.concatenate([conf for _, conf, _ in samples]) if samples else np.zeros(0)
+        all_tp = np.concatenate([image["tp_flags"][:, 0] for image in result["per_image"]]) if samples else np.zeros(0, dtype=bool)
+        for conf in confs:
+            selected = all_confs >= conf
+            tp = int(all_tp[selected].sum())
+            fp = int(selected.sum()) - tp
+            fn = total_gt - tp
+            precision, recall, f1 = (float(v) for v in precision_recall_f1(tp, fp, fn))
+            rows.append({"nms_iou": float(nms_iou), "conf": float(conf), "tp": tp, "fp": fp, "fn": fn,
+                         "precision": precision, "recall": recall, "f1": f1})
+    return rows, ap_by_nms
+
+def recommend_operating_point(rows):
+    """F1 最高的組合；F1 相同時取信心值較高、NMS IoU 較低的 (誤報較少)"""
+    return max(rows, key=lambda row: (round(row["f1"], 6), row["conf"], -row["nms_iou"]))
+
+def plot_pr_curves(rows, output_path):
+    # 有安裝 matplotlib 時輸出各 NMS IoU 的 PR 曲線
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ 未安裝 matplotlib，略過 PR 曲線圖")
+        return
+    fig, ax = plt.subplots(figsize=(6, 5))
+    for nms_iou in sorted({row["nms_iou"] for row in rows}):
+        curve = [row for row in rows if row["nms_iou"] == nms_iou]
+        ax.plot([row["recall"] for row in curve], [row["precision"] for row in curve], marker=".", label=f"NMS IoU {nms_iou:.1f}")
+    ax.set_xlabel("Recall")
+    ax.set_ylabel("Precision")
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1.02)
+    ax.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=150)
+    plt.close(fig)
+    print(f"✅ PR 曲線已輸出：{output_path}")
 
 # ===== 讀取 YOLO 標籤 =====
 def read_yolo_txt(path, img_w, img_h):
+    # 回傳 (N, 5) 陣列：[cls, x, y, w, h] (像素)
     boxes = []
     if not os.path.exists(path):
-        return boxes
+        return np.zeros((0, 5))
     with open(path, 'r') as f:
         for line in f.readlines():
             parts = line.strip().split()
             if len(parts) != 5:
                 continue
-            cls, x, y, w, h = map(float, parts)
-            # 將歸一化座標轉成像素
-            x *= img_w
-            y *= img_h
-            w *= img_w
-            h *= img_h
-            boxes.append([cls, x, y, w, h])
+            boxes.append([float(v) for v in parts])
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 5)
+    # 將歸一化座標轉成像素
+    boxes[:, [1, 3]] *= img_w
+    boxes[:, [2, 4]] *= img_h
     return boxes
 
 # ===== 主程式 =====
 def main():
-    model = YOLO(MODEL_PATH)
-    wb = Workbook()
-    ws = wb.active
-    ws.append(["Image", "TP", "FP", "FN", "Precision", "Recall", "F1-Score"])
+    model_hash = file_fingerprint(MODEL_PATH)
+    model = None
+    def get_model():
+        # 只有快取沒命中時才載入模型
+        nonlocal model
+        if model is None:
+            model = YOLO(MODEL_PATH)
+        return model
 
-    total_tp, total_fp, total_fn = 0,0,0
+    t_index = int(np.argmin(np.abs(IOU_THRESHOLDS - IOU_THRESHOLD)))
+    samples, flags_list = [], []
+    raws, gt_list = [], []
+    with open_sink(OUTPUT_PATH) as sink:
+        # 逐張結果一算完就寫出，中途當掉時已完成的圖片仍保留
+        ws = sink.table("Per_Image", ["Image", "TP", "FP", "FN", "Precision", "Recall", "F1-Score"],
+                        types=["str", "int", "int", "int", "float", "float", "float"])
+        for img_file in os.listdir(IMAGE_DIR):
+            if not img_file.lower().endswith(('.jpg','.png','.jpeg','.tif','.tiff')):
+                continue
+            img_path = os.path.join(IMAGE_DIR, img_file)
+            gt_path = os.path.join(GT_DIR, os.path.splitext(img_file)[0]+'.txt')
+            pred_path = os.path.join(PRED_DIR, os.path.splitext(img_file)[0]+'.txt')
 
-    for img_file in os.listdir(IMAGE_DIR):
-        if not img_file.lower().endswith(('.jpg','.png','.jpeg','.tif','.tiff')):
-            continue
-        img_path = os.path.join(IMAGE_DIR, img_file)
-        gt_path = os.path.join(GT_DIR, os.path.splitext(img_file)[0]+'.txt')
-        pred_path = os.path.join(PRED_DIR, os.path.splitext(img_file)[0]+'.txt')
-
-        # ===== 讀取圖片尺寸 =====
-        image = cv2.imread(img_path)
-        img_h, img_w = image.shape[:2]
-
-        # ===== YOLO 偵測 =====
-        results = model.predict(img_path, save=False, verbose=False)
-        pred_boxes = []
-        # 寫入 pred txt
-        with open(pred_path, 'w') as f:
-            for r in results:
-                for i in range(len(r.boxes)):
-                    box = r.boxes.xywh[i].cpu().numpy()
-                    cls = int(r.boxes.cls[i].cpu().numpy())
-                    x, y, w, h = box
-                    pred_boxes.append([cls, x, y, w, h])
-                    # 也存成 YOLO 格式（歸一化）
+            # ===== YOLO 偵測 (有快取時不推論) =====
+            raw = load_raw_predictions(get_model, model_hash, img_path)
+            img_w, img_h = (int(v) for v in raw["size"])
+            pred_boxes, pred_confs, pred_cls = filter_predictions(raw, REPORT_CONF, REPORT_NMS_IOU)
+            # 寫入 pred txt (YOLO 格式，歸一化)
+            with open(pred_path, 'w') as f:
+                for cls, (x, y, w, h) in zip(pred_cls, pred_boxes):
                     f.write(f"{cls} {x/img_w:.6f} {y/img_h:.6f} {w/img_w:.6f} {h/img_h:.6f}\n")
 
-        # ===== 若有手動標註，計算指標 =====
-        if os.path.exists(gt_path):
-            gt_boxes = read_yolo_txt(gt_path, img_w, img_h)
-
-            matched_gt = set()
-            tp = 0
-            for pred in pred_boxes:
-                pred_cls, px, py, pw, ph = pred
-                best_iou = 0
-                best_gt = -1
-                for i, gt in enumerate(gt_boxes):
-                    if i in matched_gt:
-                        continue
-                    gt_cls, gx, gy, gw, gh = gt
-                    # 忽略 class
-                    iou = compute_iou([px, py, pw, ph], [gx, gy, gw, gh])
-                    if iou > best_iou:
-                        best_iou = iou
-                        best_gt = i
-                if best_iou >= IOU_THRESHOLD:
-                    tp += 1
-                    matched_gt.add(best_gt)
-
-            fp = len(pred_boxes) - tp
+            # ===== 若有手動標註，納入指標計算 =====
+            if not os.path.exists(gt_path):
+                ws.write([img_file, None, None, None, None, None, None])  # 沒有標註，不計算指標
+                continue
+            gt_boxes = read_yolo_txt(gt_path, img_w, img_h)[:, 1:]
+            flags = match_image(pred_boxes, pred_confs, gt_boxes)
+            samples.append((pred_boxes, pred_confs, gt_boxes))
+            flags_list.append(flags)
+            raws.append(raw)
+            gt_list.append(gt_boxes)
+
+            tp = int(flags[:, t_index].sum())
+            fp = len(flags) - tp
             fn = len(gt_boxes) - tp
+            precision, recall, f1 = (float(v) for v in precision_recall_f1(tp, fp, fn))
+            ws.write([img_file, tp, fp, fn, precision, recall, f1])
+        print("✅ 推論完成" if model is not None else "✅ 全部使用快取的偵測結果，未重新推論")
 
-            precision = tp / (tp + fp) if (tp+fp) >0 else 0
-            recall = tp / (tp + fn) if (tp+fn) >0 else 0
-            f1 = 2*precision*recall/(precision+recall) if (precision+recall) >0 else 0
+        # ===== 所有圖片一起計算各門檻的指標 =====
+        metrics = evaluate(samples, per_image_flags=flags_list)
+        ws.write(["Total", int(metrics["tp"][t_index]), int(metrics["fp"][t_index]), int(metrics["fn"][t_index]),
+                  float(metrics["precision"][t_index]), float(metrics["recall"][t_index]), float(metrics["f1"][t_index])])
 
-            total_tp += tp
-            total_fp += fp
-            total_fn += fn
+        # ===== 多門檻指標與 mAP =====
+        ws_thr = sink.table("IoU_Thresholds", ["IoU", "TP", "FP", "FN", "Precision", "Recall", "F1-Score", "AP"],
+                            types=["float", "int", "int", "int", "float", "float", "float", "float"])
+        for i, thr in enumerate(metrics["thresholds"]):
+            ws_thr.write([float(thr), int(metrics["tp"][i]), int(metrics["fp"][i]), int(metrics["fn"][i]),
+                          float(metrics["precision"][i]), float(metrics["recall"][i]), float(metrics["f1"][i]), float(metrics["ap"][i])])
+        map50 = float(metrics["ap"][0])
+        map50_95 = float(metrics["ap"].mean())
+        ws_summary = sink.table("Summary", ["Metric", "Value"], types=["str", "float"])
+        ws_summary.write(["mAP50", map50])
+        ws_summary.write(["mAP50-95", map50_95])
 
-            ws.append([img_file, tp, fp, fn, precision, recall, f1])
-        else:
-            ws.append([img_file, "N/A","N/A","N/A","N/A","N/A","N/A"])
+        # ===== 信心值 / NMS IoU 掃描 =====
+        sweep_rows, ap_by_nms = sweep_thresholds(raws, gt_list)
+        ws_sweep = sink.table("Threshold_Sweep", ["NMS IoU", "Conf", "TP", "FP", "FN", "Precision", "Recall", "F1-Score"],
+                              types=["float", "float", "int", "int", "int", "float", "float", "float"])
+        for row in sweep_rows:
+            ws_sweep.write([row["nms_iou"], row["conf"], row["tp"], row["fp"], row["fn"], row["precision"], row["recall"], row["f1"]])
+        ws_nms = sink.table("NMS_AP50", ["NMS IoU", "AP50"], types=["float", "float"])
+        for nms_iou, ap in ap_by_nms.items():
+            ws_nms.write([nms_iou, ap])
+        best = None
+        if sweep_rows and gt_list:
+            best = recommend_operating_point(sweep_rows)
+            ws_summary.write(["Recommended conf", best["conf"]])
+            ws_summary.write(["Recommended iou", best["nms_iou"]])
+            ws_summary.write(["Recommended F1-Score", best["f1"]])
+            plot_pr_curves(sweep_rows, "YOLO_PR_Curves.png")
 
-    overall_precision = total_tp/(total_tp+total_fp) if (total_tp+total_fp)>0 else 0
-    overall_recall = total_tp/(total_tp+total_fn) if (total_tp+total_fn)>0 else 0
-    overall_f1 = 2*overall_precision*overall_recall/(overall_precision+overall_recall) if (overall_precision+overall_recall)>0 else 0
-    ws.append(["Total", total_tp, total_fp, total_fn, overall_precision, overall_recall, overall_f1])
-    wb.save("YOLO_Batch_Evaluation.xlsx")
-    print("✅ 批量處理完成，結果已輸出：YOLO_Batch_Evaluation.xlsx")
+    print(f"📊 mAP50 = {map50:.4f}，mAP50-95 = {map50_95:.4f}")
+    if best is not None:
+        print(f"📊 建議門檻：conf = {best['conf']:.2f}，iou = {best['nms_iou']:.2f} (F1 = {best['f1']:.4f}，P = {best['precision']:.4f}，R = {best['recall']:.4f})")
+    print(f"✅ 批量處理完成，結果已輸出：{OUTPUT_PATH}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,175 @@
+# transform_runner.py
+# 一次跑完多個影像轉換腳本：每張圖只讀檔解碼一次，再分送給選到的轉換
+# 影像分散到多個 worker 執行緒 (OpenCV 運算會釋放 GIL)，同時在處理中的影像數量有上限，記憶體不會隨資料夾大小增加
+# 用法：python transform_runner.py --transforms binary edge dog --workers 4
+#       python transform_runner.py                     (預設跑全部轉換)
+
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import cv2
+import numpy as np
+
+import Binarization_transform
+import edge_transform
+import BilateralFilter_transform
+import Dog
+import Hough_transform
+import HSV_Lab_trans
+import tophat_transform
+
+import _gui_path  # 共用 GUI/result_sink.py
+from result_sink import open_sink
+
+INPUT_DIR = "testimages"
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# 名稱 -> (需要的影像格式, 輸出資料夾, 轉換函式)
+# 影像格式：raw = 原始格式 (IMREAD_UNCHANGED)、color = 彩色 BGR、gray = 灰階，與各腳本原本的讀檔方式相同
+# 轉換函式回傳 [(輸出檔名前綴, 結果)]
+TRANSFORMS = {
+    "binary": ("raw", Binarization_transform.output_folder, Binarization_transform.binarize),
+    "edge": ("raw", edge_transform.output_folder, edge_transform.detect_edges),
+    "bilateral": ("color", BilateralFilter_transform.output_folder, BilateralFilter_transform.bilateral),
+    "dog": ("gray", Dog.OUTPUT_DIR, None),  # 另外要記錄平均灰階值，在 process_image 中處理
+    "hough": ("gray", Hough_transform.RESULT_DIR, Hough_transform.hough_circles),
+    "hsv_v": ("color", "images/results/HSV_V", lambda img: [("", HSV_Lab_trans.get_hsv_v(img))]),
+    "lab_l": ("color", "images/results/Lab_L", lambda img: [("", HSV_Lab_trans.get_lab_l(img))]),
+    "tophat": ("color", "images/results/tophat", lambda img: [("", tophat_transform.enhance_chain.apply(img))]),
+}
+
+# HSV / Lab 原本的輸出檔名是加在副檔名前面的後綴
+SUFFIXES = {"hsv_v": "_HSV_V", "lab_l": "_Lab_L"}
+
+class DecodedImage:
+    """一張解碼過的影像，彩色與灰階版本在第一次用到時才轉換，之後共用 (只在同一個 worker 執行緒內使用)"""
+    def __init__(self, raw):
+        self.raw = raw
+        self._color = None
+        self._gray = None
+
+    @property
+    def color(self):
+        if self._color is None:
+            img = self.raw
+            if img.dtype != np.uint8:
+                # 與 cv2.imread 彩色模式相同：16 位元灰階取高 8 位元，彩色為 x * 255 / 65535 四捨五入
+                img = (img >> 8).astype(np.uint8) if img.ndim == 2 else cv2.convertScaleAbs(img, alpha=255 / 65535)
+            if img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+            elif img.shape[2] == 4:
+                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+            self._color = img
+        return self._color
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            if self.raw.ndim == 2 and self.raw.dtype == np.uint8:
+                self._gray = self.raw
+            else:
+                self._gray = cv2.cvtColor(self.color, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def get(self, kind):
+        return self.raw if kind == "raw" else getattr(self, kind)
+
+def output_path(name, folder, prefix, filename):
+    if name in SUFFIXES:
+        base, ext = os.path.splitext(filename)
+        return os.path.join(folder, f"{base}{SUFFIXES[name]}{ext}")
+    return os.path.join(folder, f"{prefix}{filename}")
+
+def process_image(img_path, names):
+    """
+    在 worker 執行緒中處理一張影像：解碼一次，依序跑所有選到的轉換並寫檔
+    回傳：(檔名, DoG 平均灰階值或 None, 失敗的轉換 [(名稱, 錯誤)])
+    """
+    filename = os.path.basename(img_path)
+    raw = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
+    if raw is None:
+        return filename, None, [("read", "無法讀取")]
+
+    image = DecodedImage(raw)
+    mean_gray = None
+    errors = []
+    for name in names:
+        kind, folder, func = TRANSFORMS[name]
+        try:
+            if name == "dog":
+                dog, mean_gray = Dog.difference_of_gaussians(image.get(kind))
+                outputs = [("DoG_", dog)]
+            else:
+                outputs = func(image.get(kind))
+            for prefix, result in outputs:
+                cv2.imwrite(output_path(name, folder, prefix, filename), result)
+        except cv2.error as e:
+            errors.append((name, str(e).strip().splitlines()[-1]))
+    return filename, mean_gray, errors
+
+def run_transforms(input_dir, names, workers=4, max_inflight=None):
+    """
+    對 input_dir 中的所有影像跑 names 中的轉換
+    max_inflight：同時在處理中的影像數上限 (預設為 workers 的兩倍)
+    """
+    files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(IMAGE_EXTS))
+    if not files:
+        print("⚠️ 找不到任何圖像檔案")
+        return
+    for name in names:
+        os.makedirs(TRANSFORMS[name][1], exist_ok=True)
+
+    workers = max(1, workers)
+    max_inflight = max(workers, max_inflight or workers * 2)
+    if workers > 1:
+        cv2.setNumThreads(1)  # 平行度交給外層的 worker，避免 OpenCV 內部再開執行緒搶 CPU
+
+    # DoG 平均灰階值一完成就寫進結果檔 (依完成順序)
+    sink = open_sink(Dog.OUTPUT_EXCEL) if "dog" in names else None
+    dog_table = sink.table(Dog.DOG_SHEET, Dog.DOG_COLUMNS, Dog.DOG_TYPES) if sink is not None else None
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            paths = iter(os.path.join(input_dir, f) for f in files)
+            done_count = 0
+            while True:
+                # 補滿處理中的影像，到上限就等有一張完成再繼續讀
+                for img_path in paths:
+                    pending.add(executor.submit(process_image, img_path, names))
+                    if len(pending) >= max_inflight:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    filename, mean_gray, errors = future.result()
+                    done_count += 1
+                    if mean_gray is not None:
+                        dog_table.write(Dog.dog_row(filename, mean_gray))
+                    for name, message in errors:
+                        failed += 1
+                        print(f"❌ {filename} [{name}] 失敗: {message}")
+                    print(f"✅ 已處理 {filename} ({done_count}/{len(files)})")
+    finally:
+        if sink is not None:
+            sink.close()  # 中途出錯時也保留已完成的結果
+
+    if sink is not None:
+        print(f"✅ DoG 結果已存到 {Dog.OUTPUT_EXCEL}")
+    print(f"🎉 全部完成！{len(files)} 張 x {len(names)} 種轉換，失敗 {failed} 次，耗時 {time.perf_counter() - start:.1f} 秒")
+
+def main():
+    parser = argparse.ArgumentParser(description="一次解碼、平行執行多個影像轉換")
+    parser.add_argument("--input", default=INPUT_DIR, help="輸入資料夾")
+    parser.add_argument("--transforms", nargs="+", choices=list(TRANSFORMS), default=list(TRANSFORMS), help="要執行的轉換 (預設全部)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker 執行緒數")
+    parser.add_argument("--max-inflight", type=int, default=None, help="同時處理中的影像數上限 (預設為 workers 的兩倍)")
+    args = parser.parse_args()
+
+    run_transforms(args.input, args.transforms, workers=args.workers, max_inflight=args.max_inflight)
+
+if __name__ == "__main__":
+    main()